@@ -0,0 +1,146 @@
+"""
+
+BEAMFORMING
+===========
+
+Bartlett and Capon (MVDR) angle spectra of whole frames.
+
+Zero padding the angle FFT interpolates the spectrum of a 4 or 8 antenna wide
+array, it does not sharpen it. Capon beamforming weighs the steering vector
+of each direction with the inverse covariance of the array and separates
+targets closer than the FFT beam width, at the cost of a covariance and an
+inversion per range bin.
+
+A Beamformer precomputes the steering matrix of its angle grid, by default
+the NUM_AZIM_BINS azimuths (and optionally NUM_ELEV_BINS elevations) of
+fourier.angleFFT, from the device geometry (see devices.py). For a frame of
+shape (snapshots, num_vx, range), e.g. the range FFT of every chirp or
+RadarCubeEngine.doppler_cube, it then computes in batches over range bins:
+
+    - the covariance matrix of each range bin over the snapshots, in one einsum
+    - their inverses, in one np.linalg.inv call, for Capon
+    - the spectrum of every range bin and direction, in one einsum
+
+    >>> beamformer = Beamformer('IWR6843ISK-ODS', method='capon')
+    >>> radarCube, rFFT, rBins = rangeFFT(rdata.separated_vx_data, 'IWR6843ISK-ODS')
+    >>> heatmap = beamformer.spectrum(rFFT)   # (range, azimuth)
+
+Included functions/classes:
+    - Beamformer
+    - angle_grid
+
+"""
+
+import numpy as np
+
+from devices import enabled_tx, get_device
+from params import PARAMS
+
+METHODS = ('bartlett', 'capon')
+
+
+def angle_grid(bins):
+    """Returns the angles of the bins of an fftshifted angle FFT, as in fourier.angleFFT
+
+    Args:
+        bins (int): FFT size
+
+    Returns:
+        ndarray: Angles in radians, evenly spaced in sine
+
+    """
+    return np.arcsin(np.linspace(-bins / 2, bins / 2 - 1, bins) * 2 / bins)
+
+
+class Beamformer:
+    """Computes Bartlett or Capon angle spectra of all the range bins of a frame at once.
+
+    Attributes:
+        device (str): Device identifier, registered in devices.py
+        method (str): 'bartlett' or 'capon'
+        tx (tuple): Enabled TX antennas in chirp order, from PARAMS.CONFIG by default
+        azimuths (ndarray): Azimuth grid in radians, angle_grid(PARAMS.NUM_AZIM_BINS) by default
+        elevations (ndarray): Elevation grid in radians, 0 only by default for range-azimuth maps.
+            Pass True for angle_grid(PARAMS.NUM_ELEV_BINS)
+        loading (float): Diagonal loading of the Capon covariance, relative to its mean eigenvalue
+        azimuth_axis (ndarray): azimuths in degrees
+        elevation_axis (ndarray): elevations in degrees
+
+    """
+
+    def __init__(self, device, method='capon', tx=None, azimuths=None, elevations=None, loading=1e-2):
+        if method not in METHODS:
+            raise ValueError('Unknown beamforming method {}, choose from {}'.format(method, METHODS))
+        self.device = device
+        self.method = method
+        self.tx = enabled_tx(PARAMS.CONFIG) if tx is None else tuple(tx)
+        if azimuths is None:
+            azimuths = angle_grid(PARAMS.NUM_AZIM_BINS)
+        if elevations is None:
+            elevations = np.zeros(1)
+        elif elevations is True:
+            elevations = angle_grid(PARAMS.NUM_ELEV_BINS)
+        self.azimuths = np.asarray(azimuths, dtype=float)
+        self.elevations = np.asarray(elevations, dtype=float)
+        self.loading = loading
+        self.azimuth_axis = np.degrees(self.azimuths)
+        self.elevation_axis = np.degrees(self.elevations)
+
+        # Steering matrix of shape (elevation * azimuth, num_vx), computed once
+        el, az = np.meshgrid(self.elevations, self.azimuths, indexing='ij')
+        geometry = get_device(device)
+        self.num_vx = geometry.num_virtual(self.tx)
+        self._steering = geometry.steering_vectors(az.reshape(-1), el.reshape(-1), self.tx).astype(np.complex64)
+        self._identity = np.eye(self.num_vx, dtype=np.complex64)
+
+    @property
+    def shape(self):
+        """Shape of the spectrum of one range bin, (azimuth,) or (elevation, azimuth)"""
+        if len(self.elevations) == 1:
+            return (len(self.azimuths),)
+        return (len(self.elevations), len(self.azimuths))
+
+    def covariance(self, cube, range_idx=None):
+        """Returns the covariance matrices of the virtual array for every range bin
+
+        Args:
+            cube (ndarray): Complex array of shape (snapshots, num_vx, range), e.g. the range FFT of
+                every chirp of a frame
+            range_idx (ndarray): Range bins to compute, e.g. detections['range_idx'], all by default
+
+        Returns:
+            ndarray: Covariance matrices of shape (range, num_vx, num_vx)
+
+        """
+        if cube.shape[1] != self.num_vx:
+            raise ValueError('Cube with {} virtual antennas given for {}'.format(cube.shape[1], self.num_vx))
+        if range_idx is not None:
+            cube = cube[:, :, range_idx]
+        cube = cube.astype(np.complex64, copy=False)
+        return np.einsum('svr,swr->rvw', cube, cube.conj(), optimize=True) / cube.shape[0]
+
+    def spectrum(self, cube, range_idx=None):
+        """Returns the angle spectrum of every range bin of a frame
+
+        Args:
+            cube (ndarray): Complex array of shape (snapshots, num_vx, range), see covariance
+            range_idx (ndarray): Range bins to compute, all by default
+
+        Returns:
+            ndarray: Power of shape (range,) + self.shape, float32
+
+        """
+        covariance = self.covariance(cube, range_idx)
+        steering = self._steering
+        if self.method == 'capon':
+            # Loading relative to the mean eigenvalue, and 1 for empty range bins
+            power = np.einsum('rvv->r', covariance).real / self.num_vx
+            load = self.loading * np.where(power > 0, power, 1.)
+            covariance += load[:, None, None] * self._identity
+            inverse = np.linalg.inv(covariance)
+            spectrum = np.einsum('av,rvw,aw->ra', steering.conj(), inverse, steering, optimize=True).real
+            spectrum = 1 / np.maximum(spectrum, np.finfo(np.float32).tiny)
+        else:
+            spectrum = np.einsum('av,rvw,aw->ra', steering.conj(), covariance, steering, optimize=True).real
+            spectrum /= self.num_vx ** 2
+        return spectrum.astype(np.float32, copy=False).reshape((len(spectrum),) + self.shape)
@@ -0,0 +1,439 @@
+"""
+
+PIPELINE BENCHMARK
+==================
+
+Measure how far the capture-to-heatmap pipeline is from real time.
+
+Frames go through the same stages as the live and animated plots: receive,
+organize, separate_tx, rangeFFT, angleFFT, dopplerFFT and, optionally, drawing
+an azimuth-range heatmap. Frames are either synthetic, taken from memory, or
+received over UDP from a local ReplayServer (see replay_server.py), which
+includes the socket and frame assembly in the measurement.
+
+For each stage the median (p50) and 99th percentile (p99) latencies are
+reported, along with the pipeline throughput in frames/s, the peak memory
+allocated while processing a frame and the peak resident memory of the
+process. Results are appended to a JSON lines file together with the git
+commit, so that runs can be compared across commits. UDP runs replay at the
+configured frame rate by default; runs with partial or lost frames are marked
+incomplete, as their stages then processed zero-filled frames, and are never
+used as a baseline:
+
+    python benchmark.py --samples 256 --loops 128 --tx 3 --rx 4
+    python benchmark.py --udp --speed 2 --compare
+    python benchmark.py --fft-backend scipy --fft-workers 4
+
+Included functions:
+    - benchmark_config
+    - synthetic_frames
+    - run_benchmark
+    - save_result
+    - load_results
+    - find_baseline
+    - print_result
+
+"""
+
+import argparse
+import itertools
+import json
+import os
+import platform
+import subprocess
+import time
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+import fft_backend
+from dca1000 import DCA1000, UINT16_IN_FRAME
+from devices import CHIRP_TX_ORDER, get_device
+from fourier import angleFFT, dopplerFFT, rangeFFT
+from params import PARAMS
+from replay_server import ReplayServer
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+RESULTS_FILE = os.path.join('benchmarks', 'results.jsonl')
+DEFAULT_DEVICE = 'IWR6843ISK-ODS'
+
+
+def benchmark_config(samples=None, loops=None, tx=None, rx=None, base=None):
+    """Returns a PARAMS.CONFIG dictionary with some dimensions replaced
+
+    Args:
+        samples (int): ADC samples per chirp
+        loops (int): Chirp loops per frame
+        tx (int): Number of TX antennas, 1 to 3, enabled in the chirp order of the lua script
+        rx (int): Number of RX antennas
+        base (dict): Configuration to start from, PARAMS.CONFIG by default
+
+    Returns:
+        dict: Configuration to pass to PARAMS.set_playback_mode
+
+    """
+    config = dict(PARAMS.CONFIG if base is None else base)
+    if samples is not None:
+        config['ADC_SAMPLES'] = float(samples)
+    if loops is not None:
+        config['CHIRP_LOOPS'] = float(loops)
+    if rx is not None:
+        config['NUM_RX'] = float(rx)
+    if tx is not None:
+        for i in range(3):
+            config['TX{}_EN'.format(i)] = float(i in CHIRP_TX_ORDER[:tx])
+        config['NUM_TX'] = float(tx)
+        config['END_CHIRP_TX'] = float(tx - 1)
+    return config
+
+
+def synthetic_frames(config, count=8, seed=0):
+    """Returns random int16 frames with the size of a configuration
+
+    Args:
+        config (dict): PARAMS.CONFIG dictionary
+        count (int): Number of different frames
+        seed (int): Random generator seed
+
+    Returns:
+        ndarray: Frames of shape (count, frame_size), as read by DCA1000.read
+
+    """
+    size = int(config['NUM_TX'] * config['NUM_RX'] * config['CHIRP_LOOPS'] * config['ADC_SAMPLES'] * 2)
+    rng = np.random.default_rng(seed)
+    return rng.integers(-2048, 2048, size=(count, size), dtype=np.int16)
+
+
+def _git_commit():
+    """Returns the current commit hash and whether the tree has local changes, or None"""
+    cwd = os.path.dirname(os.path.abspath(__file__))
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                                check=True, cwd=cwd).stdout.strip()
+        dirty = bool(subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'],
+                                    capture_output=True, text=True, check=True, cwd=cwd).stdout.strip())
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+    return commit, dirty
+
+
+def _max_rss_mb():
+    """Returns the peak resident memory of the process in MB, or None if unknown"""
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Bytes on macOS, kilobytes elsewhere
+    return rss / 2**20 if platform.system() == 'Darwin' else rss / 2**10
+
+
+class _Pipeline:
+    """Stages of the capture-to-heatmap pipeline for the current PARAMS"""
+
+    def __init__(self, device, plot):
+        self.device = device
+        geometry = get_device(device)
+        if geometry.num_rx != PARAMS.RX_ANTENNAS or PARAMS.TX_ANTENNAS > geometry.num_tx:
+            raise ValueError('{} has {} TX and {} RX antennas, {} TX and {} RX given'.format(
+                device, geometry.num_tx, geometry.num_rx, PARAMS.TX_ANTENNAS, PARAMS.RX_ANTENNAS))
+        self.stages = ['receive', 'organize', 'separate_tx', 'range_fft', 'angle_fft', 'doppler_fft']
+        if plot:
+            self.stages += ['plot']
+            self._init_plot()
+        self.stages += ['total']
+
+    def _init_plot(self):
+        """Helper function creating an off-screen azimuth-range heatmap as in the live plots"""
+        fig = Figure()
+        self._canvas = FigureCanvasAgg(fig)
+        ax = fig.add_subplot()
+        matrix = np.zeros((PARAMS.NUM_AZIM_BINS - 1, PARAMS.NUM_RANGE_BINS))
+        self._mesh = ax.pcolormesh(matrix)
+        fig.colorbar(self._mesh, ax=ax)
+
+    def process(self, read, times):
+        """Runs every stage on the frame returned by read, appending durations in seconds to times"""
+        start = t = time.perf_counter()
+
+        adc_data = read()
+        t = self._lap(times, 'receive', t)
+        data = DCA1000.organize(adc_data, num_chirps=PARAMS.CHIRPS_PER_FRAME,
+                                num_rx=PARAMS.RX_ANTENNAS, num_samples=PARAMS.ADC_SAMPLES)
+        t = self._lap(times, 'organize', t)
+        v_array = DCA1000.separate_tx(data, num_tx=PARAMS.TX_ANTENNAS)
+        t = self._lap(times, 'separate_tx', t)
+
+        RC, _, _ = rangeFFT(v_array[1, :, :], self.device)
+        t = self._lap(times, 'range_fft', t)
+        aFFT, _, _, _ = angleFFT(RC)
+        t = self._lap(times, 'angle_fft', t)
+
+        dopplerFFT(v_array)
+        t = self._lap(times, 'doppler_fft', t)
+
+        if 'plot' in times:
+            self._mesh.set_array(aFFT[1:, :].ravel())
+            self._canvas.draw()
+            t = self._lap(times, 'plot', t)
+
+        times['total'].append(t - start)
+
+    @staticmethod
+    def _lap(times, stage, t):
+        """Helper function recording the duration of a stage and returning the current time"""
+        now = time.perf_counter()
+        times[stage].append(now - t)
+        return now
+
+
+def run_benchmark(samples=None, loops=None, tx=None, rx=None, device=DEFAULT_DEVICE, frames=100,
+                  warmup=5, udp=False, speed=1., plot=False, data_port=47098, config_port=47096):
+    """Runs the pipeline on a number of frames and returns its statistics
+
+    PARAMS is switched to the benchmark configuration and restored afterwards.
+    rangeFFT and angleFFT need the virtual array of a device registered in
+    devices.py, so the TX and RX counts must fit the device.
+
+    Args:
+        samples (int): ADC samples per chirp, from PARAMS by default
+        loops (int): Chirp loops per frame, from PARAMS by default
+        tx (int): Number of TX antennas, from PARAMS by default
+        rx (int): Number of RX antennas, from PARAMS by default
+        device (str): Radar model identifier passed to rangeFFT
+        frames (int): Number of measured frames
+        warmup (int): Frames processed before measuring
+        udp (bool): Receive frames from a local ReplayServer instead of memory. The frame size
+            of the DCA1000 class is set on import, so the configuration cannot be changed
+        speed (float): Replay speed relative to the configured frame rate, 0 or None for as fast as
+            possible, which usually overflows the socket
+        plot (bool): Also draw an off-screen azimuth-range heatmap for each frame
+        data_port (int): Data port of the ReplayServer and DCA1000
+        config_port (int): Config port of the ReplayServer and DCA1000
+
+    Returns:
+        dict: Configuration, frames/s, per-stage p50/p99/mean latencies in ms, memory usage
+        and, over UDP, capture statistics and whether frames were incomplete
+
+    Raises:
+        ValueError: If the device is unknown or has fewer TX or other RX antennas than configured
+
+    """
+    config = benchmark_config(samples, loops, tx, rx)
+    previous = PARAMS.MODE, PARAMS.CONFIG
+    PARAMS.set_playback_mode(config)
+    try:
+        pool = synthetic_frames(config)
+        pipeline = _Pipeline(device, plot)
+        result = {'config': {'samples': PARAMS.ADC_SAMPLES, 'loops': PARAMS.CHIRP_LOOPS,
+                             'tx': PARAMS.TX_ANTENNAS, 'rx': PARAMS.RX_ANTENNAS},
+                  'device': device,
+                  'source': 'udp' if udp else 'memory',
+                  'speed': speed if udp else None,
+                  'plot': 'plot' in pipeline.stages,
+                  'fft_backend': fft_backend.get_backend().name,
+                  'fft_workers': fft_backend.get_backend().workers,
+                  'frames': frames}
+
+        if udp:
+            if pool.shape[1] != UINT16_IN_FRAME:
+                raise ValueError('Over UDP, the configuration must match the one PARAMS had on import')
+            result.update(_run_udp(pipeline, pool, frames, warmup, speed, data_port, config_port))
+        else:
+            count = itertools.count()
+            result.update(_measure(pipeline, lambda: pool[next(count) % len(pool)], frames, warmup))
+    finally:
+        PARAMS.MODE, PARAMS.CONFIG = previous
+        PARAMS.parse_config()
+
+    return result
+
+
+def _run_udp(pipeline, pool, frames, warmup, speed, data_port, config_port):
+    """Helper function measuring the pipeline on frames received from a ReplayServer"""
+    fps = 1000. / PARAMS.Tperiodicity if PARAMS.Tperiodicity else None
+    server = ReplayServer(pool, data_port=data_port, config_port=config_port, fps=fps,
+                          speed=speed, loop=True)
+    dca = DCA1000(static_ip=server.host_ip, adc_ip=server.adc_ip, data_port=data_port,
+                  config_port=config_port, rcvbuf_size=64 * 1024 * 1024)
+    server.start()
+    try:
+        result = _measure(pipeline, dca.read, frames, warmup)
+    finally:
+        server.close()
+        dca.close()
+    result['capture'] = dca.stats.as_dict()
+    result['incomplete'] = bool(result['capture']['partial_frames'] or result['capture']['lost_frames'])
+    return result
+
+
+def _measure(pipeline, read, frames, warmup):
+    """Helper function timing frames, then measuring memory on a few more"""
+    times = {stage: [] for stage in pipeline.stages}
+    for _ in range(warmup):
+        pipeline.process(read, times)
+    times = {stage: [] for stage in pipeline.stages}
+
+    start = time.perf_counter()
+    for _ in range(frames):
+        pipeline.process(read, times)
+    elapsed = time.perf_counter() - start
+
+    # tracemalloc slows allocations down, so memory is measured separately
+    tracemalloc.start()
+    for _ in range(3):
+        pipeline.process(read, {stage: [] for stage in pipeline.stages})
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    stages = {}
+    for stage, durations in times.items():
+        durations = np.array(durations) * 1e3
+        stages[stage] = {'p50_ms': float(np.percentile(durations, 50)),
+                         'p99_ms': float(np.percentile(durations, 99)),
+                         'mean_ms': float(durations.mean())}
+
+    return {'fps': frames / elapsed,
+            'stages': stages,
+            'peak_frame_memory_mb': peak / 2**20,
+            'max_rss_mb': _max_rss_mb()}
+
+
+def save_result(result, path=RESULTS_FILE):
+    """Appends a benchmark result to a JSON lines file, with the commit and the platform
+
+    Args:
+        result (dict): Result of run_benchmark
+        path (str): Results file, created if needed
+
+    Returns:
+        dict: Stored entry
+
+    """
+    commit, dirty = _git_commit()
+    entry = {'date': datetime.now().isoformat(),
+             'commit': commit,
+             'dirty': dirty,
+             'host': platform.node(),
+             'python': platform.python_version(),
+             'numpy': np.__version__}
+    entry.update(result)
+
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'a') as f:
+        f.write(json.dumps(entry) + '\n')
+    return entry
+
+
+def load_results(path=RESULTS_FILE):
+    """Returns every result stored in a JSON lines file, oldest first
+
+    Args:
+        path (str): Results file
+
+    Returns:
+        list: Stored entries, empty if the file does not exist
+
+    """
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def _comparable(a, b):
+    """Helper function telling whether two results measured the same thing"""
+    keys = ('config', 'device', 'source', 'speed', 'plot', 'fft_backend', 'fft_workers')
+    return all(a.get(k) == b.get(k) for k in keys)
+
+
+def print_result(result, baseline=None):
+    """Prints a result as a table, with the change relative to a baseline if given
+
+    Args:
+        result (dict): Result of run_benchmark
+        baseline (dict): Earlier result with the same configuration
+
+    Returns:
+        None
+
+    """
+    config = result['config']
+    print('{} frames of {} samples x {} loops x {} TX x {} RX from {}'.format(
+        result['frames'], config['samples'], config['loops'], config['tx'], config['rx'], result['source']))
+    print('FFT backend: {} with {} worker(s)'.format(result.get('fft_backend'), result.get('fft_workers')))
+    if baseline is not None:
+        print('Compared to commit {} of {}'.format((baseline.get('commit') or '?')[:10], baseline.get('date')))
+
+    print('{:<14}{:>10}{:>10}{:>10}'.format('stage', 'p50 ms', 'p99 ms', 'mean ms'))
+    for stage, stats in result['stages'].items():
+        line = '{:<14}{:>10.3f}{:>10.3f}{:>10.3f}'.format(stage, stats['p50_ms'], stats['p99_ms'], stats['mean_ms'])
+        if baseline is not None and stage in baseline['stages']:
+            line += '{:>+10.1f}%'.format(100 * (stats['p50_ms'] / baseline['stages'][stage]['p50_ms'] - 1))
+        print(line)
+
+    line = 'Throughput: {:.1f} frames/s'.format(result['fps'])
+    if baseline is not None:
+        line += ' ({:+.1f}%)'.format(100 * (result['fps'] / baseline['fps'] - 1))
+    print(line)
+    print('Peak frame memory: {:.1f} MB, peak RSS: {} MB'.format(
+        result['peak_frame_memory_mb'],
+        'n/a' if result['max_rss_mb'] is None else '{:.1f}'.format(result['max_rss_mb'])))
+    if 'capture' in result:
+        print('Capture:', result['capture'])
+    if result.get('incomplete'):
+        print('Warning: frames were partial or lost, stages were timed on zero-filled frames. '
+              'Lower --speed, this result is not used as a baseline')
+
+
+def find_baseline(result, path=RESULTS_FILE):
+    """Returns the latest complete result stored with the same configuration, or None
+
+    Args:
+        result (dict): Result of run_benchmark
+        path (str): Results file
+
+    Returns:
+        dict: Baseline entry
+
+    """
+    matches = [entry for entry in load_results(path)
+               if _comparable(entry, result) and not entry.get('incomplete')]
+    return matches[-1] if matches else None
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the capture-to-heatmap pipeline')
+    parser.add_argument('--samples', type=int, default=None)
+    parser.add_argument('--loops', type=int, default=None)
+    parser.add_argument('--tx', type=int, default=None)
+    parser.add_argument('--rx', type=int, default=None)
+    parser.add_argument('--device', default=DEFAULT_DEVICE)
+    parser.add_argument('--frames', type=int, default=100)
+    parser.add_argument('--warmup', type=int, default=5)
+    parser.add_argument('--udp', action='store_true', help='receive frames from a local replay server')
+    parser.add_argument('--speed', type=float, default=1.,
+                        help='replay speed relative to the frame rate, 0 to send as fast as possible')
+    parser.add_argument('--plot', action='store_true', help='also draw an azimuth-range heatmap')
+    parser.add_argument('--results', default=RESULTS_FILE, help='JSON lines file to store results in')
+    parser.add_argument('--compare', action='store_true', help='compare with the last stored result')
+    parser.add_argument('--no-save', action='store_true')
+    parser.add_argument('--fft-backend', default=None, choices=sorted(fft_backend.BACKENDS),
+                        help='fastest installed one by default')
+    parser.add_argument('--fft-workers', type=int, default=None, help='every core by default')
+    args = parser.parse_args()
+
+    fft_backend.set_backend(args.fft_backend, args.fft_workers)
+
+    result = run_benchmark(args.samples, args.loops, args.tx, args.rx, args.device, args.frames,
+                           args.warmup, args.udp, args.speed, args.plot)
+    baseline = find_baseline(result, args.results) if args.compare else None
+    print_result(result, baseline)
+    if not args.no_save:
+        save_result(result, args.results)
@@ -0,0 +1,213 @@
+"""
+
+CFAR DETECTION
+==============
+
+Constant false alarm rate detection on range-Doppler maps.
+
+A CFAR detector compares each cell of a map with the noise estimated from
+the training cells around it, excluding the guard cells next to it. The
+whole map is processed at once:
+
+    - CA (cell averaging): mean of the training cells, from box sums of a
+      2D cumulative sum, O(1) per cell whatever the window size
+    - GO / SO (greatest / smallest of): larger or smaller of the means of the
+      training cells before and after the cell in range, from the same box sums
+    - OS (ordered statistic): rank-th smallest training cell, selected with
+      np.partition over sliding windows, robust to nearby targets
+
+Maps are indexed (doppler, range) as the output of fourier.dopplerFFT. Complex
+maps are turned into power, real maps are used as they are. The Doppler axis
+wraps around as it is periodic, the range axis is mirrored at its ends.
+
+    >>> dFFT, dBins, rBins = dopplerFFT(rdata.separated_vx_data)
+    >>> detections = CFAR('ca', train=(4, 8), guard=(2, 2), pfa=1e-4).detect(dFFT)
+    >>> rBins[detections['range_idx']], dBins[detections['doppler_idx']], detections['snr']
+
+Included classes/functions:
+    - CFAR
+    - DETECTION_DTYPE
+
+"""
+
+import numpy as np
+
+METHODS = ('ca', 'go', 'so', 'os')
+
+# One detection per cell above the threshold, snr in dB
+DETECTION_DTYPE = np.dtype([('doppler_idx', '<i4'),
+                            ('range_idx', '<i4'),
+                            ('peak', '<f4'),
+                            ('noise', '<f4'),
+                            ('snr', '<f4')])
+
+# Maximum number of training cells gathered at once by OS-CFAR
+OS_BLOCK_CELLS = 1 << 22
+
+
+def _os_pfa(alpha, n, k):
+    """Helper function returning the false alarm probability of OS-CFAR in exponential noise"""
+    i = np.arange(k)
+    return np.prod((n - i) / (n - i + alpha))
+
+
+class CFAR:
+    """2D CFAR detector with precomputed windows and threshold factor.
+
+    The threshold factor is derived from pfa assuming square-law detected
+    (power) cells in exponential noise: exactly for CA and OS, and with the
+    count of one half of the training cells for GO and SO. Pass scale to set it
+    directly, e.g. for magnitude maps.
+
+    Attributes:
+        method (str): 'ca', 'go', 'so' or 'os'
+        train (tuple): Training cells on each side of the cell, (doppler, range)
+        guard (tuple): Guard cells on each side of the cell, (doppler, range)
+        pfa (float): Target false alarm probability
+        scale (float): Threshold factor applied to the noise estimate, from pfa if None
+        rank (int): Rank, from 0, of the training cell used as noise by OS-CFAR, 3/4 of them by default
+        num_train (int): Training cells of each window
+
+    """
+
+    def __init__(self, method='ca', train=(4, 8), guard=(2, 2), pfa=1e-3, scale=None, rank=None):
+        if method not in METHODS:
+            raise ValueError('Unknown CFAR method {}, choose from {}'.format(method, METHODS))
+        self.method = method
+        self.train = tuple(int(t) for t in train)
+        self.guard = tuple(int(g) for g in guard)
+        self.pfa = pfa
+        self._half = tuple(t + g for t, g in zip(self.train, self.guard))
+
+        # Training cells of the window centred on the cell, the guard cells and the cell excluded
+        window = np.ones((2 * self._half[0] + 1, 2 * self._half[1] + 1), dtype=bool)
+        td, tr = self.train
+        window[td:window.shape[0] - td, tr:window.shape[1] - tr] = False
+        self._training = np.nonzero(window)
+        self.num_train = int(window.sum())
+        if self.num_train == 0:
+            raise ValueError('CFAR windows need training cells')
+        self.rank = int(0.75 * self.num_train) if rank is None else rank
+        if not 0 <= self.rank < self.num_train:
+            raise ValueError('rank must be lower than the {} training cells'.format(self.num_train))
+
+        if scale is None:
+            scale = self._scale_from_pfa()
+        self.scale = scale
+
+    def _scale_from_pfa(self):
+        """Helper function computing the threshold factor giving pfa"""
+        if self.method == 'os':
+            # The false alarm probability decreases with alpha, found by bisection
+            low, high = 0., 1.
+            while _os_pfa(high, self.num_train, self.rank + 1) > self.pfa:
+                high *= 2
+            for _ in range(100):
+                mid = (low + high) / 2
+                if _os_pfa(mid, self.num_train, self.rank + 1) > self.pfa:
+                    low = mid
+                else:
+                    high = mid
+            return high
+        n = self.num_train if self.method == 'ca' else self.num_train // 2
+        return n * (self.pfa ** (-1 / n) - 1)
+
+    def _pad(self, power):
+        """Helper function padding a map with the Doppler axis wrapped and the range axis mirrored"""
+        hd, hr = self._half
+        padded = np.pad(power, ((hd, hd), (0, 0)), mode='wrap')
+        return np.pad(padded, ((0, 0), (hr, hr)), mode='symmetric')
+
+    def noise(self, power):
+        """Estimates the noise of every cell of a map
+
+        Args:
+            power (ndarray): Real map of shape (doppler, range)
+
+        Returns:
+            ndarray: Noise estimate of each cell, float64
+
+        """
+        if self.method == 'os':
+            return self._noise_os(power)
+
+        hd, hr = self._half
+        gd, gr = self.guard
+        padded = self._pad(power.astype(np.float64, copy=False))
+        table = np.zeros((padded.shape[0] + 1, padded.shape[1] + 1))
+        np.cumsum(padded, axis=0, out=table[1:, 1:])
+        np.cumsum(table[1:, 1:], axis=1, out=table[1:, 1:])
+
+        def box(rows, cols):
+            # Sum of the cells at offsets rows[0]..rows[1], cols[0]..cols[1] from every cell
+            r0, r1 = rows[0] + hd, rows[1] + hd + 1
+            c0, c1 = cols[0] + hr, cols[1] + hr + 1
+            d, r = power.shape
+            return (table[r1:r1 + d, c1:c1 + r] - table[r0:r0 + d, c1:c1 + r] -
+                    table[r1:r1 + d, c0:c0 + r] + table[r0:r0 + d, c0:c0 + r])
+
+        if self.method == 'ca':
+            total = box((-hd, hd), (-hr, hr)) - box((-gd, gd), (-gr, gr))
+            return total / self.num_train
+
+        # Training cells before and after the cell in range
+        before = box((-hd, hd), (-hr, -1)) - box((-gd, gd), (-gr, -1))
+        after = box((-hd, hd), (1, hr)) - box((-gd, gd), (1, gr))
+        count = (2 * hd + 1) * hr - (2 * gd + 1) * gr
+        if count == 0:
+            raise ValueError('GO and SO CFAR need training cells in range')
+        select = np.maximum if self.method == 'go' else np.minimum
+        return select(before, after) / count
+
+    def _noise_os(self, power):
+        """Helper function estimating the noise with the ordered statistic of the training cells"""
+        padded = self._pad(power.astype(np.float32, copy=False))
+        windows = np.lib.stride_tricks.sliding_window_view(
+            padded, (2 * self._half[0] + 1, 2 * self._half[1] + 1))
+        noise = np.empty(power.shape)
+        rows = max(1, OS_BLOCK_CELLS // (power.shape[1] * self.num_train))
+        for start in range(0, power.shape[0], rows):
+            cells = windows[start:start + rows][:, :, self._training[0], self._training[1]]
+            cells.partition(self.rank, axis=-1)
+            noise[start:start + rows] = cells[..., self.rank]
+        return noise
+
+    def threshold(self, power):
+        """Returns the detection threshold and the noise estimate of every cell of a map
+
+        Args:
+            power (ndarray): Map of shape (doppler, range), complex maps are turned into power
+
+        Returns:
+            tuple: threshold and noise arrays of the map shape
+
+        """
+        if np.iscomplexobj(power):
+            power = np.abs(power) ** 2
+        noise = self.noise(power)
+        return noise * self.scale, noise
+
+    def detect(self, power):
+        """Returns the cells of a map above their threshold
+
+        Args:
+            power (ndarray): Map of shape (doppler, range), e.g. dFFT from fourier.dopplerFFT.
+                Complex maps are turned into power
+
+        Returns:
+            ndarray: Detections of dtype DETECTION_DTYPE, sorted by Doppler then range index
+
+        """
+        if np.iscomplexobj(power):
+            power = np.abs(power) ** 2
+        threshold, noise = self.threshold(power)
+        doppler_idx, range_idx = np.nonzero(power > threshold)
+
+        detections = np.empty(len(doppler_idx), dtype=DETECTION_DTYPE)
+        detections['doppler_idx'] = doppler_idx
+        detections['range_idx'] = range_idx
+        detections['peak'] = power[doppler_idx, range_idx]
+        detections['noise'] = noise[doppler_idx, range_idx]
+        with np.errstate(divide='ignore'):
+            detections['snr'] = 10 * np.log10(detections['peak'] / detections['noise'])
+        return detections
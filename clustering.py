@@ -0,0 +1,266 @@
+"""
+
+POINT CLOUD CLUSTERING
+======================
+
+DBSCAN clustering of radar point clouds with a spatial index.
+
+Points of pointcloud.POINT_DTYPE are compared with a Doppler-weighted
+distance: the Euclidean distance between (x, y, z, doppler_weight * doppler),
+so that two targets passing each other at different speeds are kept apart.
+Neighbours within eps are found with one of two indexes:
+
+    - grid: points are sorted by cells of size eps, and the candidates of
+      every point are read from its own cell and half of the cells around
+      it, so that each pair is found once, with searchsorted calls over the
+      sorted cell keys for all cells at once
+    - kdtree: scipy.spatial.cKDTree, when scipy is installed
+
+Core points, with at least min_samples neighbours including themselves, are
+joined into clusters by connected components, found with a vectorized
+union-find, and border points take the cluster of one of their core
+neighbours. Every step works on whole arrays, so no Python code runs per
+point, and the cost grows with the number of pairs of points within eps.
+
+Sparse clouds are clustered more reliably over several frames. With frames
+greater than 1, update clusters each new frame together with the previous
+ones. The cell keys of a frame are computed once, when it enters the window:
+
+    >>> dbscan = DBSCAN(eps=0.5, min_samples=4, doppler_weight=0.5, frames=3)
+    >>> labels = dbscan.update(points)
+    >>> clusters = cluster_centroids(points, labels)
+
+Included classes/functions:
+    - DBSCAN
+    - cluster_centroids
+    - CLUSTER_DTYPE
+
+"""
+
+from collections import deque
+
+import numpy as np
+
+try:
+    from scipy.spatial import cKDTree
+except ImportError:
+    cKDTree = None
+
+INDEXES = ('grid', 'kdtree')
+
+# Centroid, number of points and total SNR of each cluster
+CLUSTER_DTYPE = np.dtype([('x', '<f4'),
+                          ('y', '<f4'),
+                          ('z', '<f4'),
+                          ('doppler', '<f4'),
+                          ('size', '<i4'),
+                          ('snr', '<f4')])
+
+# Bits per cell coordinate in the grid keys, and offset making coordinates positive
+_KEY_BITS = 21
+_KEY_BIAS = 1 << (_KEY_BITS - 1)
+
+
+def _pack(cells):
+    """Helper function packing integer cell coordinates of shape (n, dims) into int64 keys"""
+    keys = np.zeros(len(cells), dtype=np.int64)
+    for d in range(cells.shape[1]):
+        keys <<= _KEY_BITS
+        keys |= cells[:, d] + _KEY_BIAS
+    return keys
+
+
+def _components(n, a, b):
+    """Helper function labelling the connected components of a graph given by its edges
+
+    Each edge hooks the root of its larger label to the root of the smaller one, then
+    labels are followed to their root, until both ends of every edge share a root.
+    Edges already inside a component are dropped at each round.
+    """
+    labels = np.arange(n)
+    while len(a):
+        root_a, root_b = labels[a], labels[b]
+        differ = root_a != root_b
+        a, b = a[differ], b[differ]
+        if not len(a):
+            break
+        root_a, root_b = root_a[differ], root_b[differ]
+        np.minimum.at(labels, np.maximum(root_a, root_b), np.minimum(root_a, root_b))
+        while True:
+            jumped = labels[labels]
+            if np.array_equal(jumped, labels):
+                break
+            labels = jumped
+    return labels
+
+
+class DBSCAN:
+    """Density-based clustering of point clouds, over one frame or a sliding window of frames.
+
+    Attributes:
+        eps (float): Neighbourhood radius in m
+        min_samples (int): Neighbours, including the point itself, of a core point
+        doppler_weight (float): m of distance per m/s of Doppler difference, 0 to ignore Doppler
+        use_elevation (bool): Include z in the distance, else cluster in the xy plane
+        frames (int): Frames clustered together by update
+        index (str): 'grid' or 'kdtree', which needs scipy
+
+    """
+
+    def __init__(self, eps=0.5, min_samples=4, doppler_weight=0.5, use_elevation=True, frames=1, index='grid'):
+        if index not in INDEXES:
+            raise ValueError('Unknown index {}, choose from {}'.format(index, INDEXES))
+        if index == 'kdtree' and cKDTree is None:
+            raise ImportError('The kdtree index needs scipy')
+        self.eps = eps
+        self.min_samples = min_samples
+        self.doppler_weight = doppler_weight
+        self.use_elevation = use_elevation
+        self.frames = frames
+        self.index = index
+        self._spatial = 3 if use_elevation else 2
+
+        # Offsets of the neighbouring cells in packed key units, only those after the
+        # cell in key order as the others find the same pairs from the other side
+        grid = np.stack(np.meshgrid(*[np.arange(-1, 2)] * self._spatial, indexing='ij'), -1)
+        offsets = _pack(grid.reshape(-1, self._spatial)) - _pack(np.zeros((1, self._spatial), dtype=int))
+        self._offsets = offsets[offsets > 0]
+
+        self._window = deque(maxlen=frames)
+
+    def _features(self, points):
+        """Helper function returning the scaled coordinates the distance is computed on"""
+        columns = ['x', 'y', 'z'][:self._spatial]
+        features = np.empty((len(points), self._spatial + 1), dtype=np.float32)
+        for d, name in enumerate(columns):
+            features[:, d] = points[name]
+        features[:, -1] = points['doppler'] * self.doppler_weight
+        return features
+
+    def _keys(self, features):
+        """Helper function returning the grid cell key of each point"""
+        return _pack(np.floor(features[:, :self._spatial] / self.eps).astype(np.int64))
+
+    def _pairs(self, features, keys):
+        """Helper function returning every unordered pair of points within eps, once"""
+        if self.index == 'kdtree':
+            pairs = cKDTree(features).query_pairs(self.eps, output_type='ndarray')
+            return pairs[:, 0], pairs[:, 1]
+
+        # keys are sorted, the points of a cell are contiguous
+        n = len(keys)
+        new_cell = np.empty(n, dtype=bool)
+        new_cell[0] = True
+        np.not_equal(keys[1:], keys[:-1], out=new_cell[1:])
+        starts = np.flatnonzero(new_cell)
+        cells = keys[starts]
+        sizes = np.diff(np.append(starts, n))
+        cell = np.cumsum(new_cell) - 1
+
+        # Ranges of candidates of each point: the rest of its cell, then each neighbouring cell
+        neighbours = (cells[:, None] + self._offsets[None, :]).ravel()
+        found = np.minimum(np.searchsorted(cells, neighbours), len(cells) - 1)
+        lo = np.empty((n, self._offsets.size + 1), dtype=np.int64)
+        counts = np.empty_like(lo)
+        lo[:, 0] = np.arange(1, n + 1)
+        counts[:, 0] = starts[cell] + sizes[cell] - lo[:, 0]
+        lo[:, 1:] = starts[found].reshape(len(cells), -1)[cell]
+        counts[:, 1:] = np.where(cells[found] == neighbours, sizes[found], 0).reshape(len(cells), -1)[cell]
+        lo, counts = lo.ravel(), counts.ravel()
+
+        total = counts.sum()
+        first = np.cumsum(counts) - counts
+        i = np.repeat(np.repeat(np.arange(n), self._offsets.size + 1), counts)
+        j = np.repeat(lo - first, counts) + np.arange(total)
+
+        difference = np.take(features, i, axis=0)
+        difference -= np.take(features, j, axis=0)
+        close = np.einsum('ij,ij->i', difference, difference) <= self.eps ** 2
+        return i[close], j[close]
+
+    def _cluster(self, features, keys):
+        """Helper function running DBSCAN on features, returning labels with -1 for noise"""
+        n = len(features)
+        if n == 0:
+            return np.empty(0, dtype=np.int32)
+        order = np.argsort(keys, kind='stable')
+        i, j = self._pairs(features[order], keys[order])
+        neighbours = np.bincount(i, minlength=n) + np.bincount(j, minlength=n) + 1
+        core = neighbours >= self.min_samples
+
+        labels = np.full(n, -1, dtype=np.int64)
+        edges = core[i] & core[j]
+        components = _components(n, i[edges], j[edges])
+        labels[core] = components[core]
+        border = ~core[i] & core[j]
+        labels[i[border]] = labels[j[border]]
+        border = core[i] & ~core[j]
+        labels[j[border]] = labels[i[border]]
+
+        # Consecutive cluster numbers from 0, in the original point order
+        found = labels >= 0
+        labels[found] = np.unique(labels[found], return_inverse=True)[1]
+        result = np.empty(n, dtype=np.int32)
+        result[order] = labels
+        return result
+
+    def fit(self, points):
+        """Clusters the points of one frame, without the window
+
+        Args:
+            points (ndarray): Points of dtype pointcloud.POINT_DTYPE
+
+        Returns:
+            ndarray: Cluster of each point, -1 for noise
+
+        """
+        features = self._features(points)
+        return self._cluster(features, self._keys(features))
+
+    def update(self, points):
+        """Adds a frame to the window and clusters the points of the window
+
+        Args:
+            points (ndarray): Points of dtype pointcloud.POINT_DTYPE of the new frame
+
+        Returns:
+            ndarray: Cluster of each point of the new frame, -1 for noise. Cluster numbers
+            are not kept from one frame to the next, see tracking.py for that
+
+        """
+        features = self._features(points)
+        self._window.append((features, self._keys(features)))
+        labels = self._cluster(np.concatenate([f for f, _ in self._window]),
+                               np.concatenate([k for _, k in self._window]))
+        return labels[len(labels) - len(points):]
+
+    def reset(self):
+        """Empties the window of frames"""
+        self._window.clear()
+
+
+def cluster_centroids(points, labels):
+    """Returns the SNR weighted centroid, size and total SNR of each cluster
+
+    Args:
+        points (ndarray): Points of dtype pointcloud.POINT_DTYPE
+        labels (ndarray): Cluster of each point, -1 for noise
+
+    Returns:
+        ndarray: One entry of dtype CLUSTER_DTYPE per cluster, in cluster number order
+
+    """
+    found = labels >= 0
+    labels = labels[found]
+    points = points[found]
+    count = labels.max() + 1 if len(labels) else 0
+
+    # SNR in dB is turned into linear weights
+    weights = 10 ** (points['snr'].astype(float) / 10)
+    total = np.bincount(labels, weights, minlength=count)
+    clusters = np.zeros(count, dtype=CLUSTER_DTYPE)
+    for name in ('x', 'y', 'z', 'doppler'):
+        clusters[name] = np.bincount(labels, weights * points[name], minlength=count) / total
+    clusters['size'] = np.bincount(labels, minlength=count)
+    clusters['snr'] = 10 * np.log10(total)
+    return clusters
@@ -0,0 +1,163 @@
+"""
+
+STATIC CLUTTER REMOVAL
+======================
+
+Removal of static reflectors with a background estimated across frames.
+
+A ClutterFilter keeps a running estimate of the range profile of each virtual
+antenna, i.e. the average over the chirps of a frame, and subtracts it from
+every chirp. Static reflectors have the same profile in every frame and
+vanish, while moving targets, whose phase changes from frame to frame,
+average out of the background. Three estimates are available:
+
+    - ema: exponential moving average, forgetting with a factor alpha
+    - mean: average of the last window frames, kept as a running sum
+    - median: median of the last window frames, robust to targets stopping
+      for a few frames, but O(window) per frame instead of O(1)
+
+The background, the history of profiles and the running sum are allocated
+once, on the first frame or from the shape given on creation. Each frame
+updates them in place, in a number of operations proportional to the frame
+size.
+
+The filter is linear for ema and mean, so it gives the same result on ADC
+samples as on range FFTs. Pass it to rangeFFT, dopplerFFT or RadarCubeEngine,
+or apply it directly:
+
+    >>> clutter = ClutterFilter('ema', alpha=0.05)
+    >>> for adc_data in rec:
+    ...     rdata.raw_data = adc_data
+    ...     radarCube, rFFT, rBins = rangeFFT(rdata.separated_vx_data, device, clutter=clutter)
+
+Included classes:
+    - ClutterFilter
+
+"""
+
+import numpy as np
+
+METHODS = ('ema', 'mean', 'median')
+
+
+class ClutterFilter:
+    """Subtracts a running background estimate from the range profiles of each frame.
+
+    One filter holds the state of one stream of frames: use a different filter for
+    each device, or for ADC samples and range FFTs of the same stream.
+
+    Attributes:
+        method (str): Background estimate, 'ema', 'mean' or 'median'
+        alpha (float): Weight of the newest frame in the ema estimate
+        window (int): Frames in the mean and median estimates
+        shape (tuple): (num_vx, bins) of the profiles, taken from the first frame if None
+        dtype (np.dtype): Dtype of the background
+        frames (int): Frames seen since the creation or the last reset
+
+    """
+
+    def __init__(self, method='ema', alpha=0.05, window=16, shape=None, dtype=np.complex64):
+        if method not in METHODS:
+            raise ValueError('Unknown clutter estimate {}, choose from {}'.format(method, METHODS))
+        if not 0 < alpha <= 1:
+            raise ValueError('alpha must be in (0, 1]')
+        self.method = method
+        self.alpha = alpha
+        self.window = window
+        self.dtype = np.dtype(dtype)
+        self.frames = 0
+        self.shape = None
+        self._background = None
+        if shape is not None:
+            self._allocate(tuple(shape))
+
+    def _allocate(self, shape):
+        """Helper function allocating the state for profiles of a shape"""
+        self.shape = shape
+        self._profile = np.empty(shape, dtype=self.dtype)
+        self._background = np.zeros(shape, dtype=self.dtype)
+        self._history = np.zeros((self.window,) + shape, dtype=self.dtype) if self.method != 'ema' else None
+        # Accumulated in double precision so that rounding errors do not build up
+        self._sum = np.zeros(shape, dtype=np.complex128) if self.method == 'mean' else None
+
+    @property
+    def background(self):
+        """Current background estimate of shape (num_vx, bins), None before the first frame"""
+        return self._background
+
+    @property
+    def nbytes(self):
+        """Memory used by the state of the filter in bytes"""
+        buffers = [self._profile, self._background, self._history, self._sum] if self.shape else []
+        return sum(b.nbytes for b in buffers if b is not None)
+
+    def reset(self):
+        """Forgets the background, the next frame starts a new estimate"""
+        self.frames = 0
+        if self.shape is not None:
+            self._background[...] = 0
+            if self._history is not None:
+                self._history[...] = 0
+            if self._sum is not None:
+                self._sum[...] = 0
+
+    def update(self, data):
+        """Adds a frame to the background estimate
+
+        Args:
+            data (ndarray): Frame of shape (..., num_vx, bins), averaged over its leading axes
+
+        Returns:
+            ndarray: Updated background of shape (num_vx, bins)
+
+        """
+        if self.shape is None:
+            self._allocate(np.shape(data)[-2:])
+        elif np.shape(data)[-2:] != self.shape:
+            raise ValueError('Frame of shape {} given to a filter of shape {}'.format(np.shape(data), self.shape))
+
+        leading = tuple(range(np.ndim(data) - 2))
+        if leading:
+            np.mean(data, axis=leading, out=self._profile)
+        else:
+            np.copyto(self._profile, data, casting='same_kind')
+
+        if self.method == 'ema':
+            if self.frames == 0:
+                np.copyto(self._background, self._profile)
+            else:
+                self._background *= 1 - self.alpha
+                self._profile *= self.alpha
+                self._background += self._profile
+        else:
+            slot = self.frames % self.window
+            count = min(self.frames + 1, self.window)
+            if self.method == 'mean':
+                if self.frames >= self.window:
+                    self._sum -= self._history[slot]
+                self._sum += self._profile
+                np.multiply(self._sum, 1 / count, out=self._background, casting='same_kind')
+            self._history[slot] = self._profile
+            if self.method == 'median':
+                # Real and imaginary parts are medians of their own
+                history = self._history[:count]
+                np.median(history.real, axis=0, out=self._background.real)
+                np.median(history.imag, axis=0, out=self._background.imag)
+
+        self.frames += 1
+        return self._background
+
+    def apply(self, data, out=None):
+        """Updates the background with a frame and subtracts it from every chirp of the frame
+
+        Args:
+            data (ndarray): Frame of shape (..., num_vx, bins), e.g. (loops, num_vx, samples)
+                ADC data or its range FFT
+            out (ndarray): Array to write the result into, can be data for in-place processing
+
+        Returns:
+            ndarray: Frame without clutter
+
+        """
+        background = self.update(data)
+        return np.subtract(data, background, out=out, casting='same_kind')
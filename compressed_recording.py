@@ -0,0 +1,414 @@
+"""
+
+COMPRESSED RECORDINGS
+=====================
+
+Compressed storage for DCA1000 frames, for long captures that would not fit on
+disk as raw .rec files (see recording.py).
+
+A compressed recording file holds:
+    - COMPRESSED_MAGIC and the same JSON header as a raw recording, with the
+      codec and the compression settings
+    - one block per frame: receive timestamp (float64), lost packets (uint32),
+      compressed size (uint32) and the frame compressed on its own
+    - an index with the offset, size, lost packets and timestamp of every
+      block, followed by INDEX_MAGIC and the offset of the index
+
+Each frame being compressed independently, any frame is decoded in O(1) by
+looking up its block in the index, and blocks are decoded in parallel by a
+thread pool since every codec releases the GIL. The low and high bytes of the
+int16 samples are stored separately before compression (byte shuffle), which
+compresses ADC data noticeably better. A file whose index was never written,
+e.g. after a crash, is still readable: the blocks are scanned on open.
+
+zlib is always available, lz4 and zstd are used if the lz4 and zstandard
+packages are installed.
+
+Included functions/classes:
+    - CompressedWriter
+    - CompressedRecording
+    - open_recording
+    - compress_recording
+
+"""
+
+import os
+import time
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from recording import MAGIC, Recording, make_header, read_header
+
+try:
+    import lz4.frame
+except ImportError:
+    lz4 = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+COMPRESSED_MAGIC = b'MMWCRC\x00\x01'
+INDEX_MAGIC = b'MMWIDX\x00\x01'
+HEADER_ALIGNMENT = 8
+FOOTER_SIZE = len(INDEX_MAGIC) + 8
+
+BLOCK_HEADER_DTYPE = np.dtype([('timestamp', '<f8'), ('lost_packets', '<u4'), ('size', '<u4')])
+INDEX_DTYPE = np.dtype([('offset', '<u8'), ('size', '<u4'), ('lost_packets', '<u4'), ('timestamp', '<f8')])
+
+# Codec name: (compress(data, level), decompress(data), default level)
+CODECS = {'zlib': (zlib.compress, zlib.decompress, 1)}
+if lz4 is not None:
+    CODECS['lz4'] = (lambda data, level: lz4.frame.compress(data, compression_level=level),
+                     lz4.frame.decompress, 0)
+if zstandard is not None:
+    CODECS['zstd'] = (lambda data, level: zstandard.ZstdCompressor(level=level).compress(data),
+                      lambda data: zstandard.ZstdDecompressor().decompress(data), 1)
+
+DEFAULT_CODEC = next(c for c in ('zstd', 'lz4', 'zlib') if c in CODECS)
+
+
+def _get_codec(codec):
+    """Returns the compress and decompress functions and default level of a codec"""
+    if codec not in CODECS:
+        raise ValueError('Codec {} is not available, use one of {}'.format(codec, sorted(CODECS)))
+    return CODECS[codec]
+
+
+def _workers(workers):
+    """Returns the number of decoding threads, one per core by default"""
+    return workers or os.cpu_count() or 1
+
+
+class CompressedWriter:
+    """Appends frames to a compressed recording file.
+
+    Attributes:
+        path (str): File to write, an existing file is overwritten
+        config (dict): PARAMS.CONFIG dictionary used for the capture
+        frame_size (int): Number of int16 values in a frame
+        device (str): Radar model identifier
+        description (str): Description of the acquired data
+        codec (str): 'zlib', 'lz4' or 'zstd', DEFAULT_CODEC by default
+        level (int): Compression level, a fast level of the codec by default
+        shuffle (bool): Store low and high bytes of the samples separately before compression
+        frames (int): Number of frames written so far
+        bytes_written (int): Bytes written so far, header included
+
+    Examples:
+        >>> with CompressedWriter('capture.crec', PARAMS.CONFIG, UINT16_IN_FRAME) as writer:
+        ...     for frame, lost, timestamp in dca.iter_frames(with_info=True):
+        ...         writer.write(frame, lost, timestamp)
+
+    """
+
+    def __init__(self, path, config, frame_size, device=None, description='', codec=None,
+                 level=None, shuffle=True, **extra):
+        self.path = path
+        self.config = config
+        self.frame_size = frame_size
+        self.device = device
+        self.description = description
+        self.codec = codec or DEFAULT_CODEC
+        self._compress, _, default_level = _get_codec(self.codec)
+        self.level = default_level if level is None else level
+        self.shuffle = shuffle
+        self.frames = 0
+
+        self._block_header = np.zeros(1, dtype=BLOCK_HEADER_DTYPE)
+        self._index = []
+
+        header = make_header(config, frame_size, device, description, HEADER_ALIGNMENT,
+                             magic=COMPRESSED_MAGIC, record_size=None, codec=self.codec,
+                             level=self.level, shuffle=shuffle, **extra)
+        self._file = open(path, 'wb')
+        self._file.write(header)
+        self._file.flush()
+        self.bytes_written = len(header)
+
+    def compress(self, frame):
+        """Compresses a frame into a block. Thread-safe, so frames can be compressed in parallel
+
+        Args:
+            frame (ndarray): int16 frame of frame_size values
+
+        Returns:
+            bytes: Compressed block, to pass to write_block
+
+        """
+        if frame.size != self.frame_size:
+            raise ValueError('Frame has {} values instead of {}'.format(frame.size, self.frame_size))
+
+        data = np.ascontiguousarray(frame, dtype='<i2').reshape(-1).view(np.uint8)
+        if self.shuffle:
+            data = np.ascontiguousarray(data.reshape(-1, 2).T)
+        return self._compress(data, self.level)
+
+    def write(self, frame, lost_packets=0, timestamp=None):
+        """Compresses and appends a frame to the recording
+
+        Args:
+            frame (ndarray): int16 frame of frame_size values
+            lost_packets (int): Packets missing from the frame
+            timestamp (float): Receive time of the frame in seconds since the epoch, now by default
+
+        Returns:
+            None
+
+        """
+        self.write_block(self.compress(frame), lost_packets, timestamp)
+
+    def write_block(self, block, lost_packets=0, timestamp=None):
+        """Appends a frame compressed with compress to the recording
+
+        Args:
+            block (bytes): Compressed frame
+            lost_packets (int): Packets missing from the frame
+            timestamp (float): Receive time of the frame in seconds since the epoch, now by default
+
+        Returns:
+            None
+
+        """
+        timestamp = time.time() if timestamp is None else timestamp
+        self._block_header['timestamp'] = timestamp
+        self._block_header['lost_packets'] = lost_packets
+        self._block_header['size'] = len(block)
+        self._file.write(self._block_header.data)
+        self._file.write(block)
+
+        self._index.append((self.bytes_written + BLOCK_HEADER_DTYPE.itemsize, len(block),
+                            lost_packets, timestamp))
+        self.bytes_written += BLOCK_HEADER_DTYPE.itemsize + len(block)
+        self.frames += 1
+
+    def fileno(self):
+        """File descriptor of the recording, e.g. for os.fsync"""
+        return self._file.fileno()
+
+    def flush(self):
+        """Flushes written frames to the OS so that readers can see them"""
+        self._file.flush()
+
+    def close(self):
+        """Writes the frame index and closes the recording file"""
+        if self._file.closed:
+            return
+        index = np.array(self._index, dtype=INDEX_DTYPE)
+        self._file.write(index.data)
+        self._file.write(INDEX_MAGIC + self.bytes_written.to_bytes(8, 'little'))
+        self.bytes_written += index.nbytes + FOOTER_SIZE
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class CompressedRecording:
+    """Read access to a compressed recording file, with the interface of Recording.
+
+    Frames are decoded on access: indexing returns a new array rather than a view
+    on the file, and slices, read() and iteration decode frames in parallel.
+
+    Attributes:
+        path (str): Recording file
+        header (dict): Full recording header
+        config (dict): PARAMS.CONFIG dictionary used for the capture, for PARAMS.set_playback_mode
+        device (str): Radar model identifier
+        description (str): Description of the acquired data
+        frame_size (int): Number of int16 values in a frame
+        codec (str): Compression codec of the frames
+        workers (int): Number of decoding threads, one per core by default
+
+    Properties:
+        frames (ndarray): Every frame decoded, of shape (num_frames, frame_size)
+        timestamps (ndarray): Receive time of each frame in seconds since the epoch
+        lost_packets (ndarray): Packets missing from each frame
+        compression_ratio (float): Raw size of the frames divided by their compressed size
+
+    Examples:
+        >>> rec = CompressedRecording('capture.crec')
+        >>> PARAMS.set_playback_mode(rec.config)
+        >>> rdata.raw_data = rec[5]
+        >>> for adc_data in rec:
+        ...     rdata.raw_data = adc_data
+
+    """
+
+    def __init__(self, path, workers=None):
+        self.path = path
+        self.workers = _workers(workers)
+        with open(path, 'rb') as f:
+            self.header, offset = read_header(f, COMPRESSED_MAGIC)
+
+        self.config = self.header['config']
+        self.device = self.header['device']
+        self.description = self.header['description']
+        self.frame_size = self.header['frame_size']
+        self.codec = self.header['codec']
+        self._decompress = _get_codec(self.codec)[1]
+        self._shuffle = self.header['shuffle']
+
+        self._data = np.memmap(path, dtype=np.uint8, mode='r')
+        footer = self._data[-FOOTER_SIZE:].tobytes() if len(self._data) >= offset + FOOTER_SIZE else b''
+        if footer[:len(INDEX_MAGIC)] == INDEX_MAGIC:
+            start = int.from_bytes(footer[len(INDEX_MAGIC):], 'little')
+            self._index = self._data[start:len(self._data) - FOOTER_SIZE].view(INDEX_DTYPE)
+        else:
+            self._index = self._scan(offset)
+
+    def _scan(self, offset):
+        """Helper function rebuilding the index of a file that was not closed, ignoring a partial block"""
+        entries = []
+        end = len(self._data)
+        while offset + BLOCK_HEADER_DTYPE.itemsize <= end:
+            header = self._data[offset:offset + BLOCK_HEADER_DTYPE.itemsize].view(BLOCK_HEADER_DTYPE)[0]
+            size = int(header['size'])
+            offset += BLOCK_HEADER_DTYPE.itemsize
+            if offset + size > end:
+                break
+            entries.append((offset, size, header['lost_packets'], header['timestamp']))
+            offset += size
+        return np.array(entries, dtype=INDEX_DTYPE)
+
+    def __len__(self):
+        return len(self._index)
+
+    def __getitem__(self, index):
+        """int16 frame at index, or frames of shape (n, frame_size) for a slice"""
+        if isinstance(index, slice):
+            return self.read(indices=range(*index.indices(len(self))))
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('frame index out of range')
+        return self._decode(index, np.empty(self.frame_size, dtype=np.int16))
+
+    def __iter__(self):
+        """Yields frames in order, decoding the next ones in parallel"""
+        with ThreadPoolExecutor(self.workers) as pool:
+            pending = deque()
+            for i in range(len(self)):
+                pending.append(pool.submit(self._decode, i, np.empty(self.frame_size, dtype=np.int16)))
+                if len(pending) > 2 * self.workers:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+
+    def read(self, start=0, stop=None, out=None, indices=None):
+        """Decodes several frames in parallel
+
+        Args:
+            start (int): First frame
+            stop (int): Frame after the last one, the end of the recording by default
+            out (ndarray): int16 array of shape (n, frame_size) to decode into, allocated if None
+            indices (iterable): Frame indices to decode instead of [start, stop)
+
+        Returns:
+            ndarray: Frames of shape (n, frame_size)
+
+        """
+        if indices is None:
+            stop = len(self) if stop is None else min(stop, len(self))
+            indices = range(start, max(stop, start))
+        indices = list(indices)
+        if out is None:
+            out = np.empty((len(indices), self.frame_size), dtype=np.int16)
+
+        with ThreadPoolExecutor(self.workers) as pool:
+            # Consume the iterator to raise decoding errors
+            for _ in pool.map(self._decode, indices, out):
+                pass
+        return out
+
+    def _decode(self, index, out):
+        """Helper function decoding a frame into out"""
+        entry = self._index[index]
+        offset = int(entry['offset'])
+        raw = np.frombuffer(self._decompress(self._data[offset:offset + int(entry['size'])]), dtype=np.uint8)
+        if raw.size != 2 * self.frame_size:
+            raise ValueError('Frame {} is corrupted'.format(index))
+
+        if self._shuffle:
+            np.copyto(out.view(np.uint8).reshape(-1, 2), raw.reshape(2, -1).T)
+        else:
+            out.view(np.uint8)[:] = raw
+        return out
+
+    @property
+    def frames(self):
+        """Every frame decoded, of shape (num_frames, frame_size)"""
+        return self.read()
+
+    @property
+    def timestamps(self):
+        """Receive time of each frame in seconds since the epoch"""
+        return self._index['timestamp']
+
+    @property
+    def lost_packets(self):
+        """Packets missing from each frame"""
+        return self._index['lost_packets']
+
+    @property
+    def compression_ratio(self):
+        """Raw size of the frames divided by their compressed size"""
+        size = int(self._index['size'].sum())
+        return 2 * self.frame_size * len(self) / size if size else 1.
+
+
+def open_recording(path, workers=None):
+    """Opens a raw or compressed recording depending on its signature
+
+    Args:
+        path (str): Recording file
+        workers (int): Number of decoding threads for compressed recordings
+
+    Returns:
+        Recording or CompressedRecording: Reader for the file
+
+    """
+    with open(path, 'rb') as f:
+        magic = f.read(len(MAGIC))
+    if magic == COMPRESSED_MAGIC:
+        return CompressedRecording(path, workers)
+    return Recording(path)
+
+
+def compress_recording(path, out_path, codec=None, level=None, shuffle=True, workers=None, chunk=64):
+    """Compresses a raw or compressed recording into a new compressed recording
+
+    Args:
+        path (str): Recording to compress
+        out_path (str): Compressed recording to write
+        codec (str): 'zlib', 'lz4' or 'zstd', DEFAULT_CODEC by default
+        level (int): Compression level, a fast level of the codec by default
+        shuffle (bool): Store low and high bytes of the samples separately before compression
+        workers (int): Number of compression threads, one per core by default
+        chunk (int): Frames compressed in parallel at once
+
+    Returns:
+        float: Compression ratio of the new recording
+
+    """
+    rec = open_recording(path, workers)
+    extra = {k: v for k, v in rec.header.items() if k not in
+             ('version', 'description', 'device', 'created', 'config', 'frame_size', 'alignment',
+              'record_size', 'codec', 'level', 'shuffle')}
+    with CompressedWriter(out_path, rec.config, rec.frame_size, rec.device, rec.description,
+                          codec, level, shuffle, **extra) as writer, \
+            ThreadPoolExecutor(_workers(workers)) as pool:
+        for start in range(0, len(rec), chunk):
+            stop = min(start + chunk, len(rec))
+            blocks = pool.map(writer.compress, rec[start:stop])
+            for i, block in zip(range(start, stop), blocks):
+                writer.write_block(block, int(rec.lost_packets[i]), float(rec.timestamps[i]))
+
+    return CompressedRecording(out_path).compression_ratio
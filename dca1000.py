@@ -22,11 +22,15 @@ from params import PARAMS
 
 import codecs
 import socket
-import struct
+import threading
+import time
 from enum import Enum
 
 import numpy as np
 
+from instrumentation import METRICS, timed
+from udp_batch import BatchReceiver
+
 
 class CMD(Enum):
     RESET_FPGA_CMD_CODE = '0100'
@@ -61,6 +65,9 @@ ADC_PARAMS = {'chirps': PARAMS.CHIRP_LOOPS,
 # STATIC
 MAX_PACKET_SIZE = 4096
 BYTES_IN_PACKET = 1456
+HEADER_SIZE = 10
+FRAME_RING_SIZE = 8
+REORDER_WINDOW = 32
 # DYNAMIC
 BYTES_IN_FRAME = (ADC_PARAMS['chirps'] * ADC_PARAMS['rx'] * ADC_PARAMS['tx'] *
                   ADC_PARAMS['IQ'] * ADC_PARAMS['samples'] * ADC_PARAMS['bytes'])
@@ -69,6 +76,60 @@ PACKETS_IN_FRAME = BYTES_IN_FRAME / BYTES_IN_PACKET
 PACKETS_IN_FRAME_CLIPPED = BYTES_IN_FRAME // BYTES_IN_PACKET
 UINT16_IN_PACKET = BYTES_IN_PACKET // 2
 UINT16_IN_FRAME = BYTES_IN_FRAME // 2
+# Frames may start and end in the middle of a packet
+PACKETS_IN_FRAME_MAX = -(-BYTES_IN_FRAME // BYTES_IN_PACKET) + 1
+
+
+class GapPolicy(Enum):
+    """What to do with the data of packets missing from a frame"""
+    ZERO_FILL = 'zero_fill'
+    REPEAT_LAST = 'repeat_last'
+    DROP_FRAME = 'drop_frame'
+
+    def __str__(self):
+        return str(self.value)
+
+
+class CaptureStats:
+    """Cumulative packet and frame statistics of a DCA1000 capture.
+
+    Attributes:
+        packets_received (int): Packets received from the FPGA
+        packets_lost (int): Packets missing from the frames that were assembled
+        reordered_packets (int): Packets received after a packet that was sent later
+        duplicate_packets (int): Packets whose data had already been received
+        late_packets (int): Packets received after their frame was finished
+        frames_completed (int): Frames assembled with every packet
+        partial_frames (int): Frames assembled with missing packets
+        discarded_frames (int): Partial frames discarded by the DROP_FRAME gap policy
+        lost_frames (int): Frames of which no packet was received at all
+        stream_restarts (int): Times the FPGA byte counter went back, e.g. on a new recording
+
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        """Sets every counter back to zero"""
+        self.packets_received = 0
+        self.packets_lost = 0
+        self.reordered_packets = 0
+        self.duplicate_packets = 0
+        self.late_packets = 0
+        self.frames_completed = 0
+        self.partial_frames = 0
+        self.discarded_frames = 0
+        self.lost_frames = 0
+        self.stream_restarts = 0
+
+    def as_dict(self):
+        """Returns the counters as a dictionary"""
+        return dict(vars(self))
+
+    def __repr__(self):
+        return 'CaptureStats({})'.format(
+            ', '.join('{}={}'.format(k, v) for k, v in vars(self).items()))
 
 
 class DCA1000:
@@ -79,6 +140,13 @@ class DCA1000:
         adc_ip (str): IP to send configuration commands to the FPGA
         data_port (int): Port that the FPGA is using to send data
         config_port (int): Port that the FPGA is using to read configuration commands from
+        ring_size (int): Number of preallocated frame buffers frames are reassembled into
+        batch_size (int): Number of packets received per system call, None to receive one at a time
+        rcvbuf_size (int): Requested kernel receive buffer (SO_RCVBUF) of the data socket in bytes,
+            None to keep the system default
+        gap_policy (GapPolicy): How missing packets are handled when a frame is finished
+        reorder_window (int): Packets to wait for out of order data before finishing an incomplete frame
+        stats (CaptureStats): Cumulative packet loss, reordering and partial frame counters
 
 
     General steps are as follows:
@@ -93,10 +161,19 @@ class DCA1000:
         >>> adc_data = dca.read(timeout=.1)
         >>> frame = dca.organize(adc_data, 128, 4, 256)
 
+        Frames can also be received continuously by a background thread:
+
+        >>> dca.start_streaming()
+        >>> for adc_data in dca.iter_frames():
+        ...     frame = dca.organize(adc_data, 128, 4, 256)
+        >>> dca.stop_streaming()
+
     """
 
     def __init__(self, static_ip='192.168.33.30', adc_ip='192.168.33.180',
-                 data_port=4098, config_port=4096):
+                 data_port=4098, config_port=4096, ring_size=FRAME_RING_SIZE,
+                 batch_size=None, rcvbuf_size=None,
+                 gap_policy=GapPolicy.ZERO_FILL, reorder_window=REORDER_WINDOW):
         # Save network data
         # self.static_ip = static_ip
         # self.adc_ip = adc_ip
@@ -116,6 +193,14 @@ class DCA1000:
                                          socket.SOCK_DGRAM,
                                          socket.IPPROTO_UDP)
 
+        # A large kernel buffer absorbs bursts while frames are processed.
+        # The OS may clamp the request (e.g. net.core.rmem_max on Linux)
+        if rcvbuf_size is not None:
+            self.data_socket.setsockopt(
+                socket.SOL_SOCKET, socket.SO_RCVBUF, rcvbuf_size)
+        self.rcvbuf_size = self.data_socket.getsockopt(
+            socket.SOL_SOCKET, socket.SO_RCVBUF)
+
         # Bind data socket to fpga
         self.data_socket.bind(self.data_recv)
 
@@ -132,6 +217,62 @@ class DCA1000:
         self.last_frame = None
 
         self.lost_packets = None
+        self.frame_timestamp = None
+
+        # Preallocated ring of frame buffers. Packets are received into a
+        # single reusable buffer and their payload is copied straight into
+        # the frame slot it belongs to, so no memory is allocated per frame.
+        # Two slots are being assembled at any time to absorb reordering
+        # around frame boundaries
+        if ring_size < 3:
+            raise ValueError('The frame ring needs at least 3 frames')
+        self.ring_size = ring_size
+        self.frame_ring = np.zeros((ring_size, UINT16_IN_FRAME), dtype=np.int16)
+        self._ring_u8 = self.frame_ring.reshape(-1).view(np.uint8)
+        self._ring_bytes = memoryview(self._ring_u8)
+        self._ring_idx = 0
+        self._packet = bytearray(MAX_PACKET_SIZE)
+        # View on the last received packet
+        self._packet_view = memoryview(self._packet)
+
+        # Optional batched receive, packets are then handed out one by one
+        # from the last received batch
+        self._receiver = None
+        if batch_size is not None and batch_size > 1:
+            self._receiver = BatchReceiver(
+                self.data_socket, batch_size, MAX_PACKET_SIZE)
+        self._batch_pos = 0
+        self._batch_len = 0
+        # Frame assembly state, driven by the FPGA byte counter. Frame f of
+        # the stream holds bytes [f * BYTES_IN_FRAME, (f + 1) * BYTES_IN_FRAME)
+        # and the bitmaps flag which of its packets were received, for the
+        # frame being finished and the following one
+        self.gap_policy = gap_policy
+        self.reorder_window = reorder_window
+        self.stats = CaptureStats()
+        self._bitmaps = [np.zeros(PACKETS_IN_FRAME_MAX, dtype=bool),
+                         np.zeros(PACKETS_IN_FRAME_MAX, dtype=bool)]
+        self._received = [0, 0]
+        self._frame_idx = None
+        self._first_frame = None
+        self._max_packet = None
+        self._pending = None
+        self._last_slot = None
+        self._frames_assembled = 0
+        # Time spent waiting on the socket for the frames being assembled,
+        # only measured while METRICS is enabled
+        self._socket_time = 0.
+
+        # Streaming mode state. Frame n received since streaming started is
+        # stored in ring slot n % ring_size
+        self._stream_thread = None
+        self._streaming = False
+        self._frame_cond = threading.Condition()
+        self._next_frame = 0
+        self._stream_index = [0] * ring_size
+        self._stream_info = [(0, 0.)] * ring_size
+        self.frames_received = 0
+        self.dropped_frames = 0
 
     def configure(self):
         """Initializes and connects to the FPGA
@@ -165,11 +306,19 @@ class DCA1000:
             None
 
         """
+        self.stop_streaming()
         self.data_socket.close()
         self.config_socket.close()
 
     def read(self, timeout=1):
-        """ Read in a single packet via UDP
+        """ Read in a single frame via UDP
+
+        The frame is reassembled in place inside the preallocated frame ring,
+        so the returned array is a view on the ring that remains valid until
+        ``ring_size - 2`` further frames have been read. Copy it if it needs
+        to be kept for longer. Missing packets are handled according to
+        ``gap_policy`` and their number is stored in ``lost_packets``, while
+        ``frame_timestamp`` holds the time at which the frame was finished.
 
         Args:
             timeout (float): Time to wait for packet before moving on
@@ -179,39 +328,386 @@ class DCA1000:
             to recover signs from two's complement, else None
 
         """
+        if self._streaming:
+            raise RuntimeError('read() cannot be used while streaming, use get_latest() or iter_frames()')
+
         # Configure
         self.data_socket.settimeout(timeout)
 
-        # Frame buffer
-        ret_frame = np.zeros(UINT16_IN_FRAME, dtype=np.uint16)
+        return self._assemble_frame()
+
+    def start_streaming(self, timeout=1):
+        """Starts a background thread that continuously reassembles frames into the frame ring
+
+        Frames are then retrieved with ``get_latest`` or ``iter_frames``. Like
+        the ones returned by ``read``, they are views on the frame ring that
+        remain valid until the receiver thread reuses their slot, i.e. while
+        the consumer is less than ``ring_size - 2`` frames behind.
+
+        Args:
+            timeout (float): Time to wait for packet before checking whether streaming was stopped
+
+        Returns:
+            None
+
+        """
+        if self._stream_thread is not None:
+            return
 
-        # Wait for start of next frame
+        # Discard older data and start filling the ring from its first slot
+        self._clear_buffer()
+        self._next_frame = 0
+        self.frames_received = 0
+        self.dropped_frames = 0
+
+        self._streaming = True
+        self._stream_thread = threading.Thread(
+            target=self._stream_loop, args=(timeout,), daemon=True)
+        self._stream_thread.start()
+
+    @property
+    def streaming(self):
+        """True while the streaming thread receives frames, False once stopped or after a socket error"""
+        return self._streaming
+
+    def stop_streaming(self):
+        """Stops the background receiver thread started by start_streaming
+
+        Returns:
+            None
+
+        """
+        if self._stream_thread is None:
+            return
+
+        with self._frame_cond:
+            self._streaming = False
+            self._frame_cond.notify_all()
+        self._stream_thread.join()
+        self._stream_thread = None
+
+    def get_latest(self, timeout=None, with_info=False):
+        """Returns the most recent frame received by the streaming thread
+
+        Waits for a frame newer than the last one returned to this consumer.
+        Frames skipped this way are not counted as dropped.
+
+        Args:
+            timeout (float): Time to wait for a new frame, None to wait forever
+            with_info (bool): Also return the lost packets and timestamp of the frame
+
+        Returns:
+            ndarray: int16 frame, or None on timeout or if streaming stopped.
+            With with_info, a (frame, lost_packets, timestamp) tuple instead of the frame
+
+        """
+        frame, info = self._next_streamed_frame(latest=True, timeout=timeout)
+        if with_info and frame is not None:
+            return (frame,) + info
+        return frame
+
+    def iter_frames(self, timeout=None, with_info=False):
+        """Iterates over every frame received by the streaming thread, in order
+
+        If the consumer falls more than ``ring_size - 2`` frames behind, the
+        frames overwritten in the meantime are skipped and added to
+        ``dropped_frames``.
+
+        Args:
+            timeout (float): Time to wait for each frame, None to wait forever
+            with_info (bool): Also yield the lost packets and timestamp of each frame
+
+        Yields:
+            ndarray: int16 frame, or (frame, lost_packets, timestamp) tuple with with_info
+
+        """
         while True:
-            packet_num, byte_count, packet_data = self._read_data_packet()
-            if byte_count % BYTES_IN_FRAME_CLIPPED == 0:
-                packets_read = 1
-                ret_frame[0:UINT16_IN_PACKET] = packet_data
+            frame, info = self._next_streamed_frame(latest=False, timeout=timeout)
+            if frame is None:
+                return
+            yield (frame,) + info if with_info else frame
+
+    def _next_streamed_frame(self, latest, timeout):
+        """Helper function to hand the next streamed frame over to the consumer
+
+        Args:
+            latest (bool): Jump to the most recent frame instead of the next one in order
+            timeout (float): Time to wait for a new frame, None to wait forever
+
+        Returns:
+            tuple: int16 frame and (lost_packets, timestamp) tuple, or None and None
+            on timeout or if streaming stopped
+
+        """
+        with self._frame_cond:
+            while True:
+                self._frame_cond.wait_for(
+                    lambda: self.frames_received > self._next_frame or not self._streaming, timeout)
+                if self.frames_received <= self._next_frame:
+                    return None, None
+
+                # Frames assembled before this one have had their slot reused
+                oldest_valid = self._frames_assembled - (self.ring_size - 2)
+                if latest:
+                    n = self.frames_received - 1
+                else:
+                    n = max(self._next_frame, self.frames_received - self.ring_size)
+                    while n < self.frames_received and self._stream_index[n % self.ring_size] < oldest_valid:
+                        n += 1
+                    self.dropped_frames += n - self._next_frame
+                    if n > self._next_frame:
+                        METRICS.count('dca1000.dropped_frames', n - self._next_frame)
+
+                if n < self.frames_received and self._stream_index[n % self.ring_size] >= oldest_valid:
+                    self._next_frame = n + 1
+                    slot = self._stream_index[n % self.ring_size] % self.ring_size
+                    return self.frame_ring[slot], self._stream_info[n % self.ring_size]
+                self._next_frame = self.frames_received
+
+    def _stream_loop(self, timeout):
+        """Helper function run by the streaming thread
+
+        Args:
+            timeout (float): Time to wait for packet before checking whether streaming was stopped
+
+        Returns:
+            None
+
+        """
+        self.data_socket.settimeout(timeout)
+        while self._streaming:
+            try:
+                self._assemble_frame()
+            except socket.timeout:
+                continue
+            except OSError:
+                # Socket closed while streaming
                 break
 
-        # Read in the rest of the frame
+            with self._frame_cond:
+                self._stream_index[self.frames_received % self.ring_size] = self._frames_assembled - 1
+                self._stream_info[self.frames_received % self.ring_size] = (
+                    self.lost_packets, self.frame_timestamp)
+                self.frames_received += 1
+                METRICS.set_gauge('dca1000.ring_occupancy', self.frames_received - self._next_frame)
+                self._frame_cond.notify_all()
+
+        with self._frame_cond:
+            self._streaming = False
+            self._frame_cond.notify_all()
+
+    @timed('dca1000.assemble_frame')
+    def _assemble_frame(self):
+        """Helper function to reassemble the next frame into the frame ring
+
+        Packets are placed using the byte counter of their header, so frames
+        need not be a multiple of the packet size and out of order packets
+        land where they belong. A frame is finished once all of its packets
+        are received, or once the stream has moved ``reorder_window`` packets
+        past its end or beyond the following frame.
+
+        Returns:
+            ndarray: int16 view on the ring slot holding the frame
+
+        """
         while True:
-            packet_num, byte_count, packet_data = self._read_data_packet()
-            packets_read += 1
+            if self._frame_idx is not None and self._received[0] == self._frame_packets(self._frame_idx)[1]:
+                frame = self._finish_frame()
+            elif self._pending is not None:
+                byte_count, length = self._pending
+                self._pending = None
+                frame = self._process_packet(byte_count, length)
+            else:
+                _, byte_count, length = self._read_data_packet()
+                self.stats.packets_received += 1
+                frame = self._process_packet(byte_count, length)
+
+            if frame is not None:
+                return frame
+
+    def _process_packet(self, byte_count, length):
+        """Helper function to store the last received packet in the frames being assembled
 
-            if byte_count % BYTES_IN_FRAME_CLIPPED == 0:
-                self.lost_packets = PACKETS_IN_FRAME_CLIPPED - packets_read
-                # conversion from two's complement
-                return np.frombuffer(ret_frame, dtype=np.int16)
+        Args:
+            byte_count (int): Stream position of the packet payload in bytes
+            length (int): Size of the received packet, header included
 
-            curr_idx = ((packet_num - 1) % PACKETS_IN_FRAME_CLIPPED)
-            try:
-                ret_frame[curr_idx *
-                          UINT16_IN_PACKET:(curr_idx + 1) * UINT16_IN_PACKET] = packet_data
-            except:
-                pass
+        Returns:
+            ndarray: Finished frame if this packet finishes one, else None
 
-            if packets_read > PACKETS_IN_FRAME_CLIPPED:
-                packets_read = 0
+        """
+        start = byte_count
+        end = byte_count + length - HEADER_SIZE
+        packet = start // BYTES_IN_PACKET
+        first_frame = start // BYTES_IN_FRAME
+
+        if self._frame_idx is not None and first_frame < self._frame_idx - 1:
+            # The byte counter went back, the FPGA started a new recording
+            self.stats.stream_restarts += 1
+            self._reset_assembly()
+
+        if self._frame_idx is None:
+            # Start at the first frame boundary, earlier data is incomplete
+            self._frame_idx = -(-start // BYTES_IN_FRAME)
+            self._first_frame = self._frame_idx
+            self._max_packet = packet
+        elif packet < self._max_packet:
+            self.stats.reordered_packets += 1
+        else:
+            self._max_packet = packet
+
+        if end <= self._frame_idx * BYTES_IN_FRAME:
+            if end > self._first_frame * BYTES_IN_FRAME:
+                self.stats.late_packets += 1
+            return None
+
+        while first_frame > self._frame_idx + 1:
+            # The packet is past both frames being assembled
+            if self._received[0]:
+                self._pending = (byte_count, length)
+                return self._finish_frame()
+            if not self._received[1]:
+                self.stats.lost_frames += first_frame - self._frame_idx
+                self._frame_idx = first_frame
+                break
+            self.stats.lost_frames += 1
+            self._advance()
+
+        last_frame = min((end - 1) // BYTES_IN_FRAME, self._frame_idx + 1)
+        for f in range(max(first_frame, self._frame_idx), last_frame + 1):
+            self._store_payload(f - self._frame_idx, f, start, end, packet)
+
+        first, count = self._frame_packets(self._frame_idx)
+        if self._max_packet >= first + count - 1 + self.reorder_window:
+            return self._finish_frame()
+        return None
+
+    def _store_payload(self, pos, frame_idx, start, end, packet):
+        """Helper function to copy the part of the last packet that belongs to a frame
+
+        Args:
+            pos (int): 0 for the frame being finished, 1 for the following one
+            frame_idx (int): Index of the frame in the stream
+            start (int): Stream position of the first byte of the payload
+            end (int): Stream position after the last byte of the payload
+            packet (int): Index of the packet in the stream
+
+        Returns:
+            None
+
+        """
+        k = packet - self._frame_packets(frame_idx)[0]
+        bitmap = self._bitmaps[pos]
+        if bitmap[k]:
+            self.stats.duplicate_packets += 1
+            return
+        bitmap[k] = True
+        self._received[pos] += 1
+
+        frame_start = frame_idx * BYTES_IN_FRAME
+        lo = max(start, frame_start)
+        hi = min(end, frame_start + BYTES_IN_FRAME)
+        base = ((self._ring_idx + pos) % self.ring_size) * BYTES_IN_FRAME - frame_start
+        self._ring_bytes[base + lo:base + hi] = \
+            self._packet_view[HEADER_SIZE + lo - start:HEADER_SIZE + hi - start]
+
+    def _finish_frame(self):
+        """Helper function to apply the gap policy to the oldest frame being assembled and move on
+
+        Returns:
+            ndarray: The finished frame, or None if it was discarded
+
+        """
+        slot = self._ring_idx
+        first, count = self._frame_packets(self._frame_idx)
+        missing = count - self._received[0]
+        self.lost_packets = missing
+        self.frame_timestamp = time.time()
+
+        if METRICS.enabled:
+            METRICS.count('dca1000.frames')
+            METRICS.count('dca1000.packets', count - missing)
+            METRICS.count('dca1000.packets_lost', missing)
+            METRICS.observe('dca1000.socket_wait', self._socket_time)
+            self._socket_time = 0.
+
+        keep = True
+        if missing == 0:
+            self.stats.frames_completed += 1
+        else:
+            self.stats.partial_frames += 1
+            self.stats.packets_lost += missing
+            if self.gap_policy == GapPolicy.DROP_FRAME:
+                self.stats.discarded_frames += 1
+                keep = False
+            else:
+                self._fill_gaps(slot, first, self._bitmaps[0][:count])
+
+        self._advance()
+        if not keep:
+            return None
+        self._last_slot = slot
+        return self.frame_ring[slot]
+
+    def _fill_gaps(self, slot, first, bitmap):
+        """Helper function to fill the data of missing packets of the oldest frame being assembled
+
+        Args:
+            slot (int): Ring slot of the frame
+            first (int): Stream index of the first packet of the frame
+            bitmap (ndarray): Received flag of each packet of the frame
+
+        Returns:
+            None
+
+        """
+        frame_start = self._frame_idx * BYTES_IN_FRAME
+        base = slot * BYTES_IN_FRAME
+        source = None
+        if self.gap_policy == GapPolicy.REPEAT_LAST and self._last_slot is not None:
+            source = self._last_slot * BYTES_IN_FRAME
+
+        for k in np.flatnonzero(~bitmap):
+            lo = max((first + k) * BYTES_IN_PACKET - frame_start, 0)
+            hi = min((first + k + 1) * BYTES_IN_PACKET - frame_start, BYTES_IN_FRAME)
+            if source is None:
+                self._ring_u8[base + lo:base + hi] = 0
+            else:
+                self._ring_u8[base + lo:base + hi] = self._ring_u8[source + lo:source + hi]
+
+    def _advance(self):
+        """Helper function to make the following frame the oldest one being assembled"""
+        self._frame_idx += 1
+        self._ring_idx = (self._ring_idx + 1) % self.ring_size
+        self._frames_assembled += 1
+
+        bitmap = self._bitmaps[0]
+        bitmap.fill(False)
+        self._bitmaps = [self._bitmaps[1], bitmap]
+        self._received = [self._received[1], 0]
+
+        # The slot of the last frame is about to be reused
+        if self._last_slot == (self._ring_idx + 1) % self.ring_size:
+            self._last_slot = None
+
+    def _reset_assembly(self):
+        """Helper function to drop the frames being assembled"""
+        for bitmap in self._bitmaps:
+            bitmap.fill(False)
+        self._received = [0, 0]
+        self._frame_idx = None
+        self._first_frame = None
+        self._max_packet = None
+        self._pending = None
+        self._last_slot = None
+        self._socket_time = 0.
+
+    @staticmethod
+    def _frame_packets(frame_idx):
+        """Helper function returning the stream index of the first packet of a frame and its number of packets"""
+        first = frame_idx * BYTES_IN_FRAME // BYTES_IN_PACKET
+        last = ((frame_idx + 1) * BYTES_IN_FRAME - 1) // BYTES_IN_PACKET
+        return first, last - first + 1
 
     def _send_command(self, cmd, length='0000', body='', timeout=1):
         """Helper function to send a single commmand to the FPGA
@@ -243,15 +739,34 @@ class DCA1000:
     def _read_data_packet(self):
         """Helper function to read in a single ADC packet via UDP
 
+        The packet is received into a reusable buffer, or taken from the last
+        batch when batched receive is enabled. Its header holds a little-endian
+        4-byte sequence number followed by a little-endian 6-byte count of the
+        bytes sent before this packet, and the raw ADC data of the packet
+        starts right after it at ``HEADER_SIZE``.
+
         Returns:
-            int: Current packet number, byte count of data that has already been read, raw ADC data in current packet
+            int: Current packet number, byte count of data that has already been read, size of the packet in bytes
 
         """
-        data, addr = self.data_socket.recvfrom(MAX_PACKET_SIZE)
-        packet_num = struct.unpack('<1l', data[:4])[0]
-        byte_count = struct.unpack('>Q', b'\x00\x00' + data[4:10][::-1])[0]
-        packet_data = np.frombuffer(data[10:], dtype=np.uint16)
-        return packet_num, byte_count, packet_data
+        start = time.perf_counter() if METRICS.enabled else None
+        if self._receiver is None:
+            length = self.data_socket.recv_into(self._packet, MAX_PACKET_SIZE)
+        else:
+            if self._batch_pos == self._batch_len:
+                self._batch_len = self._receiver.receive(
+                    self.data_socket.gettimeout())
+                self._batch_pos = 0
+                METRICS.set_gauge('dca1000.batch_fill', self._batch_len / self._receiver.batch_size)
+            self._packet_view = self._receiver.views[self._batch_pos]
+            length = self._receiver.lengths[self._batch_pos]
+            self._batch_pos += 1
+        if start is not None:
+            self._socket_time += time.perf_counter() - start
+
+        packet_num = int.from_bytes(self._packet_view[0:4], 'little')
+        byte_count = int.from_bytes(self._packet_view[4:HEADER_SIZE], 'little')
+        return packet_num, byte_count, length
 
     def _clear_buffer(self):
         # Clear UDP buffer (Discard older data)
@@ -263,6 +778,13 @@ class DCA1000:
                 break
         # print('Cleaned up buffer!')
         self.data_socket.setblocking(1)
+        self._batch_pos = 0
+        self._batch_len = 0
+
+        # Restart assembly from the first ring slot
+        self._reset_assembly()
+        self._ring_idx = 0
+        self._frames_assembled = 0
         print('Cleared buffer')
 
     def _listen_for_error(self):
@@ -287,28 +809,71 @@ class DCA1000:
         return self._send_command(CMD.RECORD_STOP_CMD_CODE)
 
     @staticmethod
-    def organize(raw_frame, num_chirps, num_rx, num_samples):
+    def organize(raw_frame, num_chirps, num_rx, num_samples, dtype=complex):
         """Reorganizes raw ADC data into a full frame
 
         Args:
-            raw_frame (ndarray): Data to format
+            raw_frame (ndarray): Data to format, a single frame or a batch of frames along the first axis
             num_chirps: Number of chirps included in the frame
             num_rx: Number of receivers used in the frame
             num_samples: Number of ADC samples included in each chirp
+            dtype: Complex output type, use np.complex64 to halve memory and time
 
         Returns:
             ndarray: Reformatted frame of raw data of shape (num_chirps, num_rx, num_samples)
 
         """
-        ret = np.zeros(len(raw_frame) // 2, dtype=complex)
+        raw_frame = np.asarray(raw_frame)
+        ret = np.empty(raw_frame.shape[:-1] + (raw_frame.shape[-1] // 2,), dtype=dtype)
+        return DCA1000.organize_into(raw_frame, ret, num_chirps, num_rx, num_samples)
+
+    @staticmethod
+    @timed('dca1000.organize')
+    def organize_into(raw_frame, out, num_chirps, num_rx, num_samples):
+        """Reorganizes raw ADC data into a caller provided buffer without temporary arrays
+
+        The DCA1000 streams each pair of consecutive samples as I0, I1, Q0, Q1.
+        Viewing the frame as groups of (IQ, sample) and the output as groups
+        of (sample, IQ), which is the memory layout of a complex array, the
+        whole frame or batch of frames is converted by four strided copies
+        that cast on the fly. Long 1-D copies are much faster in NumPy than a
+        single copy of the transposed view, whose inner loop has 2 elements.
+
+        Args:
+            raw_frame (ndarray): int16 data to format, a single frame or a batch of frames along the first axis
+            out (ndarray): C-contiguous complex64 or complex128 buffer with half as many elements as
+                raw_frame, or int16 buffer with as many elements to get interleaved I-Q pairs
+            num_chirps: Number of chirps included in the frame
+            num_rx: Number of receivers used in the frame
+            num_samples: Number of ADC samples included in each chirp
 
-        # Separate IQ data
-        ret[0::2] = raw_frame[0::4] + 1j * raw_frame[2::4]
-        ret[1::2] = raw_frame[1::4] + 1j * raw_frame[3::4]
-        # ret = raw_frame[0::2] + 1j * raw_frame[1::2]
-        return ret.reshape((num_chirps, num_rx, num_samples))
+        Returns:
+            ndarray: View on out of shape (..., num_chirps, num_rx, num_samples), with a trailing
+            I-Q axis of size 2 for int16 buffers
+
+        """
+        lead = raw_frame.shape[:-1]
+        src = raw_frame.reshape(lead + (-1, 2, 2))
+
+        if not out.flags.c_contiguous:
+            raise ValueError('out must be a C-contiguous buffer')
+        if np.iscomplexobj(out):
+            pairs = out.reshape(-1).view(out.real.dtype)
+            shape = lead + (num_chirps, num_rx, num_samples)
+        else:
+            pairs = out.reshape(-1)
+            shape = lead + (num_chirps, num_rx, num_samples, 2)
+        if pairs.size != raw_frame.size:
+            raise ValueError('out does not match the size of raw_frame')
+
+        dst = pairs.reshape(src.shape)
+        for sample in range(2):
+            for iq in range(2):
+                np.copyto(dst[..., sample, iq], src[..., iq, sample])
+        return out.reshape(shape)
 
     @staticmethod
+    @timed('dca1000.separate_tx')
     def separate_tx(signal, num_tx, vx_axis=1, axis=0):
         """Separate interleaved radar data from separate TX along a certain axis to account for TDM radars.
 
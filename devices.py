@@ -0,0 +1,305 @@
+"""
+
+DEVICE GEOMETRIES
+=================
+
+Registry of the antenna geometry of each supported radar board.
+
+A DeviceGeometry describes the TX and RX antenna positions, in half-wavelength
+units, and the phase correction of each RX antenna. Everything the processing
+needs is derived from it once per set of enabled TX antennas and cached:
+
+    - the order of the virtual antennas in RadarData.separated_vx_data
+    - the virtual array map used by rangeFFT to build the radar cube
+    - the RX antennas whose phase is inverted
+
+Steering vectors for angle estimation are computed on each call, as their
+angles vary with the caller, so angle grids used every frame should keep
+their own matrix, as Beamformer and PointCloud do.
+
+Positions are (azimuth, elevation) coordinates, and tx_positions is indexed
+by physical TX antenna. The lua script transmits the chirps of a loop in the
+order TX0, TX2, TX1 (CHIRP_TX_ORDER), so TX tuples give the physical TX
+antenna of each chirp slot in that order, as returned by enabled_tx. A slot
+whose antenna is disabled is still captured, silent, and is None in the
+tuple: its virtual antennas keep their place in RadarData.separated_vx_data
+but are left out of the array maps and have a null steering vector. In array
+maps, columns follow azimuth and rows follow elevation from the highest
+antenna down, as in the cubes returned by rangeFFT.
+
+Adding a board only takes registering its geometry:
+
+    >>> register_device(DeviceGeometry('MY-BOARD', tx_positions=[(0, 0), (4, 0)],
+    ...                                rx_positions=[(0, 0), (1, 0), (2, 0), (3, 0)]))
+
+Included functions/classes:
+    - DeviceGeometry
+    - register_device
+    - get_device
+    - enabled_tx
+    - CHIRP_TX_ORDER
+
+"""
+
+import numpy as np
+
+DEVICES = {}
+
+# Physical TX antenna of each chirp of a loop, as set by the ChirpConfig calls of the lua script
+CHIRP_TX_ORDER = (0, 2, 1)
+
+
+def enabled_tx(config):
+    """Returns the TX antenna of each chirp slot of a configuration
+
+    The lua script configures NUM_TX chirps per loop, taken in order from
+    CHIRP_TX_ORDER whatever the flags. A chirp whose antenna is disabled is
+    still captured, so it keeps its slot, as None.
+
+    Args:
+        config (dict): PARAMS.CONFIG dictionary, with the TX0_EN, TX1_EN, TX2_EN flags of the lua script
+
+    Returns:
+        tuple: Index of the physical TX antenna of each chirp, None for silent chirps, or None if the
+        configuration has no flags
+
+    """
+    flags = [config.get('TX{}_EN'.format(i)) for i in range(3)]
+    if all(flag is None for flag in flags):
+        return None
+    num_tx = int(config.get('NUM_TX', sum(bool(flag) for flag in flags)))
+    return tuple(i if flags[i] else None for i in CHIRP_TX_ORDER[:num_tx])
+
+
+class DeviceGeometry:
+    """Antenna geometry of a radar board and the tables derived from it.
+
+    Attributes:
+        name (str): Device identifier, as passed to RadarData and rangeFFT
+        tx_positions (ndarray): (azimuth, elevation) of each physical TX antenna in half wavelengths
+        rx_positions (ndarray): (azimuth, elevation) of each RX antenna in half wavelengths
+        rx_phase (ndarray): Complex phase correction applied to each RX antenna
+        description (str): Description of the board
+
+    """
+
+    def __init__(self, name, tx_positions, rx_positions, rx_phase=None, description=''):
+        self.name = name
+        self.tx_positions = np.array(tx_positions, dtype=float).reshape(-1, 2)
+        self.rx_positions = np.array(rx_positions, dtype=float).reshape(-1, 2)
+        if rx_phase is None:
+            rx_phase = np.ones(len(self.rx_positions))
+        self.rx_phase = np.array(rx_phase, dtype=complex)
+        self.description = description
+
+        # RX antennas whose correction is a plain sign inversion are negated
+        # in place instead of multiplied
+        self.inverted_rx = [int(i) for i in np.flatnonzero(self.rx_phase == -1)]
+        self._phase_is_sign = bool(np.all((self.rx_phase == 1) | (self.rx_phase == -1)))
+        self._cache = {}
+
+    @property
+    def num_tx(self):
+        return len(self.tx_positions)
+
+    @property
+    def num_rx(self):
+        return len(self.rx_positions)
+
+    def _tx(self, tx):
+        """Helper function returning the enabled TX antennas as a tuple, all of them by default"""
+        if tx is None:
+            order = [i for i in CHIRP_TX_ORDER if i < self.num_tx]
+            return tuple(order + list(range(len(CHIRP_TX_ORDER), self.num_tx)))
+        return tuple(tx)
+
+    def _cached(self, key, compute):
+        """Helper function computing a table once"""
+        if key not in self._cache:
+            self._cache[key] = compute()
+        return self._cache[key]
+
+    def num_virtual(self, tx=None):
+        """Number of virtual antennas with the given TX antennas enabled, silent chirps included"""
+        return len(self._tx(tx)) * self.num_rx
+
+    def active_virtual(self, tx=None):
+        """Returns whether each virtual antenna belongs to a chirp with an enabled TX antenna
+
+        Args:
+            tx (tuple): TX antenna of each chirp slot, None for silent chirps, all of them by default
+
+        Returns:
+            ndarray: bool array of shape (num_vx,)
+
+        """
+        tx = self._tx(tx)
+        return self._cached(('active', tx), lambda: np.repeat([t is not None for t in tx], self.num_rx))
+
+    def virtual_positions(self, tx=None):
+        """Returns the position of each virtual antenna
+
+        Virtual antenna v is the pair of the TX antenna of chirp v // num_rx and
+        RX antenna v % num_rx, as in RadarData.separated_vx_data.
+
+        Args:
+            tx (tuple): TX antenna of each chirp slot, None for silent chirps, all of them by default
+
+        Returns:
+            ndarray: (azimuth, elevation) of each virtual antenna, of shape (num_vx, 2), NaN for
+            the virtual antennas of silent chirps
+
+        """
+        tx = self._tx(tx)
+
+        def compute():
+            nan = np.full(2, np.nan)
+            tx_positions = np.array([nan if t is None else self.tx_positions[t] for t in tx]).reshape(-1, 2)
+            return (tx_positions[:, None, :] + self.rx_positions[None, :, :]).reshape(-1, 2)
+
+        return self._cached(('positions', tx), compute)
+
+    def array_map(self, tx=None):
+        """Returns the virtual antenna at each position of the virtual array
+
+        Args:
+            tx (tuple): TX antenna of each chirp slot, None for silent chirps, all of them by default
+
+        Returns:
+            ndarray: int array of shape (elevation, azimuth), -1 where there is no antenna.
+            When two virtual antennas overlap, the first one is used. Silent chirps are left out
+
+        Raises:
+            ValueError: If every chirp is silent
+
+        """
+        tx = self._tx(tx)
+
+        def compute():
+            active = np.flatnonzero(self.active_virtual(tx))
+            if not len(active):
+                raise ValueError('No TX antenna enabled in {}'.format(tx))
+            pos = np.rint(self.virtual_positions(tx)[active]).astype(int)
+            col = pos[:, 0] - pos[:, 0].min()
+            row = pos[:, 1].max() - pos[:, 1]
+            vmap = np.full((row.max() + 1, col.max() + 1), -1, dtype=int)
+            for k in range(len(pos))[::-1]:
+                vmap[row[k], col[k]] = active[k]
+            vmap.setflags(write=False)
+            return vmap
+
+        return self._cached(('map', tx), compute)
+
+    def gather(self, tx=None):
+        """Returns the index and empty positions to build the virtual array with one fancy indexing
+
+        Args:
+            tx (tuple): TX antenna of each chirp slot, None for silent chirps, all of them by default
+
+        Returns:
+            tuple: int index of shape (elevation, azimuth) into the virtual antenna axis,
+            and bool mask of the positions to zero
+
+        """
+        tx = self._tx(tx)
+
+        def compute():
+            vmap = self.array_map(tx)
+            return np.where(vmap < 0, 0, vmap), vmap < 0
+
+        return self._cached(('gather', tx), compute)
+
+    def correct_phase(self, data, rx_axis):
+        """Applies the RX phase correction to data in place
+
+        Args:
+            data (ndarray): Complex data with an RX antenna axis
+            rx_axis (int): Axis of the RX antennas
+
+        Returns:
+            ndarray: data
+
+        """
+        if self._phase_is_sign:
+            if self.inverted_rx:
+                index = [slice(None)] * data.ndim
+                index[rx_axis] = self.inverted_rx
+                data[tuple(index)] *= -1
+        else:
+            shape = [1] * data.ndim
+            shape[rx_axis] = self.num_rx
+            data *= self.rx_phase.reshape(shape)
+        return data
+
+    def steering_vectors(self, azimuths, elevations=None, tx=None):
+        """Returns the response of the virtual array to plane waves from the given directions
+
+        Args:
+            azimuths (ndarray): Azimuth angles in radians
+            elevations (ndarray): Elevation angles in radians, broadcast with azimuths. 0 by default
+            tx (tuple): TX antenna of each chirp slot, None for silent chirps, all of them by default
+
+        Returns:
+            ndarray: complex array of shape angles shape + (num_vx,), 0 for the virtual antennas of
+            silent chirps, not cached
+
+        """
+        tx = self._tx(tx)
+        azimuths = np.asarray(azimuths, dtype=float)
+        elevations = np.zeros_like(azimuths) if elevations is None else np.asarray(elevations, dtype=float)
+        az, el = np.broadcast_arrays(azimuths, elevations)
+        active = self.active_virtual(tx)
+        pos = np.where(active[:, None], self.virtual_positions(tx), 0)
+        # Path difference in half wavelengths, times pi for the phase
+        phase = np.pi * (np.multiply.outer(np.sin(az) * np.cos(el), pos[:, 0]) +
+                         np.multiply.outer(np.sin(el), pos[:, 1]))
+        return np.exp(1j * phase) * active
+
+    def __repr__(self):
+        return 'DeviceGeometry({!r}, {} TX, {} RX)'.format(self.name, self.num_tx, self.num_rx)
+
+
+def register_device(geometry):
+    """Adds a device to the registry, replacing any device with the same name
+
+    Args:
+        geometry (DeviceGeometry): Geometry of the device
+
+    Returns:
+        DeviceGeometry: geometry
+
+    """
+    DEVICES[geometry.name] = geometry
+    return geometry
+
+
+def get_device(name):
+    """Returns the geometry of a registered device
+
+    Args:
+        name (str): Device identifier
+
+    Returns:
+        DeviceGeometry: Geometry of the device
+
+    Raises:
+        ValueError: If the device is not registered
+
+    """
+    if name not in DEVICES:
+        raise ValueError('Unknown device {}, registered devices are {}'.format(name, sorted(DEVICES)))
+    return DEVICES[name]
+
+
+register_device(DeviceGeometry(
+    'IWR6843ISK-ODS',
+    tx_positions=[(0, 2), (2, 0), (2, 2)],
+    rx_positions=[(0, 1), (0, 0), (1, 0), (1, 1)],
+    rx_phase=[1, -1, -1, 1],
+    description='IWR6843 ODS antenna-on-package, 4x4 virtual array, RX2 and RX3 phase inverted'))
+
+register_device(DeviceGeometry(
+    'IWR1843ISK',
+    tx_positions=[(0, 0), (4, 0), (2, 1)],
+    rx_positions=[(0, 0), (1, 0), (2, 0), (3, 0)],
+    description='IWR1843 with TX2 raised by half a wavelength, 2x8 virtual array'))
@@ -0,0 +1,260 @@
+"""
+
+FFT BACKENDS
+============
+
+Pluggable FFT implementation used by fourier.py and radar_cube.py.
+
+Three backends are available, the last two only when installed:
+
+    - numpy: np.fft, always available
+    - scipy: scipy.fft, multithreaded with workers
+    - pyfftw: FFTW plans, multithreaded, planned once per shape and dtype
+
+The backend is chosen at runtime with set_backend, or with the MMWAVE_FFT
+environment variable on import. By default the fastest installed one is used:
+
+    >>> set_backend('scipy', workers=4)
+    >>> get_backend().name
+    'scipy'
+
+Every transform takes an optional out array, which may be the input itself
+for in-place transforms, and keeps single precision inputs in single
+precision when the backend allows it. numpy and scipy cache their plans
+internally. The pyfftw backend caches one FFTW plan with its aligned input
+and output buffers per transform, shape and dtype, the least recently used
+plans are dropped beyond PLAN_CACHE_SIZE.
+
+Included functions/classes:
+    - NumpyBackend
+    - ScipyBackend
+    - FFTWBackend
+    - available_backends
+    - set_backend
+    - get_backend
+    - fft, ifft, fft2, rfft, irfft
+
+"""
+
+import inspect
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+try:
+    import scipy.fft as scipy_fft
+except ImportError:
+    scipy_fft = None
+
+try:
+    import pyfftw
+    import pyfftw.builders
+except ImportError:
+    pyfftw = None
+
+# Plans kept by the pyfftw backend
+PLAN_CACHE_SIZE = 32
+
+# numpy >= 2.0 can write FFT results into an existing array
+_NUMPY_OUT = 'out' in inspect.signature(np.fft.fftn).parameters
+
+
+def _store(result, out):
+    """Helper function copying a result into out if given"""
+    if out is None or result is out:
+        return result
+    np.copyto(out, result, casting='same_kind')
+    return out
+
+
+class NumpyBackend:
+    """FFTs computed with np.fft"""
+
+    name = 'numpy'
+
+    def __init__(self, workers=None):
+        self.workers = 1
+
+    def transform(self, kind, a, s, axes, out=None):
+        """Computes an N-dimensional transform
+
+        Args:
+            kind (str): 'fftn', 'ifftn', 'rfftn' or 'irfftn'
+            a (ndarray): Input
+            s (tuple): Transform length along each axis, None for the input lengths
+            axes (tuple): Transformed axes
+            out (ndarray): Array to write the result into, can be a for complex transforms
+
+        Returns:
+            ndarray: Transform, out if given
+
+        """
+        func = getattr(np.fft, kind)
+        if _NUMPY_OUT and out is not None:
+            return func(a, s, axes, out=out)
+        return _store(func(a, s, axes), out)
+
+
+class ScipyBackend:
+    """FFTs computed with scipy.fft, with workers threads"""
+
+    name = 'scipy'
+
+    def __init__(self, workers=None):
+        if scipy_fft is None:
+            raise ImportError('scipy is not installed')
+        self.workers = os.cpu_count() if workers is None else workers
+
+    def transform(self, kind, a, s, axes, out=None):
+        """Computes an N-dimensional transform, see NumpyBackend.transform"""
+        result = getattr(scipy_fft, kind)(a, s, axes, overwrite_x=out is a, workers=self.workers)
+        return _store(result, out)
+
+
+class FFTWBackend:
+    """FFTs computed with cached pyFFTW plans
+
+    Attributes:
+        workers (int): Threads of each plan
+        planner_effort (str): FFTW planner flag. FFTW_MEASURE plans take longer to create
+            but run faster than FFTW_ESTIMATE ones
+
+    """
+
+    name = 'pyfftw'
+
+    def __init__(self, workers=None, planner_effort='FFTW_MEASURE'):
+        if pyfftw is None:
+            raise ImportError('pyfftw is not installed')
+        self.workers = os.cpu_count() if workers is None else workers
+        self.planner_effort = planner_effort
+        self._plans = OrderedDict()
+        self._lock = threading.Lock()
+
+    def plan(self, kind, shape, dtype, s, axes):
+        """Returns the cached plan of a transform, creating it if needed
+
+        Args:
+            kind (str): 'fftn', 'ifftn', 'rfftn' or 'irfftn'
+            shape (tuple): Input shape
+            dtype (np.dtype): Input dtype
+            s (tuple): Transform length along each axis
+            axes (tuple): Transformed axes
+
+        Returns:
+            pyfftw.FFTW: Plan, called with an input array and returning its internal output buffer
+
+        """
+        key = (kind, shape, np.dtype(dtype), s, axes)
+        plan = self._plans.get(key)
+        if plan is None:
+            template = pyfftw.empty_aligned(shape, dtype=dtype)
+            plan = getattr(pyfftw.builders, kind)(template, s, axes, threads=self.workers,
+                                                  planner_effort=self.planner_effort)
+            self._plans[key] = plan
+            if len(self._plans) > PLAN_CACHE_SIZE:
+                self._plans.popitem(last=False)
+        else:
+            self._plans.move_to_end(key)
+        return plan
+
+    def transform(self, kind, a, s, axes, out=None):
+        """Computes an N-dimensional transform, see NumpyBackend.transform"""
+        a = np.asanyarray(a)
+        if kind in ('fftn', 'ifftn') and a.dtype.kind != 'c':
+            a = a.astype(np.result_type(a.dtype, np.complex64))
+        with self._lock:
+            plan = self.plan(kind, a.shape, a.dtype, s, axes)
+            result = plan(a)
+            # The output buffer belongs to the plan and is overwritten by its next call
+            return _store(result, out) if out is not None else result.copy()
+
+    def clear(self):
+        """Drops every cached plan"""
+        with self._lock:
+            self._plans.clear()
+
+
+BACKENDS = {'numpy': NumpyBackend, 'scipy': ScipyBackend, 'pyfftw': FFTWBackend}
+_backend = None
+
+
+def available_backends():
+    """Returns the names of the installed backends, fastest first
+
+    Returns:
+        list: Backend names
+    """
+    names = ['pyfftw'] if pyfftw is not None else []
+    if scipy_fft is not None:
+        names.append('scipy')
+    return names + ['numpy']
+
+
+def set_backend(name=None, workers=None, **kwargs):
+    """Selects the backend used by every transform
+
+    Args:
+        name (str): 'numpy', 'scipy', 'pyfftw', or None for the fastest installed one
+        workers (int): Threads per transform, every core by default. Ignored by numpy
+        kwargs: Backend options, e.g. planner_effort for pyfftw
+
+    Returns:
+        Backend: The selected backend
+
+    Raises:
+        ValueError: If the backend is unknown
+        ImportError: If the backend is not installed
+
+    """
+    global _backend
+    if name is None:
+        name = available_backends()[0]
+    if name not in BACKENDS:
+        raise ValueError('Unknown FFT backend {}, choose from {}'.format(name, sorted(BACKENDS)))
+    _backend = BACKENDS[name](workers=workers, **kwargs)
+    return _backend
+
+
+def get_backend():
+    """Returns the backend used by every transform"""
+    return _backend
+
+
+def _axes(axis, n):
+    """Helper function turning a 1D transform into an N-dimensional one"""
+    return (axis,), None if n is None else (n,)
+
+
+def fft(a, n=None, axis=-1, out=None):
+    """FFT along one axis, as np.fft.fft, into out if given"""
+    axes, s = _axes(axis, n)
+    return _backend.transform('fftn', a, s, axes, out)
+
+
+def ifft(a, n=None, axis=-1, out=None):
+    """Inverse FFT along one axis, as np.fft.ifft, into out if given"""
+    axes, s = _axes(axis, n)
+    return _backend.transform('ifftn', a, s, axes, out)
+
+
+def fft2(a, s=None, axes=(-2, -1), out=None):
+    """2D FFT, as np.fft.fft2, into out if given"""
+    return _backend.transform('fftn', a, None if s is None else tuple(s), tuple(axes), out)
+
+
+def rfft(a, n=None, axis=-1, out=None):
+    """FFT of a real signal along one axis, as np.fft.rfft, into out if given"""
+    axes, s = _axes(axis, n)
+    return _backend.transform('rfftn', a, s, axes, out)
+
+
+def irfft(a, n=None, axis=-1, out=None):
+    """Inverse of rfft, as np.fft.irfft, into out if given"""
+    axes, s = _axes(axis, n)
+    return _backend.transform('irfftn', a, s, axes, out)
+
+
+set_backend(os.environ.get('MMWAVE_FFT') or None)
@@ -4,48 +4,58 @@ FOURIER OPERATIONS
 ==================
 
 Included functions:
-    - Range FFT
+    - Range FFT (batched over chirps and frames)
     - Doppler FFT
     - Angle FFT
 
+FFTs are computed by the backend selected in fft_backend.py
+
 """
 
 import numpy as np
+import fft_backend
 from params import PARAMS
+from instrumentation import timed
+from devices import enabled_tx, get_device
+from preprocessing import near_field_bins
 
-def rangeFFT(signal,device):
+@timed('fourier.rangeFFT')
+def rangeFFT(signal,device,tx=None,near_field=None,clutter=None):
     '''
-    Signal must come in the way "rdata.separated_data"
-    Device is the radar name
+    Signal must come in the way "rdata.separated_vx_data" for one chirp, of shape
+    (num_vx, samples), or with leading chirp and frame axes, e.g. (loops, num_vx, samples)
+    Device is the radar name, registered in devices.py
+    tx are the enabled TX antennas in chirp order, from PARAMS.CONFIG by default
+    near_field is the distance in m under which range bins are zeroed, 8 bins by default.
+    clutter is a ClutterFilter removing static reflectors from the range profiles, see clutter.py
+    Windows and calibration are applied beforehand, see preprocessing.py
 
     '''
 
 
     # 1D-range FFT
-    rFFT = np.fft.fft(signal,axis=1)
+    rFFT = fft_backend.fft(signal,axis=-1)
+    # Removing static clutter
+    if clutter is not None:
+        clutter.apply(rFFT,out=rFFT)
     # Removing near-field effect
-    rFFT[:,0:8] = 0
+    nearBins = 8 if near_field is None else near_field_bins(near_field)
+    rFFT[...,0:nearBins] = 0
     # Range bins
-    nBins = np.size(signal,1)
-
-    # Radar Cube for different devices
-    if device == 'IWR6843ISK-ODS':
-        radarCube = np.zeros((4,4,nBins),dtype=complex)
-        for n in range(nBins):
-            radarCube[:,:,n] = [[rFFT[0,n], rFFT[3,n], rFFT[4,n], rFFT[7,n]],
-                                    [rFFT[1,n], rFFT[2,n], rFFT[5,n], rFFT[6,n]],
-                                     [0.+0.j,         0.+0.j,         rFFT[8,n], rFFT[11,n]],
-                                     [0.+0.j,         0.+0.j,         rFFT[9,n], rFFT[10,n]]]
-    elif device == 'IWR1843ISK':
-        radarCube = np.zeros((2,8,nBins),dtype=complex )
-        for n in range(nBins):
-            radarCube[:,:,n] = [[0,         0,         rFFT[4,n], rFFT[5,n], rFFT[6,n], rFFT[7,n], 0,         0          ],
-                         [rFFT[0,n], rFFT[1,n], rFFT[2,n], rFFT[3,n], rFFT[8,n], rFFT[9,n], rFFT[10,n], rFFT[11,n]]]
+    nBins = np.size(signal,-1)
+
+    # Radar Cube for different devices, of shape (..., elevation, azimuth, nBins)
+    if tx is None:
+        tx = enabled_tx(PARAMS.CONFIG)
+    index, empty = get_device(device).gather(tx)
+    radarCube = rFFT[..., index, :]
+    radarCube[..., empty, :] = 0
 
     rBins = np.linspace(0,PARAMS.R_MAX,PARAMS.NUM_RANGE_BINS)
 
     return radarCube, rFFT, rBins
 
+@timed('fourier.angleFFT')
 def angleFFT(signal):
     '''
     Signal is "rFFT" coming from "rangFFT"
@@ -56,7 +66,7 @@ def angleFFT(signal):
     elBins = PARAMS.NUM_ELEV_BINS
 
     # Angle FFTs
-    angFFT = np.fft.fft2(signal,(elBins,azBins),axes=(0,1))
+    angFFT = fft_backend.fft2(signal,(elBins,azBins),axes=(0,1))
     angFFT = np.fft.fftshift(angFFT,axes=0)
     angFFT = np.fft.fftshift(angFFT,axes=1)
     # For azimuth and elevation, the average is taken. It can also be replaced
@@ -77,15 +87,29 @@ def angleFFT(signal):
 
 
 
-def dopplerFFT(signal):
+@timed('fourier.dopplerFFT')
+def dopplerFFT(signal,near_field=None,clutter=None):
+    '''
+    Signal must come in the way "rdata.separated_vx_data", of shape (loops, num_vx, samples)
+    near_field is the distance in m under which range bins are zeroed, 12 bins by default
+    clutter is a ClutterFilter removing static reflectors from the range profiles of the
+    virtual antenna, before the Doppler FFT, see clutter.py
+
+    '''
 
     # Virtual antenna to do the calculations:
     signal = signal[:,1,:]
-    # 2D-range/Doppler FFT
-    dFFT = np.fft.fft2(signal,axes=(0,1))
+    # 1D-range FFT
+    rFFT = fft_backend.fft(signal,axis=1)
+    # Removing static clutter, with the profile of the single antenna as (1, samples)
+    if clutter is not None:
+        clutter.apply(rFFT[:,None,:],out=rFFT[:,None,:])
+    # Doppler FFT
+    dFFT = fft_backend.fft(rFFT,axis=0)
     dFFT = np.fft.fftshift(dFFT,axes=0)
     # Removing near-field effect
-    dFFT[:,0:12] = 0
+    nearBins = 12 if near_field is None else near_field_bins(near_field)
+    dFFT[:,0:nearBins] = 0
 
     # Bins for range and velocity
     rBins = np.linspace(0,PARAMS.R_MAX,PARAMS.NUM_RANGE_BINS)
@@ -0,0 +1,309 @@
+"""
+
+INSTRUMENTATION
+===============
+
+Opt-in metrics telling whether processing is bound by the socket, reshaping
+or FFTs. Import METRICS and call METRICS.enable() to start recording:
+
+    - stage durations, as histograms of seconds per call, for every function
+      decorated with timed (frame assembly, socket waits, organize, FFTs...)
+    - counters, e.g. frames received and packets lost
+    - gauges, e.g. frames waiting in the DCA1000 ring
+
+While disabled, instrumented code only checks METRICS.enabled. Snapshots are
+returned as a dictionary or exported as JSON or as a Prometheus text file,
+either on demand or periodically from a background thread:
+
+    >>> METRICS.enable()
+    >>> METRICS.start_export('metrics.prom', interval=10)
+    >>> ...
+    >>> print(METRICS.snapshot()['histograms']['fourier.rangeFFT'])
+
+Included classes/functions:
+    - Metrics
+    - timed
+    - METRICS
+
+"""
+
+import bisect
+import functools
+import json
+import os
+import re
+import threading
+import time
+
+# Upper bounds of the duration histogram buckets in seconds, 10 us to 10 s
+BUCKETS = tuple(m * 10.**e for e in range(-5, 1) for m in (1, 2, 5)) + (10.,)
+PREFIX = 'mmwave'
+
+
+class _Histogram:
+    """Distribution of durations in fixed buckets"""
+
+    __slots__ = ('counts', 'count', 'sum', 'min', 'max')
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.
+        self.min = float('inf')
+        self.max = 0.
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(BUCKETS, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def quantile(self, q):
+        """Estimates a quantile by linear interpolation inside its bucket"""
+        if not self.count:
+            return 0.
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if n and seen + n >= rank:
+                lo = BUCKETS[i - 1] if i > 0 else 0.
+                hi = BUCKETS[i] if i < len(BUCKETS) else self.max
+                value = lo + (hi - lo) * (rank - seen) / n
+                return min(max(value, self.min), self.max)
+            seen += n
+        return self.max
+
+    def as_dict(self):
+        cumulative = 0
+        buckets = []
+        for bound, n in zip(BUCKETS + (float('inf'),), self.counts):
+            cumulative += n
+            buckets.append((bound, cumulative))
+        return {'count': self.count,
+                'sum': self.sum,
+                'mean': self.sum / self.count if self.count else 0.,
+                'min': self.min if self.count else 0.,
+                'max': self.max,
+                'p50': self.quantile(0.5),
+                'p99': self.quantile(0.99),
+                'buckets': buckets}
+
+
+class Metrics:
+    """Registry of counters, gauges and duration histograms.
+
+    Use the METRICS instance rather than creating new ones, so that every module
+    records into the same registry. Recording methods are thread-safe.
+
+    Attributes:
+        enabled (bool): Whether metrics are recorded, False by default
+
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._gauges = {}
+        self._histograms = {}
+        self._start = time.time()
+        self._export_thread = None
+        self._export_stop = threading.Event()
+
+    def enable(self):
+        """Starts recording metrics"""
+        self.enabled = True
+
+    def disable(self):
+        """Stops recording metrics, recorded values are kept"""
+        self.enabled = False
+
+    def reset(self):
+        """Clears every recorded value"""
+        with self._lock:
+            self._counters.clear()
+            self._gauges.clear()
+            self._histograms.clear()
+            self._start = time.time()
+
+    def count(self, name, value=1):
+        """Adds value to a counter
+
+        Args:
+            name (str): Counter name, e.g. 'dca1000.packets_lost'
+            value (int): Increment
+
+        Returns:
+            None
+
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def set_gauge(self, name, value):
+        """Sets the current value of a gauge
+
+        Args:
+            name (str): Gauge name, e.g. 'dca1000.ring_occupancy'
+            value (float): Current value
+
+        Returns:
+            None
+
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            self._gauges[name] = value
+
+    def observe(self, name, seconds):
+        """Records a duration in a histogram
+
+        Args:
+            name (str): Stage name, e.g. 'fourier.rangeFFT'
+            seconds (float): Duration of the stage
+
+        Returns:
+            None
+
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = _Histogram()
+            histogram.observe(seconds)
+
+    def snapshot(self):
+        """Returns a copy of every recorded value
+
+        Returns:
+            dict: time and uptime in seconds, counters, gauges, and histograms with count,
+            sum, mean, min, max, estimated p50 and p99 and cumulative (bound, count) buckets
+
+        """
+        with self._lock:
+            return {'time': time.time(),
+                    'uptime': time.time() - self._start,
+                    'counters': dict(self._counters),
+                    'gauges': dict(self._gauges),
+                    'histograms': {name: h.as_dict() for name, h in self._histograms.items()}}
+
+    def to_json(self):
+        """Returns a snapshot as a JSON string"""
+        return json.dumps(self.snapshot())
+
+    def to_prometheus(self, prefix=PREFIX):
+        """Returns a snapshot in the Prometheus text exposition format
+
+        Counters become <prefix>_<name>_total, gauges <prefix>_<name>, and every
+        histogram a series of <prefix>_stage_duration_seconds with a stage label.
+
+        Args:
+            prefix (str): Prefix of every metric name
+
+        Returns:
+            str: Exposition text
+
+        """
+        snapshot = self.snapshot()
+        lines = []
+        for name, value in sorted(snapshot['counters'].items()):
+            metric = '{}_{}_total'.format(prefix, _metric_name(name))
+            lines += ['# TYPE {} counter'.format(metric), '{} {}'.format(metric, value)]
+        for name, value in sorted(snapshot['gauges'].items()):
+            metric = '{}_{}'.format(prefix, _metric_name(name))
+            lines += ['# TYPE {} gauge'.format(metric), '{} {}'.format(metric, value)]
+
+        if snapshot['histograms']:
+            metric = '{}_stage_duration_seconds'.format(prefix)
+            lines.append('# TYPE {} histogram'.format(metric))
+            for name, h in sorted(snapshot['histograms'].items()):
+                for bound, count in h['buckets']:
+                    le = '+Inf' if bound == float('inf') else repr(bound)
+                    lines.append('{}_bucket{{stage="{}",le="{}"}} {}'.format(metric, name, le, count))
+                lines.append('{}_sum{{stage="{}"}} {}'.format(metric, name, h['sum']))
+                lines.append('{}_count{{stage="{}"}} {}'.format(metric, name, h['count']))
+        return '\n'.join(lines) + '\n'
+
+    def write(self, path):
+        """Writes a snapshot to a file, replacing it atomically
+
+        Args:
+            path (str): Output file, in the Prometheus text format if it ends with .prom, else JSON
+
+        Returns:
+            None
+
+        """
+        text = self.to_prometheus() if path.endswith('.prom') else self.to_json()
+        tmp = path + '.tmp'
+        with open(tmp, 'w') as f:
+            f.write(text)
+        os.replace(tmp, path)
+
+    def start_export(self, path, interval=10.):
+        """Writes a snapshot to path every interval seconds from a background thread
+
+        Args:
+            path (str): Output file, see write
+            interval (float): Seconds between snapshots
+
+        Returns:
+            None
+
+        """
+        self.stop_export()
+        self._export_stop.clear()
+
+        def export():
+            while not self._export_stop.wait(interval):
+                self.write(path)
+            self.write(path)
+
+        self._export_thread = threading.Thread(target=export, daemon=True)
+        self._export_thread.start()
+
+    def stop_export(self):
+        """Stops the export thread after writing a last snapshot"""
+        if self._export_thread is None:
+            return
+        self._export_stop.set()
+        self._export_thread.join()
+        self._export_thread = None
+
+
+def _metric_name(name):
+    """Helper function turning a metric name into a valid Prometheus name"""
+    return re.sub(r'[^a-zA-Z0-9_]', '_', name)
+
+
+def timed(name):
+    """Decorator recording the duration of each call in the name histogram of METRICS
+
+    Args:
+        name (str): Stage name
+
+    Returns:
+        function: Decorator
+
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not METRICS.enabled:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                METRICS.observe(name, time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+METRICS = Metrics()
@@ -28,119 +28,143 @@ def liveRangePreview(dca, PEAK_TH=None):
     '''
     Live range FFT preview for first chirp and Tx-RX pair
     '''
-    # Figure
-    fig = plt.figure()
-    ax = plt.axes(xlim=(0, PARAMS.R_MAX/2), ylim=(0, Y_MAX))
-    line = ax.plot([], [], 'b-8')[0]
-
-    ax.grid()
-    ax.set_xlabel('Range (m)')
-    ax.set_ylabel('Reflected Power')
-
-    ann_list = []
-
-    def init():
-        line.set_xdata(np.arange(PARAMS.ADC_SAMPLES))
-        return line
-
-    def animate(i):
-        # Clear previous frame annotations
-        for a in ann_list:
-            a.remove()
-        ann_list[:] = []
-
-        dca._clear_buffer()
-        adc_data = dca.read()
-        adc_data = DCA1000.organize(
-            adc_data, num_chirps=PARAMS.CHIRPS_PER_FRAME, num_rx=PARAMS.RX_ANTENNAS, num_samples=PARAMS.ADC_SAMPLES)
-        adc_data = DCA1000.separate_tx(adc_data, num_tx=PARAMS.TX_ANTENNAS)
-        range, bins = rangeFFT(adc_data[0, 0], remove_beg=False)
-
-        if PEAK_TH is not None:
-            peaks = findPeaks(range, th=PEAK_TH)
-
-            for peak in peaks:
-                mag = [range[peak]]
-                bin = bins[peak]
-                ann = ax.annotate(f'{bin:.2f}',
-                                  xy=(bin, mag),
-                                  xytext=(bin+0.2, mag),
-                                  fontsize=10)
-                ann_list.append(ann)
-        else:
-            peaks = []
-
-        line.set_xdata(bins)
-        line.set_ydata(range)
-        line.set_markevery(peaks)
-
-        return line
-
-    anim = FuncAnimation(fig, animate, init_func=init,
-                         interval=100)
-
-    plt.show()
+    dca.start_streaming()
+    try:
+        # Figure
+        fig = plt.figure()
+        ax = plt.axes(xlim=(0, PARAMS.R_MAX/2), ylim=(0, Y_MAX))
+        line = ax.plot([], [], 'b-8')[0]
+
+        ax.grid()
+        ax.set_xlabel('Range (m)')
+        ax.set_ylabel('Reflected Power')
+
+        ann_list = []
+
+        def init():
+            line.set_xdata(np.arange(PARAMS.ADC_SAMPLES))
+            return line
+
+        def animate(i):
+            # Clear previous frame annotations
+            for a in ann_list:
+                a.remove()
+            ann_list[:] = []
+
+            adc_data = dca.get_latest()
+            if adc_data is None:
+                # Streaming stopped, e.g. on a socket error: keep the last frame on screen
+                anim.event_source.stop()
+                return line
+            adc_data = DCA1000.organize(
+                adc_data, num_chirps=PARAMS.CHIRPS_PER_FRAME, num_rx=PARAMS.RX_ANTENNAS, num_samples=PARAMS.ADC_SAMPLES)
+            adc_data = DCA1000.separate_tx(adc_data, num_tx=PARAMS.TX_ANTENNAS)
+            range, bins = rangeFFT(adc_data[0, 0], remove_beg=False)
+
+            if PEAK_TH is not None:
+                peaks = findPeaks(range, th=PEAK_TH)
+
+                for peak in peaks:
+                    mag = [range[peak]]
+                    bin = bins[peak]
+                    ann = ax.annotate(f'{bin:.2f}',
+                                      xy=(bin, mag),
+                                      xytext=(bin+0.2, mag),
+                                      fontsize=10)
+                    ann_list.append(ann)
+            else:
+                peaks = []
+
+            line.set_xdata(bins)
+            line.set_ydata(range)
+            line.set_markevery(peaks)
+
+            return line
+
+        anim = FuncAnimation(fig, animate, init_func=init,
+                             interval=100)
+
+        plt.show()
+    finally:
+        # Free the socket for the next preview, also when the plot fails
+        dca.stop_streaming()
 
 
 def liveRangeHeatmapPreview(dca):
-    # Create fake radar input data to get range bins
-    avg = np.zeros((PARAMS.CHIRP_LOOPS, PARAMS.RX_ANTENNAS*PARAMS.TX_ANTENNAS,
-                   PARAMS.ADC_SAMPLES), dtype=complex)
+    dca.start_streaming()
+    try:
+        # Create fake radar input data to get range bins
+        avg = np.zeros((PARAMS.CHIRP_LOOPS, PARAMS.RX_ANTENNAS*PARAMS.TX_ANTENNAS,
+                       PARAMS.ADC_SAMPLES), dtype=complex)
 
-    bins, chirps, matrix = generateRangeHeatmap(avg)
+        bins, chirps, matrix = generateRangeHeatmap(avg)
 
-    # Figure
-    fig, ax = plt.subplots()
-    cax = ax.pcolormesh(bins, chirps,
-                        np.abs(matrix), vmin=0, vmax=V_MAX)
-    fig.colorbar(cax, ax=ax)
+        # Figure
+        fig, ax = plt.subplots()
+        cax = ax.pcolormesh(bins, chirps,
+                            np.abs(matrix), vmin=0, vmax=V_MAX)
+        fig.colorbar(cax, ax=ax)
 
-    ax.grid()
-    ax.set_xlabel('Range (m)')
-    ax.set_ylabel('Chirp #')
+        ax.grid()
+        ax.set_xlabel('Range (m)')
+        ax.set_ylabel('Chirp #')
 
-    def animate(i):
-        dca._clear_buffer()
-        adc_data = dca.read()
-        adc_data = DCA1000.organize(
-            adc_data, num_chirps=PARAMS.CHIRPS_PER_FRAME, num_rx=PARAMS.RX_ANTENNAS, num_samples=PARAMS.ADC_SAMPLES)
-        adc_data = DCA1000.separate_tx(adc_data, num_tx=PARAMS.TX_ANTENNAS)
-        _, _, matrix = generateRangeHeatmap(adc_data)
+        def animate(i):
+            adc_data = dca.get_latest()
+            if adc_data is None:
+                # Streaming stopped, e.g. on a socket error: keep the last frame on screen
+                anim.event_source.stop()
+                return
+            adc_data = DCA1000.organize(
+                adc_data, num_chirps=PARAMS.CHIRPS_PER_FRAME, num_rx=PARAMS.RX_ANTENNAS, num_samples=PARAMS.ADC_SAMPLES)
+            adc_data = DCA1000.separate_tx(adc_data, num_tx=PARAMS.TX_ANTENNAS)
+            _, _, matrix = generateRangeHeatmap(adc_data)
 
-        cax.set_array(np.abs(matrix))
+            cax.set_array(np.abs(matrix))
 
-    anim = FuncAnimation(fig, animate, interval=100)
+        anim = FuncAnimation(fig, animate, interval=100)
 
-    plt.show()
+        plt.show()
+    finally:
+        # Free the socket for the next preview, also when the plot fails
+        dca.stop_streaming()
 
 
 def liveAzimuthRangeHeatmapPreview(dca):
-    # Create fake radar input data to get range and azimuth bins
-    avg = np.zeros((PARAMS.CHIRP_LOOPS, PARAMS.RX_ANTENNAS*PARAMS.TX_ANTENNAS,
-                   PARAMS.ADC_SAMPLES), dtype=complex)
-
-    range_bins, azimuth_bins, matrix = generateAzimuthRangeHeatmap(avg)
-
-    # Figure
-    fig, ax = plt.subplots()
-    cax = ax.pcolormesh(range_bins, azimuth_bins,
-                        np.abs(matrix), vmin=0, vmax=V_MAX)
-    fig.colorbar(cax, ax=ax)
-
-    ax.grid()
-    ax.set_xlabel('Range (m)')
-    ax.set_ylabel('Azimuth (°)')
-
-    def animate(i):
-        dca._clear_buffer()
-        adc_data = dca.read()
-        adc_data = DCA1000.organize(
-            adc_data, num_chirps=PARAMS.CHIRPS_PER_FRAME, num_rx=PARAMS.RX_ANTENNAS, num_samples=PARAMS.ADC_SAMPLES)
-        adc_data = DCA1000.separate_tx(adc_data, num_tx=PARAMS.TX_ANTENNAS)
-        _, _, matrix = generateAzimuthRangeHeatmap(adc_data)
-
-        cax.set_array(np.abs(matrix))
-
-    anim = FuncAnimation(fig, animate, interval=100)
-
-    plt.show()
+    dca.start_streaming()
+    try:
+        # Create fake radar input data to get range and azimuth bins
+        avg = np.zeros((PARAMS.CHIRP_LOOPS, PARAMS.RX_ANTENNAS*PARAMS.TX_ANTENNAS,
+                       PARAMS.ADC_SAMPLES), dtype=complex)
+
+        range_bins, azimuth_bins, matrix = generateAzimuthRangeHeatmap(avg)
+
+        # Figure
+        fig, ax = plt.subplots()
+        cax = ax.pcolormesh(range_bins, azimuth_bins,
+                            np.abs(matrix), vmin=0, vmax=V_MAX)
+        fig.colorbar(cax, ax=ax)
+
+        ax.grid()
+        ax.set_xlabel('Range (m)')
+        ax.set_ylabel('Azimuth (°)')
+
+        def animate(i):
+            adc_data = dca.get_latest()
+            if adc_data is None:
+                # Streaming stopped, e.g. on a socket error: keep the last frame on screen
+                anim.event_source.stop()
+                return
+            adc_data = DCA1000.organize(
+                adc_data, num_chirps=PARAMS.CHIRPS_PER_FRAME, num_rx=PARAMS.RX_ANTENNAS, num_samples=PARAMS.ADC_SAMPLES)
+            adc_data = DCA1000.separate_tx(adc_data, num_tx=PARAMS.TX_ANTENNAS)
+            _, _, matrix = generateAzimuthRangeHeatmap(adc_data)
+
+            cax.set_array(np.abs(matrix))
+
+        anim = FuncAnimation(fig, animate, interval=100)
+
+        plt.show()
+    finally:
+        # Free the socket for the next preview, also when the plot fails
+        dca.stop_streaming()
@@ -5,9 +5,12 @@ MMWAVE DCA1000 PARAMETERS
 
 Import PARAMS object to get access to all variables.
 Call PARAMS.set_playback_mode(config) to use custom config dictionary (when reading saved data).
+Set the MMWAVE_CONFIG environment variable to read another lua script than CONFIG_FILE.
 
 """
 
+import os
+
 
 class __PARAMS_CLASS():
     '''
@@ -18,7 +21,8 @@ class __PARAMS_CLASS():
 
     RECORD_MODE = 1
     PLAYBACK_MODE = 2
-    CONFIG_FILE = 'C:\\ti\mmwave_studio_02_01_01_00\mmWaveStudio\Scripts\DataCaptureDemo_PythonPrepare.lua'
+    CONFIG_FILE = os.environ.get(
+        'MMWAVE_CONFIG', r'C:\ti\mmwave_studio_02_01_01_00\mmWaveStudio\Scripts\DataCaptureDemo_PythonPrepare.lua')
 
     c = 299792458  # m/s
 
@@ -97,10 +101,14 @@ class __PARAMS_CLASS():
         self.CONFIG = playback_config
         self.parse_config()
 
-    def parse_config_file(self):
+    def parse_config_file(self, config_file=None):
+        '''
+        Parse radar parameters from the header of a lua script.
+        Uses CONFIG_FILE unless another script path is given.
+        '''
         d = {}
         # Read file and update dict
-        with open(self.CONFIG_FILE, 'r') as f:
+        with open(config_file or self.CONFIG_FILE, 'r') as f:
             for _ in range(39):
                 line = f.readline()
                 if not (line.startswith('-') or line.startswith('\n')):
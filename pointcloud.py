@@ -0,0 +1,149 @@
+"""
+
+POINT CLOUDS
+============
+
+Conversion of CFAR detections into points with position, velocity and SNR.
+
+For each detection of cfar.CFAR, the spectra of every virtual antenna at the
+detected range and Doppler bins form a snapshot of the array. The direction
+of arrival of all the snapshots of a frame is estimated at once: one matrix
+product with the steering vectors of an azimuth/elevation grid, computed once
+from the device geometry (see devices.py), gives the Bartlett spectrum of
+every detection, and its maximum gives the angles.
+
+Before that, the phase each virtual antenna gains from the target motion
+between the TX slots of a chirp loop is removed, as the TX antennas of
+TDM-MIMO chirps transmit one after the other.
+
+Points are written into a structured array allocated once, with x across the
+board, y away from it and z up, in m, the radial velocity in m/s and the SNR
+of the detection in dB:
+
+    >>> engine = RadarCubeEngine(device)
+    >>> cfar = CFAR('ca', pfa=1e-4)
+    >>> cloud = PointCloud(device)
+    >>> engine.process(rdata.separated_vx_data)
+    >>> detections = cfar.detect(engine.range_doppler_map())
+    >>> points = cloud.generate(detections, engine.doppler_cube, engine.range_axis, engine.doppler_axis)
+
+Included classes:
+    - PointCloud
+    - POINT_DTYPE
+
+"""
+
+import numpy as np
+
+from devices import enabled_tx, get_device
+from params import PARAMS
+
+POINT_DTYPE = np.dtype([('x', '<f4'),
+                        ('y', '<f4'),
+                        ('z', '<f4'),
+                        ('doppler', '<f4'),
+                        ('snr', '<f4')])
+
+
+class PointCloud:
+    """Turns the detections of a frame into a point cloud with batched angle estimation.
+
+    The array returned by generate is a view on a buffer that is overwritten by
+    the next call, copy it to keep it.
+
+    Attributes:
+        device (str): Device identifier, registered in devices.py
+        tx (tuple): Enabled TX antennas in chirp order, from PARAMS.CONFIG by default
+        azimuths (ndarray): Azimuth grid in radians, -60 to 60 degrees by steps of 1 by default
+        elevations (ndarray): Elevation grid in radians, -30 to 30 degrees by steps of 2 by default
+            if the virtual array has several rows, else 0
+        max_points (int): Maximum number of points per frame, the detections with the highest SNR
+            are kept
+        doppler_compensation (bool): Remove the phase due to the target motion between TX slots
+
+    """
+
+    def __init__(self, device, tx=None, azimuths=None, elevations=None, max_points=1024,
+                 doppler_compensation=True):
+        self.device = device
+        self.tx = enabled_tx(PARAMS.CONFIG) if tx is None else tuple(tx)
+        geometry = get_device(device)
+        if azimuths is None:
+            azimuths = np.radians(np.arange(-60., 61.))
+        if elevations is None:
+            positions = geometry.virtual_positions(self.tx)[geometry.active_virtual(self.tx)]
+            flat = np.ptp(positions[:, 1]) == 0
+            elevations = np.zeros(1) if flat else np.radians(np.arange(-30., 31., 2.))
+        self.azimuths = np.asarray(azimuths, dtype=float)
+        self.elevations = np.asarray(elevations, dtype=float)
+        self.max_points = max_points
+        self.doppler_compensation = doppler_compensation
+
+        # Steering matrix of the whole grid, conjugated for the Bartlett products
+        az, el = np.meshgrid(self.azimuths, self.elevations, indexing='ij')
+        self._grid_az = az.reshape(-1)
+        self._grid_el = el.reshape(-1)
+        steering = geometry.steering_vectors(self._grid_az, self._grid_el, self.tx)
+        self._steering = np.ascontiguousarray(steering.conj().T).astype(np.complex64)
+        self.num_vx = geometry.num_virtual(self.tx)
+        self._slot = np.repeat(np.arange(len(self.tx)), geometry.num_rx)
+
+        self._points = np.zeros(max_points, dtype=POINT_DTYPE)
+
+    def estimate_angles(self, snapshots):
+        """Estimates the direction of arrival of array snapshots
+
+        Args:
+            snapshots (ndarray): Complex array of shape (n, num_vx)
+
+        Returns:
+            tuple: azimuth and elevation in radians, and Bartlett power at the maximum, of shape (n,)
+
+        """
+        spectrum = np.abs(snapshots @ self._steering) ** 2
+        best = np.argmax(spectrum, axis=1)
+        return self._grid_az[best], self._grid_el[best], spectrum[np.arange(len(best)), best]
+
+    def generate(self, detections, cube, range_axis=None, doppler_axis=None):
+        """Returns the point cloud of the detections of a frame
+
+        Args:
+            detections (ndarray): Detections of dtype cfar.DETECTION_DTYPE
+            cube (ndarray): Range-Doppler spectra of every virtual antenna, of shape (doppler, num_vx,
+                range), Doppler fftshifted, e.g. RadarCubeEngine.doppler_cube
+            range_axis (ndarray): Range of each range bin of the cube in m, from PARAMS by default
+            doppler_axis (ndarray): Velocity of each Doppler bin of the cube in m/s, from PARAMS by default
+
+        Returns:
+            ndarray: Points of dtype POINT_DTYPE, at most max_points
+
+        """
+        if cube.shape[1] != self.num_vx:
+            raise ValueError('Cube with {} virtual antennas given for {}'.format(cube.shape[1], self.num_vx))
+        if range_axis is None:
+            range_axis = np.linspace(0, PARAMS.R_MAX, PARAMS.NUM_RANGE_BINS)
+        if doppler_axis is None:
+            doppler_axis = np.linspace(-PARAMS.DOPPLER_MAX, PARAMS.DOPPLER_MAX, PARAMS.NUM_DOPPLER_BINS)
+
+        if len(detections) > self.max_points:
+            strongest = np.argpartition(detections['snr'], -self.max_points)[-self.max_points:]
+            detections = detections[np.sort(strongest)]
+        doppler_idx = detections['doppler_idx']
+        range_idx = detections['range_idx']
+
+        # Snapshots of shape (n, num_vx)
+        snapshots = cube[doppler_idx, :, range_idx]
+        if self.doppler_compensation:
+            loops = cube.shape[0]
+            shift = (doppler_idx - loops // 2)[:, None] * self._slot[None, :] / (loops * len(self.tx))
+            snapshots = snapshots * np.exp(-2j * np.pi * shift)
+        azimuth, elevation, _ = self.estimate_angles(snapshots)
+
+        distance = np.asarray(range_axis)[range_idx]
+        points = self._points[:len(detections)]
+        points['x'] = distance * np.cos(elevation) * np.sin(azimuth)
+        points['y'] = distance * np.cos(elevation) * np.cos(azimuth)
+        points['z'] = distance * np.sin(elevation)
+        points['doppler'] = np.asarray(doppler_axis)[doppler_idx]
+        points['snr'] = detections['snr']
+        return points
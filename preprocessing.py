@@ -0,0 +1,246 @@
+"""
+
+PRE-FFT PROCESSING
+==================
+
+Windowing and calibration applied to frames before the FFTs.
+
+A Preprocessor combines, for frames of shape (loops, num_vx, samples) as in
+RadarData.separated_vx_data:
+
+    - a range window over the samples of each chirp
+    - a Doppler window over the chirp loops
+    - an angle window over the virtual array of the device, evaluated at the
+      azimuth and elevation position of each virtual antenna
+    - a complex calibration coefficient per virtual antenna, correcting the
+      gain and phase mismatch between channels (see estimate_calibration)
+    - the removal of the DC component of each chirp
+
+Windows and calibration are multiplied into a single coefficient array,
+computed once per frame shape and PARAMS configuration, so that the whole
+stage is one broadcast multiply. The near-field range bins zeroed after the
+range FFT are given in meters and converted with PARAMS.R_BIN.
+
+    >>> pre = Preprocessor('IWR6843ISK-ODS', range_window='hann', doppler_window='hann',
+    ...                    calibration=np.load('calibration.npy'), near_field=0.3)
+    >>> frame = pre.apply(rdata.separated_vx_data)
+    >>> rFFT = pre.mask_near_field(np.fft.fft(frame, axis=-1))
+
+Included functions/classes:
+    - Preprocessor
+    - get_window
+    - near_field_bins
+    - estimate_calibration
+
+"""
+
+import numpy as np
+
+import fft_backend
+from devices import enabled_tx, get_device
+from params import PARAMS
+
+WINDOWS = {'hann': np.hanning,
+           'hanning': np.hanning,
+           'hamming': np.hamming,
+           'blackman': np.blackman,
+           'bartlett': np.bartlett}
+
+
+def get_window(window, n):
+    """Returns the coefficients of a window
+
+    Args:
+        window (str or ndarray): Window name (hann, hamming, blackman, bartlett), coefficients
+            of length n, or None for no window
+        n (int): Window length
+
+    Returns:
+        ndarray: Coefficients of length n
+
+    Raises:
+        ValueError: If the window is unknown or has the wrong length
+
+    """
+    if window is None:
+        return np.ones(n)
+    if isinstance(window, str):
+        if window not in WINDOWS:
+            raise ValueError('Unknown window {}, choose from {}'.format(window, sorted(WINDOWS)))
+        return WINDOWS[window](n)
+    window = np.asarray(window)
+    if window.shape != (n,):
+        raise ValueError('Window of shape {} given for {} samples'.format(window.shape, n))
+    return window
+
+
+def near_field_bins(distance):
+    """Returns the number of range bins closer than a distance
+
+    Args:
+        distance (float): Distance in m
+
+    Returns:
+        int: Number of range bins, with the resolution of the current PARAMS configuration
+
+    """
+    return int(np.ceil(distance / PARAMS.R_BIN)) if distance > 0 else 0
+
+
+class Preprocessor:
+    """Applies windows, calibration and DC removal to frames with precomputed coefficients.
+
+    Windows are not normalised, the spectra are scaled by their coherent gain.
+
+    Attributes:
+        device (str): Device identifier, registered in devices.py. Needed by the angle window
+        range_window (str or ndarray): Window over the ADC samples
+        doppler_window (str or ndarray): Window over the chirp loops
+        angle_window (str or ndarray): Window over the columns and rows of the virtual array
+        remove_dc (bool): Subtract the mean of each chirp before windowing
+        calibration (ndarray): Complex coefficient of each virtual antenna, None for no calibration
+        near_field (float): Distance in m under which mask_near_field zeroes range bins
+        tx (tuple): Enabled TX antennas in chirp order, from PARAMS.CONFIG by default
+        dtype (np.dtype): Dtype of the coefficients
+
+    """
+
+    def __init__(self, device=None, range_window=None, doppler_window=None, angle_window=None,
+                 remove_dc=False, calibration=None, near_field=0., tx=None, dtype=np.complex64):
+        if angle_window is not None and device is None:
+            raise ValueError('The angle window needs the device geometry')
+        self.device = device
+        self.range_window = range_window
+        self.doppler_window = doppler_window
+        self.angle_window = angle_window
+        self.remove_dc = remove_dc
+        self.calibration = None if calibration is None else np.asarray(calibration, dtype=complex)
+        self.near_field = near_field
+        self.tx = tx
+        self.dtype = np.dtype(dtype)
+        self._cache = {}
+
+    def _antenna_weights(self, num_vx):
+        """Helper function returning the angle window times the calibration of each virtual antenna"""
+        weights = np.ones(num_vx, dtype=complex)
+        if self.angle_window is not None:
+            tx = enabled_tx(PARAMS.CONFIG) if self.tx is None else self.tx
+            geometry = get_device(self.device)
+            if geometry.num_virtual(tx) != num_vx:
+                raise ValueError('{} has {} virtual antennas, not {}'.format(
+                    self.device, geometry.num_virtual(tx), num_vx))
+            # Silent chirps are weighted 0
+            active = geometry.active_virtual(tx)
+            pos = np.rint(geometry.virtual_positions(tx)[active]).astype(int)
+            col = pos[:, 0] - pos[:, 0].min()
+            row = pos[:, 1] - pos[:, 1].min()
+            weights[~active] = 0
+            weights[active] *= get_window(self.angle_window, col.max() + 1)[col]
+            weights[active] *= get_window(self.angle_window, row.max() + 1)[row]
+        if self.calibration is not None:
+            if self.calibration.shape != (num_vx,):
+                raise ValueError('Calibration of shape {} given for {} virtual antennas'.format(
+                    self.calibration.shape, num_vx))
+            weights *= self.calibration
+        return weights
+
+    def coefficients(self, loops, num_vx, samples, doppler_window=True):
+        """Returns the coefficients frames are multiplied by, computed once per shape and configuration
+
+        Args:
+            loops (int): Chirp loops per frame
+            num_vx (int): Virtual antennas
+            samples (int): ADC samples per chirp
+            doppler_window (bool): Include the Doppler window, False when it is applied later,
+                e.g. after clutter removal
+
+        Returns:
+            ndarray: Read-only array of shape (loops, num_vx, samples)
+
+        """
+        key = (loops, num_vx, samples, enabled_tx(PARAMS.CONFIG) if self.tx is None else tuple(self.tx),
+               doppler_window)
+        if key not in self._cache:
+            doppler = get_window(self.doppler_window if doppler_window else None, loops)
+            coefficients = (doppler[:, None, None] *
+                            self._antenna_weights(num_vx)[None, :, None] *
+                            get_window(self.range_window, samples)[None, None, :]).astype(self.dtype)
+            coefficients.setflags(write=False)
+            self._cache = {key: coefficients}
+        return self._cache[key]
+
+    def apply(self, frame, out=None, doppler_window=True):
+        """Applies DC removal, windows and calibration to frames
+
+        Args:
+            frame (ndarray): Frames of shape (..., loops, num_vx, samples)
+            out (ndarray): Array to write the result into, can be frame for in-place processing
+            doppler_window (bool): Apply the Doppler window, False to leave it to the caller
+
+        Returns:
+            ndarray: Processed frames
+
+        """
+        coefficients = self.coefficients(*np.shape(frame)[-3:], doppler_window=doppler_window)
+        if self.remove_dc:
+            mean = np.mean(frame, axis=-1, keepdims=True)
+            out = np.subtract(frame, mean, out=out, casting='same_kind')
+            frame = out
+        return np.multiply(frame, coefficients, out=out, casting='same_kind')
+
+    def near_field_bins(self):
+        """Number of range bins zeroed by mask_near_field with the current configuration"""
+        return near_field_bins(self.near_field)
+
+    def mask_near_field(self, spectrum, axis=-1):
+        """Zeroes the near-field bins of range spectra in place
+
+        Args:
+            spectrum (ndarray): Range FFT
+            axis (int): Range axis
+
+        Returns:
+            ndarray: spectrum
+
+        """
+        index = [slice(None)] * spectrum.ndim
+        index[axis] = slice(0, self.near_field_bins())
+        spectrum[tuple(index)] = 0
+        return spectrum
+
+
+def estimate_calibration(frame, range_bin=None, device=None, azimuth=0., elevation=0., tx=None):
+    """Estimates the calibration of each virtual antenna from a frame of a single reflector
+
+    The reflector, e.g. a corner reflector a few meters away, should be the strongest
+    target. Each virtual antenna is corrected to the gain and phase of the first one
+    times the phase expected at the reflector direction. The virtual antennas of
+    silent chirps, known when device is given, get 0.
+
+    Args:
+        frame (ndarray): Frame of shape (loops, num_vx, samples), e.g. RadarData.separated_vx_data
+        range_bin (int): Range bin of the reflector, the strongest one by default
+        device (str): Device identifier, needed when the reflector is not at boresight
+        azimuth (float): Azimuth of the reflector in radians
+        elevation (float): Elevation of the reflector in radians
+        tx (tuple): Enabled TX antennas in chirp order, from PARAMS.CONFIG by default
+
+    Returns:
+        ndarray: Complex coefficient of each virtual antenna, to pass as Preprocessor calibration
+
+    """
+    spectrum = fft_backend.fft(np.asarray(frame, dtype=complex), axis=-1).mean(axis=0)
+    if range_bin is None:
+        range_bin = int(np.argmax(np.sum(np.abs(spectrum), axis=0)))
+    response = spectrum[:, range_bin]
+
+    expected = np.ones(len(response), dtype=complex)
+    if device is not None:
+        tx = enabled_tx(PARAMS.CONFIG) if tx is None else tx
+        expected = get_device(device).steering_vectors(azimuth, elevation, tx)
+
+    # Silent chirps, with a null steering vector, get 0 and the first active antenna is the reference
+    active = np.flatnonzero(expected != 0)
+    calibration = np.zeros(len(response), dtype=complex)
+    calibration[active] = response[active[0]] * expected[active] / (expected[active[0]] * response[active])
+    return calibration
@@ -0,0 +1,245 @@
+"""
+
+RADAR CUBE ENGINE
+=================
+
+Full-frame range-Doppler-angle processing with preallocated buffers.
+
+RadarCubeEngine takes a whole frame of shape (loops, num_vx, samples), e.g.
+RadarData.separated_vx_data, and computes in one pass:
+
+    - the range FFT of every chirp and virtual antenna, keeping only the
+      selected range bins
+    - the Doppler FFT of every range bin and virtual antenna
+    - the angle spectrum over the virtual array of the device (see devices.py),
+      in azimuth only or in azimuth and elevation
+
+Every intermediate result is written into buffers allocated once, in
+complex64 by default. The fftshift of the Doppler spectrum is folded into a
+precomputed phase ramp applied before the FFT instead of moving data
+afterwards, and the FFTs are computed in place by the backend selected in
+fft_backend.py. The virtual array is only a few antennas wide, so the zero
+padded angle FFT is computed as a product with a precomputed DFT matrix,
+already shifted, which is several times faster than padding and transforming.
+
+Included classes:
+    - RadarCubeEngine
+
+"""
+
+import numpy as np
+
+import fft_backend
+from devices import enabled_tx, get_device
+from instrumentation import timed
+from params import PARAMS
+from preprocessing import get_window
+
+def _shifted_dft(n, length):
+    """Helper function returning the matrix of the fftshifted FFT of size n of a length signal
+
+    Multiplying a signal of shape (..., length) by the (length, n) matrix gives the
+    same result as np.fft.fftshift(np.fft.fft(signal, n), axes=-1).
+    """
+    return np.exp(-2j * np.pi * np.outer(np.arange(length), np.arange(n) - n // 2) / n)
+
+
+def _shift_ramp(n, length):
+    """Helper function returning the phase ramp that fftshifts the FFT of a length n signal
+
+    Multiplying sample k by exp(2j*pi*(n//2)*k/n) rotates the spectrum by n//2 bins,
+    which is what np.fft.fftshift does after the FFT.
+    """
+    return np.exp(2j * np.pi * (n // 2) * np.arange(length) / n)
+
+
+class RadarCubeEngine:
+    """Computes range-Doppler-angle cubes of whole frames with reused buffers.
+
+    The cube has shape (range, doppler, azimuth) by default, i.e. the array seen
+    at 0 degrees of elevation, or (range, doppler, elevation, azimuth) if
+    elevation_bins is given. Doppler and angle axes are centred on zero as after
+    np.fft.fftshift. The returned cube is a view on a buffer that is overwritten
+    by the next call, copy it to keep it.
+
+    Memory grows with the product of every dimension: a 4D cube of 256 range,
+    128 Doppler, 32 elevation and 64 azimuth bins takes 512 MB in complex64, so
+    select range bins or keep 3D cubes for real time processing.
+
+    Attributes:
+        device (str): Device identifier, registered in devices.py
+        loops (int): Chirp loops per frame, PARAMS.CHIRP_LOOPS by default
+        samples (int): ADC samples per chirp, PARAMS.ADC_SAMPLES by default
+        tx (tuple): Enabled TX antennas in chirp order, from PARAMS.CONFIG by default
+        azimuth_bins (int): Azimuth FFT size, PARAMS.NUM_AZIM_BINS by default
+        elevation_bins (int): Elevation FFT size, None for 3D cubes without elevation
+        range_bins (slice or ndarray): Range bins to keep, all by default. E.g. slice(8, None)
+            drops the near field
+        magnitude (bool): Return the magnitude of the cube (float) instead of the complex cube
+        dtype (np.dtype): Complex precision of the processing, complex64 by default
+        preprocessor (Preprocessor): Windows, calibration and near-field mask applied before
+            the FFTs, see preprocessing.py. The Doppler window is applied after clutter removal
+        clutter (ClutterFilter): Static clutter removal applied to the range profiles before the
+            Doppler and angle FFTs, see clutter.py
+        shape (tuple): Shape of the returned cubes
+        range_axis (ndarray): Range of each kept range bin in m
+        doppler_axis (ndarray): Velocity of each Doppler bin in m/s
+        azimuth_axis (ndarray): Angle of each azimuth bin in degrees
+        elevation_axis (ndarray): Angle of each elevation bin in degrees, None for 3D cubes
+
+    Examples:
+        >>> engine = RadarCubeEngine('IWR6843ISK-ODS', range_bins=slice(8, 64), magnitude=True)
+        >>> for adc_data in rec:
+        ...     rdata.raw_data = adc_data
+        ...     cube = engine.process(rdata.separated_vx_data)
+
+    """
+
+    def __init__(self, device, loops=None, samples=None, tx=None, azimuth_bins=None,
+                 elevation_bins=None, range_bins=None, magnitude=False, dtype=np.complex64,
+                 preprocessor=None, clutter=None):
+        self.device = device
+        self.loops = PARAMS.CHIRP_LOOPS if loops is None else loops
+        self.samples = PARAMS.ADC_SAMPLES if samples is None else samples
+        self.tx = enabled_tx(PARAMS.CONFIG) if tx is None else tuple(tx)
+        self.azimuth_bins = PARAMS.NUM_AZIM_BINS if azimuth_bins is None else azimuth_bins
+        self.elevation_bins = elevation_bins
+        self.range_bins = slice(None) if range_bins is None else range_bins
+        self.magnitude = magnitude
+        self.dtype = np.dtype(dtype)
+        self.preprocessor = preprocessor
+        self.clutter = clutter
+
+        geometry = get_device(device)
+        self.num_vx = geometry.num_virtual(self.tx)
+        index, empty = geometry.gather(self.tx)
+        rows, cols = index.shape
+        if cols > self.azimuth_bins or (elevation_bins is not None and rows > elevation_bins):
+            raise ValueError('The virtual array of {} is larger than the angle FFT'.format(device))
+
+        range_index = np.arange(self.samples)[self.range_bins]
+        self._range_index = range_index
+        near_field = 0 if preprocessor is None else preprocessor.near_field_bins()
+        self._near_field = np.flatnonzero(range_index < near_field)
+        self._flat_index = index.reshape(-1)
+        self._rows, self._cols = rows, cols
+        num_range = len(range_index)
+        num_ant = rows * cols
+
+        # Phase ramp performing the Doppler fftshift, times the Doppler window which must
+        # follow clutter removal, shifted DFT matrices of the angle spectra and mask
+        # zeroing empty array positions
+        ramp = _shift_ramp(self.loops, self.loops)
+        if preprocessor is not None:
+            ramp = ramp * get_window(preprocessor.doppler_window, self.loops)
+        self._doppler_ramp = ramp.astype(self.dtype)[:, None, None]
+        self._azimuth_dft = _shifted_dft(self.azimuth_bins, cols).astype(self.dtype)
+        if elevation_bins is not None:
+            self._elevation_dft = _shifted_dft(elevation_bins, rows).T.astype(self.dtype)
+        self._mask = (~empty).reshape(-1).astype(self.dtype)[None, :, None] if empty.any() else None
+
+        # Buffers, reused by every call
+        self._frame = np.empty((self.loops, self.num_vx, self.samples), dtype=self.dtype)
+        self._range = np.empty_like(self._frame)
+        self._doppler = np.empty((self.loops, self.num_vx, num_range), dtype=self.dtype)
+        self._antennas = np.empty((self.loops, num_ant, num_range), dtype=self.dtype)
+        if elevation_bins is None:
+            self.shape = (num_range, self.loops, self.azimuth_bins)
+            self._rows_sum = np.empty((self.loops, cols, num_range), dtype=self.dtype)
+            self._array = np.empty((num_range, self.loops, cols), dtype=self.dtype)
+            self._azimuth = None
+        else:
+            self.shape = (num_range, self.loops, elevation_bins, self.azimuth_bins)
+            self._rows_sum = None
+            self._array = np.empty((num_range, self.loops, rows, cols), dtype=self.dtype)
+            self._azimuth = np.empty((num_range, self.loops, rows, self.azimuth_bins), dtype=self.dtype)
+        self._cube = np.empty(self.shape, dtype=self.dtype)
+        self._magnitude = np.empty(self.shape, dtype=self._cube.real.dtype) if magnitude else None
+
+        # Axes, as in fourier.py
+        self.range_axis = np.linspace(0, PARAMS.R_MAX, self.samples)[range_index]
+        self.doppler_axis = np.linspace(-PARAMS.DOPPLER_MAX, PARAMS.DOPPLER_MAX, self.loops)
+        self.azimuth_axis = self._angle_axis(self.azimuth_bins)
+        self.elevation_axis = None if elevation_bins is None else self._angle_axis(elevation_bins)
+
+    @staticmethod
+    def _angle_axis(bins):
+        """Helper function returning the angle of each bin of an fftshifted angle FFT in degrees"""
+        sines = np.linspace(-bins / 2, bins / 2 - 1, bins) * 2 / bins
+        return np.arcsin(sines) * 180 / np.pi
+
+    @property
+    def nbytes(self):
+        """Memory used by the buffers of the engine in bytes"""
+        buffers = [self._frame, self._range, self._doppler, self._antennas, self._rows_sum,
+                   self._array, self._azimuth, self._cube, self._magnitude]
+        return sum(b.nbytes for b in buffers if b is not None)
+
+    @property
+    def doppler_cube(self):
+        """Range-Doppler spectra of every virtual antenna of the last frame, of shape
+        (loops, num_vx, range), Doppler fftshifted. Overwritten by the next call"""
+        return self._doppler
+
+    def range_doppler_map(self, out=None):
+        """Returns the range-Doppler power of the last frame summed over the virtual antennas
+
+        Args:
+            out (ndarray): Array of shape (loops, range) to write the result into
+
+        Returns:
+            ndarray: Power of shape (loops, range), e.g. for cfar.CFAR
+
+        """
+        power = self._doppler.real ** 2
+        power += self._doppler.imag ** 2
+        return np.sum(power, axis=1, out=out)
+
+    @timed('radar_cube.process')
+    def process(self, frame, out=None):
+        """Computes the cube of a frame
+
+        Args:
+            frame (ndarray): Frame of shape (loops, num_vx, samples), e.g. RadarData.separated_vx_data
+            out (ndarray): Array of the cube shape to write the result into, instead of the
+                internal buffer
+
+        Returns:
+            ndarray: Cube of shape self.shape, complex or magnitude
+
+        """
+        np.copyto(self._frame, frame, casting='same_kind')
+        if self.preprocessor is not None:
+            self.preprocessor.apply(self._frame, out=self._frame, doppler_window=False)
+
+        # Range FFT over the samples of every chirp, keeping the selected bins
+        fft_backend.fft(self._frame, axis=-1, out=self._range)
+        np.take(self._range, self._range_index, axis=2, out=self._doppler)
+        if len(self._near_field):
+            self._doppler[:, :, self._near_field] = 0
+        if self.clutter is not None:
+            self.clutter.apply(self._doppler, out=self._doppler)
+
+        # Doppler FFT over the chirps of every range bin
+        self._doppler *= self._doppler_ramp
+        fft_backend.fft(self._doppler, axis=0, out=self._doppler)
+
+        # Place the virtual antennas on the array, then angle spectra as DFT products
+        np.take(self._doppler, self._flat_index, axis=1, out=self._antennas)
+        if self._mask is not None:
+            self._antennas *= self._mask
+        antennas = self._antennas.reshape(self.loops, self._rows, self._cols, -1)
+
+        cube = self._cube if self.magnitude or out is None else out
+        if self.elevation_bins is None:
+            np.sum(antennas, axis=1, out=self._rows_sum)
+            np.copyto(self._array, self._rows_sum.transpose(2, 0, 1))
+            np.matmul(self._array, self._azimuth_dft, out=cube)
+        else:
+            np.copyto(self._array, antennas.transpose(3, 0, 1, 2))
+            np.matmul(self._array, self._azimuth_dft, out=self._azimuth)
+            np.matmul(self._elevation_dft, self._azimuth, out=cube)
+
+        if self.magnitude:
+            return np.abs(cube, out=self._magnitude if out is None else out)
+        return cube
@@ -3,6 +3,10 @@
 RAW SIGNAL UTILITIES
 ====================
 
+Included classes:
+    - RadarData: single frame
+    - RadarRecording: whole recordings at once
+
 Included functions:
     - Plot raw signal
 
@@ -12,14 +16,17 @@ import matplotlib.pyplot as plt
 import numpy as np
 
 from dca1000 import DCA1000
+from devices import DEVICES
+from instrumentation import timed
 
 
 class RadarData:
     """Class that holds radar data for a device and performs the necessary transformations
         such as TX-RX antenna separation or phase inversion.
-        Currently, supported devices are:
-            - IWR1843 (no phase inversion)
+        Phase corrections come from the device geometry registered in devices.py:
+            - IWR1843ISK (no phase inversion)
             - IWR6843ISK-ODS (phase inversion on RX2 and RX3)
+        Data of unregistered devices is left uncorrected.
 
         Attributes
         ----------
@@ -49,18 +56,28 @@ class RadarData:
         access vx_data and radar_data calculated properties, and methods and proceed with
         calculations.
 
+        The organized data is computed once per raw_data assignment and both separated
+        properties are views on it, so copy them before modifying them in place.
+
         Methods
         -------
         printDataConfig():
             Prints data parameters.
         """
 
-    def __init__(self, device, tx, rx, loops, samples):
+    __slots__ = ('device', 'tx', 'rx', 'loops', 'samples', 'dtype',
+                 '_raw_data', '_organized')
+
+    def __init__(self, device, tx, rx, loops, samples, dtype=complex):
         self.device = device
         self.tx = tx
         self.rx = rx
         self.loops = loops
         self.samples = samples
+        self.dtype = dtype
+
+        self._raw_data = None
+        self._organized = None
 
         self.printDataConfig()
 
@@ -72,40 +89,42 @@ class RadarData:
     @raw_data.setter
     def raw_data(self, value):
         self._raw_data = value
+        self._organized = None
 
     @property
     def _organized_data(self):
         """INTERNAL USE ONLY.
         Radar data separated by RX antennas of shape (tx*loops, rx, samples) and phase
-        inverted if needed"""
+        inverted if needed. Computed on first access after raw_data is set"""
+        if self._organized is None:
+            self._organized = self._organize()
+        return self._organized
+
+    @timed('raw_signal.RadarData.organize')
+    def _organize(self):
+        """INTERNAL USE ONLY.
+        Organizes raw_data and applies phase inversion"""
         data = DCA1000.organize(
-            self.raw_data, num_chirps=self.loops*self.tx, num_rx=self.rx, num_samples=self.samples)
+            self.raw_data, num_chirps=self.loops*self.tx, num_rx=self.rx, num_samples=self.samples,
+            dtype=self.dtype)
 
-        if (self.device == 'IWR6843ISK-ODS'):
-            data[:, 1, :] *= -1
-            data[:, 2, :] *= -1
+        if self.device in DEVICES:
+            DEVICES[self.device].correct_phase(data, rx_axis=1)
 
         return data
 
     @property
     def separated_vx_data(self):
         """Radar data separated by VX antennas of shape (loops, num_vx, samples)"""
-        return DCA1000.separate_tx(self._organized_data, num_tx=self.tx)
+        # Chirps are ordered loop by loop and TX by TX inside each loop, so
+        # VX antenna tx*rx_count + rx is a plain reshape
+        return self._organized_data.reshape(self.loops, self.tx*self.rx, self.samples)
 
     @property
     def separated_data(self):
         """Radar data separated by RX and TX antenna pairs of shape (tx, rx, loops, samples)"""
-        data = np.zeros(shape=(self.tx, self.rx, self.loops,
-                        self.samples), dtype=complex)
-
-        tx_list = [self._organized_data[i::self.tx, ...]
-                   for i in range(self.tx)]
-
-        for antx in range(self.tx):
-            for anrx in range(self.rx):
-                data[antx, anrx, :, :] = tx_list[antx][:, anrx, :]
-
-        return data
+        return self._organized_data.reshape(
+            self.loops, self.tx, self.rx, self.samples).transpose(1, 2, 0, 3)
 
     def printDataConfig(self):
         print("Device", self.device)
@@ -115,6 +134,129 @@ class RadarData:
         print("ADC Samples", self.samples)
 
 
+class RadarRecording:
+    """Class that holds a whole recording of radar data for a device and performs the same
+        transformations as RadarData on every frame at once.
+
+        Attributes
+        ----------
+        device : str
+            radar model identifier
+        tx : int
+            number of TX antennas used in the data emission process
+        rx : int
+            number of RX antennas used in the data capturing process
+        loops : int
+            number of chirp loops per frame
+        samples : int
+            number of ADC samples
+        dtype : Numpy dtype
+            complex type of the organized data, complex64 by default
+
+        Properties
+        ----------
+        raw_data : Numpy Array
+            Byte I-Q data of shape (frames, tx*rx*loops*samples*2), a list of frames is stacked
+        separated_vx_data : Numpy array
+            Radar data separated by VX antennas of shape (frames, loops, num_vx, samples)
+        separated_data : Numpy array
+            Radar data separated by RX and TX antenna pairs of shape (frames, tx, rx, loops, samples)
+
+        Usage
+        ------
+        Set raw_data with the frames of a recording, optionally call organize() with a
+        memory-mapped output for recordings that do not fit in memory, then run FFTs across
+        the whole capture on the separated properties, which are views on the organized data.
+
+        Methods
+        -------
+        organize(out=None, path=None):
+            Organizes every frame at once into out, a new .npy memory map at path or memory.
+        """
+
+    __slots__ = ('device', 'tx', 'rx', 'loops', 'samples', 'dtype',
+                 '_raw_data', '_organized')
+
+    def __init__(self, device, tx, rx, loops, samples, dtype=np.complex64):
+        self.device = device
+        self.tx = tx
+        self.rx = rx
+        self.loops = loops
+        self.samples = samples
+        self.dtype = dtype
+
+        self._raw_data = None
+        self._organized = None
+
+    def __len__(self):
+        return 0 if self._raw_data is None else len(self._raw_data)
+
+    @property
+    def raw_data(self):
+        """Byte I-Q data of shape (frames, tx*rx*loops*samples*2)"""
+        return self._raw_data
+
+    @raw_data.setter
+    def raw_data(self, value):
+        value = np.asarray(value)
+        if value.ndim == 1:
+            value = value.reshape(1, -1)
+        self._raw_data = value
+        self._organized = None
+
+    @timed('raw_signal.RadarRecording.organize')
+    def organize(self, out=None, path=None):
+        """Organizes every frame into a (frames, tx*loops, rx, samples) cube and applies phase inversion
+
+        Parameters
+        ----------
+        out : Numpy array, optional
+            C-contiguous buffer of self.dtype to write into, e.g. a np.memmap
+        path : str, optional
+            create out as a .npy memory map at this path, reloadable with np.load(mmap_mode='r')
+
+        Returns
+        -------
+        Numpy array
+            The organized data, also kept for the separated properties
+        """
+        shape = (len(self), self.loops*self.tx, self.rx, self.samples)
+        if out is None:
+            if path is None:
+                out = np.empty(shape, dtype=self.dtype)
+            else:
+                out = np.lib.format.open_memmap(path, mode='w+', dtype=self.dtype, shape=shape)
+
+        data = DCA1000.organize_into(self.raw_data, out, num_chirps=shape[1], num_rx=self.rx,
+                                     num_samples=self.samples)
+
+        if self.device in DEVICES:
+            DEVICES[self.device].correct_phase(data, rx_axis=2)
+
+        self._organized = data
+        return data
+
+    @property
+    def _organized_data(self):
+        """INTERNAL USE ONLY.
+        Radar data of shape (frames, tx*loops, rx, samples), organized in memory on first access
+        if organize() was not called"""
+        if self._organized is None:
+            self.organize()
+        return self._organized
+
+    @property
+    def separated_vx_data(self):
+        """Radar data separated by VX antennas of shape (frames, loops, num_vx, samples)"""
+        return self._organized_data.reshape(len(self), self.loops, self.tx*self.rx, self.samples)
+
+    @property
+    def separated_data(self):
+        """Radar data separated by RX and TX antenna pairs of shape (frames, tx, rx, loops, samples)"""
+        return self._organized_data.reshape(
+            len(self), self.loops, self.tx, self.rx, self.samples).transpose(0, 2, 3, 1, 4)
+
+
 def plot_signal(signal):
     fig, axv = plt.subplots()
 
@@ -0,0 +1,435 @@
+"""
+
+STREAMING RECORDER
+==================
+
+Record DCA1000 frames to .rec files (see recording.py) for hours without
+keeping them in memory.
+
+A capture thread copies every streamed frame into a free record of a
+preallocated, page-aligned pool and hands it to a writer thread, which
+writes as many queued records as possible per system call. If the writer
+falls behind and the pool runs out, frames are dropped and counted rather
+than blocking the capture. Files can be written with O_DIRECT, preallocated,
+fsync-ed periodically and rotated by size or duration. With a codec, frames are
+compressed by a thread pool and written as compressed recordings instead (see
+compressed_recording.py).
+
+Included classes:
+    - StreamRecorder
+
+"""
+
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from dca1000 import UINT16_IN_FRAME
+from compressed_recording import BLOCK_HEADER_DTYPE, CompressedWriter
+from recording import ALIGNMENT, make_header, record_dtype
+
+
+def _aligned_zeros(shape, dtype, alignment=ALIGNMENT):
+    """Returns a zeroed array whose data starts at a multiple of alignment"""
+    dtype = np.dtype(dtype)
+    nbytes = int(np.prod(shape)) * dtype.itemsize
+    raw = np.zeros(nbytes + alignment, dtype=np.uint8)
+    offset = -raw.ctypes.data % alignment
+    return raw[offset:offset + nbytes].view(dtype).reshape(shape)
+
+
+class StreamRecorder:
+    """Records frames streamed by a DCA1000 from a separate writer thread.
+
+    Attributes:
+        dca (DCA1000): Board interface, streaming is started and stopped by the recorder
+        path (str): Recording file. With rotation, files are named <name>_0000.rec, <name>_0001.rec...
+        config (dict): PARAMS.CONFIG dictionary stored in every file header
+        frame_size (int): Number of int16 values in a frame
+        device (str): Radar model identifier
+        description (str): Description of the acquired data
+        pool_size (int): Number of preallocated frame records, i.e. frames the writer may lag behind
+        direct (bool): Open files with O_DIRECT to bypass the page cache (Linux only)
+        preallocate (int): Bytes reserved on disk for each new file, None to grow files as needed.
+            Readers see the reserved space as empty frames until the file is closed
+        fsync_interval (float): Seconds between fsync calls, 0 after every write, None to never fsync
+        max_bytes (int): Start a new file before exceeding this size, None for no limit
+        max_seconds (float): Start a new file after this duration, None for no limit
+        codec (str): Write compressed recordings with 'zlib', 'lz4' or 'zstd', None for raw recordings
+        level (int): Compression level, a fast level of the codec by default
+        workers (int): Number of compression threads, one per core by default
+        files (list): Paths of the files written so far
+        frames_written (int): Frames written to disk
+        bytes_written (int): Bytes written to disk, headers included
+        dropped_frames (int): Frames dropped because every record of the pool was queued
+        max_queue_depth (int): Largest number of records waiting for the writer
+        error (Exception): Why the recording ended early, e.g. DCA1000 streaming stopped or a write
+            failed, else None
+
+    Examples:
+        >>> recorder = StreamRecorder(DCA1000(), 'capture.rec', PARAMS.CONFIG, max_seconds=600)
+        >>> recorder.record(seconds=3600)
+        >>> print(recorder.stats())
+
+    """
+
+    def __init__(self, dca, path, config, frame_size=UINT16_IN_FRAME, device=None, description='',
+                 pool_size=64, direct=False, preallocate=None, fsync_interval=1.0,
+                 max_bytes=None, max_seconds=None, codec=None, level=None, workers=None):
+        if direct and not hasattr(os, 'O_DIRECT'):
+            raise ValueError('O_DIRECT is not available on this platform')
+        if codec is not None and (direct or preallocate):
+            raise ValueError('direct and preallocate only apply to raw recordings')
+
+        self.dca = dca
+        self.path = path
+        self.config = config
+        self.frame_size = frame_size
+        self.device = device
+        self.description = description
+        self.pool_size = pool_size
+        self.direct = direct
+        self.preallocate = preallocate
+        self.fsync_interval = fsync_interval
+        self.max_bytes = max_bytes
+        self.max_seconds = max_seconds
+        self.codec = codec
+        self.level = level
+        self.workers = workers
+
+        self.files = []
+        self.frames_written = 0
+        self.bytes_written = 0
+        self.dropped_frames = 0
+        self.max_queue_depth = 0
+        self.error = None
+        self._write_time = 0.
+
+        # Frame records are written straight from the pool, which is
+        # page-aligned as required by O_DIRECT
+        self._dtype = record_dtype(frame_size)
+        self._pool = _aligned_zeros(pool_size, self._dtype)
+        self._pool_bytes = memoryview(self._pool.view(np.uint8).reshape(-1))
+        self._free = queue.Queue()
+        self._filled = queue.Queue()
+        for i in range(pool_size):
+            self._free.put(i)
+
+        self._fd = None
+        self._writer = None
+        self._pool_executor = None
+        self._header_size = 0
+        self._file_bytes = 0
+        self._file_start = 0.
+        self._last_fsync = 0.
+
+        self._running = False
+        self._capture_thread = None
+        self._writer_thread = None
+
+    def start(self):
+        """Starts DCA1000 streaming and the capture and writer threads
+
+        Returns:
+            None
+
+        Raises:
+            RuntimeError: If the recorder already recorded, its files would be overwritten
+
+        """
+        if self._running:
+            return
+        if self.files:
+            raise RuntimeError('StreamRecorder already recorded to {}, create a new one'.format(self.files[0]))
+
+        if self.codec is not None:
+            self._pool_executor = ThreadPoolExecutor(self.workers)
+        self._open_file()
+
+        self._running = True
+        self.dca.start_streaming()
+        self._writer_thread = threading.Thread(target=self._write_loop, daemon=True)
+        self._capture_thread = threading.Thread(target=self._capture_loop, daemon=True)
+        self._writer_thread.start()
+        self._capture_thread.start()
+
+    def stop(self):
+        """Stops streaming, writes the frames still queued and closes the current file
+
+        Returns:
+            None
+
+        """
+        if not self._running:
+            return
+
+        self._running = False
+        self._capture_thread.join()
+        self.dca.stop_streaming()
+
+        self._filled.put(None)
+        self._writer_thread.join()
+        try:
+            self._close_file()
+        except OSError:
+            # The write error that ended the recording is the one to report
+            if self.error is None:
+                raise
+        finally:
+            if self._pool_executor is not None:
+                self._pool_executor.shutdown()
+                self._pool_executor = None
+
+    def record(self, frames=None, seconds=None):
+        """Records until a number of frames or a duration is reached, blocking the caller
+
+        Args:
+            frames (int): Frames to write, None for no limit
+            seconds (float): Recording duration, None for no limit
+
+        Returns:
+            dict: Recorder statistics, see stats()
+
+        Raises:
+            RuntimeError: If DCA1000 streaming stopped before the end, once the frames received
+                are written, or if the recorder already recorded
+            OSError: If writing failed, e.g. on a full disk
+
+        """
+        self.start()
+        start = time.monotonic()
+        try:
+            while self._running and self.error is None:
+                if frames is not None and self.frames_written + self.dropped_frames >= frames:
+                    break
+                if seconds is not None and time.monotonic() - start >= seconds:
+                    break
+                time.sleep(0.05)
+        finally:
+            self.stop()
+        if self.error is not None:
+            raise self.error
+        return self.stats()
+
+    def stats(self):
+        """Returns a snapshot of the back-pressure and throughput metrics
+
+        Returns:
+            dict: Frames and bytes written, frames dropped by the recorder and by the
+            DCA1000 consumer, current and maximum writer queue depth, write throughput
+            and the error that ended the recording, if any
+
+        """
+        return {'frames_written': self.frames_written,
+                'bytes_written': self.bytes_written,
+                'dropped_frames': self.dropped_frames,
+                'stream_dropped_frames': self.dca.dropped_frames,
+                'queue_depth': self._filled.qsize(),
+                'max_queue_depth': self.max_queue_depth,
+                'write_mb_per_s': self.bytes_written / self._write_time / 1e6 if self._write_time else 0.,
+                'files': list(self.files),
+                'error': None if self.error is None else str(self.error)}
+
+    def _capture_loop(self):
+        """Helper function run by the capture thread, copies frames into free records"""
+        while self._running:
+            for frame, lost_packets, timestamp in self.dca.iter_frames(timeout=0.5, with_info=True):
+                try:
+                    i = self._free.get_nowait()
+                except queue.Empty:
+                    self.dropped_frames += 1
+                else:
+                    record = self._pool[i]
+                    record['timestamp'] = timestamp
+                    record['lost_packets'] = lost_packets
+                    record['data'] = frame
+                    self._filled.put(i)
+                    self.max_queue_depth = max(self.max_queue_depth, self._filled.qsize())
+
+                if not self._running:
+                    break
+
+            # iter_frames only returns without streaming when the receiver thread ended,
+            # e.g. on a socket error, after which no frame will come
+            if self._running and not self.dca.streaming:
+                self.error = self.error or RuntimeError('DCA1000 streaming stopped while recording')
+                break
+
+    def _write_loop(self):
+        """Helper function run by the writer thread, stores the write error that ends the recording"""
+        try:
+            self._write_batches()
+        except Exception as error:
+            self.error = error
+
+    def _write_batches(self):
+        """Helper function writing queued records in batches until stop() queues None"""
+        stride = self._dtype.itemsize
+        done = False
+        while not done:
+            batch = [self._filled.get()]
+            while True:
+                try:
+                    batch.append(self._filled.get_nowait())
+                except queue.Empty:
+                    break
+            if batch[-1] is None:
+                batch.pop()
+                done = True
+
+            if self.codec is not None:
+                self._write_compressed(batch)
+                continue
+
+            # Split the batch where the current file must be rotated
+            while batch:
+                n = self._records_before_rotation(len(batch))
+                if n == 0:
+                    self._close_file()
+                    self._open_file()
+                    continue
+
+                start = time.monotonic()
+                self._write_all([self._pool_bytes[i * stride:(i + 1) * stride] for i in batch[:n]])
+                self._maybe_fsync()
+                self._write_time += time.monotonic() - start
+
+                self.frames_written += n
+                for i in batch[:n]:
+                    self._free.put(i)
+                batch = batch[n:]
+
+    def _write_compressed(self, batch):
+        """Helper function to compress queued records in parallel and append them to the current file"""
+        start = time.monotonic()
+        frames = (self._pool[i]['data'] for i in batch)
+        blocks = list(self._pool_executor.map(self._writer.compress, frames))
+        info = [(int(self._pool[i]['lost_packets']), float(self._pool[i]['timestamp'])) for i in batch]
+        for i in batch:
+            self._free.put(i)
+        self._write_time += time.monotonic() - start
+
+        for block, (lost_packets, timestamp) in zip(blocks, info):
+            if self._records_before_rotation(1, BLOCK_HEADER_DTYPE.itemsize + len(block)) == 0:
+                self._close_file()
+                self._open_file()
+
+            start = time.monotonic()
+            size = self._writer.bytes_written
+            self._writer.write_block(block, lost_packets, timestamp)
+            self._file_bytes = self._writer.bytes_written
+            self.bytes_written += self._file_bytes - size
+            self._maybe_fsync()
+            self._write_time += time.monotonic() - start
+            self.frames_written += 1
+
+    def _records_before_rotation(self, count, record_size=None):
+        """Helper function returning how many of count records fit in the current file"""
+        record_size = record_size or self._dtype.itemsize
+        if self.max_seconds is not None and self._file_bytes > self._header_size \
+                and time.monotonic() - self._file_start >= self.max_seconds:
+            return 0
+        if self.max_bytes is not None:
+            fit = (self.max_bytes - self._file_bytes) // record_size
+            # A new file takes at least one record, however large
+            count = min(count, fit if self._file_bytes > self._header_size else max(fit, 1))
+        return max(count, 0)
+
+    def _write_all(self, buffers):
+        """Helper function to write a list of buffers to the current file with as few calls as possible"""
+        size = sum(len(b) for b in buffers)
+        if hasattr(os, 'writev'):
+            while buffers:
+                written = os.writev(self._fd, buffers)
+                # Drop what was written, partial writes are rare but allowed
+                while buffers and written >= len(buffers[0]):
+                    written -= len(buffers[0])
+                    buffers = buffers[1:]
+                if buffers and written:
+                    buffers[0] = buffers[0][written:]
+        else:
+            for b in buffers:
+                while len(b):
+                    b = b[os.write(self._fd, b):]
+
+        self._file_bytes += size
+        self.bytes_written += size
+
+    def _maybe_fsync(self):
+        """Helper function to apply the fsync policy"""
+        if self.fsync_interval is None:
+            return
+        now = time.monotonic()
+        if now - self._last_fsync >= self.fsync_interval:
+            if self._writer is not None:
+                self._writer.flush()
+            os.fsync(self._fd)
+            self._last_fsync = now
+
+    def _file_path(self, index):
+        """Helper function returning the path of the file with the given rotation index"""
+        if self.max_bytes is None and self.max_seconds is None:
+            return self.path
+        name, ext = os.path.splitext(self.path)
+        return '{}_{:04d}{}'.format(name, index, ext)
+
+    def _open_file(self):
+        """Helper function to create the next file and write its header"""
+        path = self._file_path(len(self.files))
+        if self.codec is not None:
+            self._writer = CompressedWriter(path, self.config, self.frame_size, self.device,
+                                            self.description, self.codec, self.level,
+                                            part=len(self.files))
+            self.files.append(path)
+            self._fd = self._writer.fileno()
+            self._header_size = self._file_bytes = self._writer.bytes_written
+            self.bytes_written += self._file_bytes
+            self._file_start = self._last_fsync = time.monotonic()
+            return
+
+        flags = os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, 'O_BINARY', 0)
+        if self.direct:
+            flags |= os.O_DIRECT
+        self._fd = os.open(path, flags, 0o644)
+        self.files.append(path)
+
+        if self.preallocate and hasattr(os, 'posix_fallocate'):
+            os.posix_fallocate(self._fd, 0, self.preallocate)
+
+        header = make_header(self.config, self.frame_size, self.device, self.description,
+                             part=len(self.files) - 1)
+        self._header_size = len(header)
+        buffer = _aligned_zeros(len(header), np.uint8)
+        buffer[:] = np.frombuffer(header, dtype=np.uint8)
+
+        self._file_bytes = 0
+        self._file_start = time.monotonic()
+        self._last_fsync = self._file_start
+        self._write_all([memoryview(buffer)])
+
+    def _close_file(self):
+        """Helper function to sync, trim preallocated space and close the current file"""
+        if self._fd is None:
+            return
+        if self._writer is not None:
+            try:
+                self._writer.flush()
+                if self.fsync_interval is not None:
+                    os.fsync(self._fd)
+            finally:
+                writer, self._writer, self._fd = self._writer, None, None
+                writer.close()
+                self.bytes_written += writer.bytes_written - self._file_bytes
+            return
+        try:
+            if self.preallocate:
+                os.ftruncate(self._fd, self._file_bytes)
+            if self.fsync_interval is not None:
+                os.fsync(self._fd)
+        finally:
+            os.close(self._fd)
+            self._fd = None
@@ -0,0 +1,303 @@
+"""
+
+RADAR RECORDINGS
+================
+
+Binary, memory-mappable storage for DCA1000 frames.
+
+A recording file holds:
+    - MAGIC and the size of the header as a little-endian uint32
+    - a JSON header with the PARAMS configuration, the device, a description,
+      the creation time and the layout of the frame records
+    - padding up to the first multiple of ALIGNMENT
+    - one fixed-size record per frame: receive timestamp (float64), lost
+      packets (uint32) and the int16 frame, padded to a multiple of ALIGNMENT
+
+Frames are appended one by one, so a capture that crashes keeps every frame
+written so far, and the record array is memory-mapped for O(1) random access
+by frame index.
+
+Captures saved by earlier versions as pickled .dat dictionaries are converted
+once with convert_legacy:
+
+    >>> convert_legacy('data/openradar_25-01-23_QMUL-MCR.dat', device='IWR6843ISK-ODS')
+
+Included classes/functions:
+    - RecordingWriter
+    - Recording
+    - convert_legacy
+
+"""
+
+import json
+import os
+import pickle
+import time
+from datetime import datetime
+
+import numpy as np
+
+MAGIC = b'MMWREC\x00\x01'
+VERSION = 1
+ALIGNMENT = 4096
+RECORD_HEADER_SIZE = 16
+
+
+def _align(size, alignment=ALIGNMENT):
+    """Rounds size up to a multiple of alignment"""
+    return -(-size // alignment) * alignment
+
+
+def record_dtype(frame_size, alignment=ALIGNMENT):
+    """Returns the structured dtype of a frame record
+
+    Args:
+        frame_size (int): Number of int16 values in a frame
+        alignment (int): Records are padded to a multiple of this size in bytes
+
+    Returns:
+        np.dtype: Record with 'timestamp', 'lost_packets' and 'data' fields
+
+    """
+    return np.dtype({'names': ['timestamp', 'lost_packets', 'data'],
+                     'formats': ['<f8', '<u4', ('<i2', (frame_size,))],
+                     'offsets': [0, 8, RECORD_HEADER_SIZE],
+                     'itemsize': _align(RECORD_HEADER_SIZE + 2 * frame_size, alignment)})
+
+
+def make_header(config, frame_size, device=None, description='', alignment=ALIGNMENT, magic=MAGIC,
+                **extra):
+    """Returns the header of a recording as bytes, padded to a multiple of alignment
+
+    Args:
+        config (dict): PARAMS.CONFIG dictionary used for the capture
+        frame_size (int): Number of int16 values in a frame
+        device (str): Radar model identifier
+        description (str): Description of the acquired data
+        alignment (int): Alignment of the header and of every frame record
+        magic (bytes): File signature, identifies the format of the frame records
+        **extra: Additional JSON serializable header entries
+
+    Returns:
+        bytes: Header, frame records start right after it
+
+    """
+    header = {'version': VERSION,
+              'description': description,
+              'device': device,
+              'created': datetime.now().isoformat(),
+              'config': config,
+              'frame_size': frame_size,
+              'alignment': alignment,
+              'record_size': record_dtype(frame_size, alignment).itemsize}
+    header.update(extra)
+
+    body = json.dumps(header).encode()
+    prefix = magic + len(body).to_bytes(4, 'little')
+    return (prefix + body).ljust(_align(len(prefix) + len(body), alignment), b'\0')
+
+
+def read_header(f, magic=MAGIC):
+    """Reads the header of a recording from an open binary file
+
+    Args:
+        f (file): Recording opened in binary mode, positioned at its start
+        magic (bytes): Expected file signature
+
+    Returns:
+        tuple: Header dictionary and offset of the first frame record
+
+    """
+    prefix = f.read(len(magic) + 4)
+    if prefix[:len(magic)] != magic:
+        raise ValueError('Not a radar recording file')
+    size = int.from_bytes(prefix[len(magic):], 'little')
+    header = json.loads(f.read(size).decode())
+    return header, _align(len(prefix) + size, header['alignment'])
+
+
+class RecordingWriter:
+    """Appends frames to a recording file.
+
+    Attributes:
+        path (str): File to write, an existing file is overwritten
+        config (dict): PARAMS.CONFIG dictionary used for the capture
+        frame_size (int): Number of int16 values in a frame
+        device (str): Radar model identifier
+        description (str): Description of the acquired data
+        frames (int): Number of frames written so far
+
+    Examples:
+        >>> with RecordingWriter('capture.rec', PARAMS.CONFIG, UINT16_IN_FRAME) as writer:
+        ...     for frame, lost, timestamp in dca.iter_frames(with_info=True):
+        ...         writer.write(frame, lost, timestamp)
+
+    """
+
+    def __init__(self, path, config, frame_size, device=None, description='', alignment=ALIGNMENT):
+        self.path = path
+        self.config = config
+        self.frame_size = frame_size
+        self.device = device
+        self.description = description
+        self.frames = 0
+
+        self._dtype = record_dtype(frame_size, alignment)
+        self._record_header = np.zeros(1, dtype=np.dtype(
+            {'names': ['timestamp', 'lost_packets'], 'formats': ['<f8', '<u4'],
+             'itemsize': RECORD_HEADER_SIZE}))
+        self._padding = bytes(self._dtype.itemsize - RECORD_HEADER_SIZE - 2 * frame_size)
+
+        self._file = open(path, 'wb')
+        self._file.write(make_header(config, frame_size, device, description, alignment))
+        self._file.flush()
+
+    def write(self, frame, lost_packets=0, timestamp=None):
+        """Appends a frame to the recording
+
+        Args:
+            frame (ndarray): int16 frame of frame_size values
+            lost_packets (int): Packets missing from the frame
+            timestamp (float): Receive time of the frame in seconds since the epoch, now by default
+
+        Returns:
+            None
+
+        """
+        if frame.size != self.frame_size:
+            raise ValueError('Frame has {} values instead of {}'.format(frame.size, self.frame_size))
+
+        self._record_header['timestamp'] = time.time() if timestamp is None else timestamp
+        self._record_header['lost_packets'] = lost_packets
+        self._file.write(self._record_header.data)
+        self._file.write(np.ascontiguousarray(frame, dtype='<i2').data)
+        self._file.write(self._padding)
+        self.frames += 1
+
+    def flush(self):
+        """Flushes written frames to the OS so that readers can see them"""
+        self._file.flush()
+
+    def close(self):
+        """Closes the recording file"""
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class Recording:
+    """Memory-mapped read access to a recording file.
+
+    Attributes:
+        path (str): Recording file
+        header (dict): Full recording header
+        config (dict): PARAMS.CONFIG dictionary used for the capture, for PARAMS.set_playback_mode
+        device (str): Radar model identifier
+        description (str): Description of the acquired data
+        frame_size (int): Number of int16 values in a frame
+
+    Properties:
+        frames (ndarray): int16 frames of shape (num_frames, frame_size)
+        timestamps (ndarray): Receive time of each frame in seconds since the epoch
+        lost_packets (ndarray): Packets missing from each frame
+
+    Examples:
+        >>> rec = Recording('capture.rec')
+        >>> PARAMS.set_playback_mode(rec.config)
+        >>> rdata.raw_data = rec[5]
+
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self.header, self._offset = read_header(f)
+
+        self.config = self.header['config']
+        self.device = self.header['device']
+        self.description = self.header['description']
+        self.frame_size = self.header['frame_size']
+        self._dtype = record_dtype(self.frame_size, self.header['alignment'])
+        self._records = None
+        self.refresh()
+
+    def refresh(self):
+        """Maps the frames appended since the recording was opened
+
+        A record that is only partially written, e.g. after a crash, is ignored.
+
+        Returns:
+            int: Number of frames
+
+        """
+        count = (os.path.getsize(self.path) - self._offset) // self._dtype.itemsize
+        if count > 0:
+            self._records = np.memmap(self.path, dtype=self._dtype, mode='r',
+                                      offset=self._offset, shape=(count,))
+        else:
+            self._records = np.zeros(0, dtype=self._dtype)
+        return count
+
+    def __len__(self):
+        return len(self._records)
+
+    def __getitem__(self, index):
+        """int16 frame at index, or frames of shape (n, frame_size) for a slice"""
+        return self._records['data'][index]
+
+    def __iter__(self):
+        return iter(self.frames)
+
+    @property
+    def frames(self):
+        """int16 frames of shape (num_frames, frame_size)"""
+        return self._records['data']
+
+    @property
+    def timestamps(self):
+        """Receive time of each frame in seconds since the epoch"""
+        return self._records['timestamp']
+
+    @property
+    def lost_packets(self):
+        """Packets missing from each frame"""
+        return self._records['lost_packets']
+
+
+def convert_legacy(path, out_path=None, device=None):
+    """Converts a pickled .dat capture of earlier versions of save_data.py into a recording
+
+    The pickle holds the description, the recording date, the PARAMS configuration and
+    the list of frames, but no receive time per frame, so every frame is given the
+    recording date as timestamp. Pickles can run code when loaded, only convert trusted files.
+
+    Args:
+        path (str): Pickled .dat capture
+        out_path (str): Recording to write, path with a .rec extension by default
+        device (str): Radar model identifier, not stored in .dat captures
+
+    Returns:
+        str: Path of the recording
+
+    """
+    if out_path is None:
+        out_path = os.path.splitext(path)[0] + '.rec'
+    with open(path, 'rb') as f:
+        legacy = pickle.load(f)
+
+    frames = [np.asarray(frame) for frame in legacy['data']]
+    try:
+        timestamp = datetime.strptime(legacy['date'], '%d/%m/%y-%H:%M:%S').timestamp()
+    except (KeyError, ValueError):
+        timestamp = 0.
+
+    frame_size = frames[0].size if frames else 0
+    with RecordingWriter(out_path, legacy['config'], frame_size, device, legacy.get('description', '')) as writer:
+        for frame in frames:
+            # Frames were stored as uint16 or int16, the samples are the same bits
+            writer.write(frame.reshape(-1).view('<i2'), timestamp=timestamp)
+    return out_path
@@ -0,0 +1,337 @@
+"""
+
+DCA1000 REPLAY SERVER
+=====================
+
+Emulate a DCA1000 on the local machine by re-emitting saved frames as UDP
+packets, to test and benchmark the capture path without the board.
+
+Frames are taken from a .rec or .crec recording, a TI raw .bin capture or any
+sequence of int16 frames, and sent as one continuous stream of DCA1000 packets:
+a 4-byte sequence number and a 6-byte byte count in little-endian order,
+followed by BYTES_IN_PACKET bytes of ADC data. Packets are paced at the frame
+rate of the recording, scaled by a speed factor, and can be dropped or
+reordered at random to exercise loss handling. Commands received on the
+configuration port get the acknowledgement the FPGA would send.
+
+On Linux the whole 127.0.0.0/8 range is loopback, so the emulator listens on
+127.0.0.2 while the DCA1000 class binds 127.0.0.1, as both use the same ports:
+
+    >>> server = ReplayServer('capture.rec', speed=2, loss=0.01)
+    >>> server.start()
+    >>> dca = DCA1000(static_ip='127.0.0.1', adc_ip='127.0.0.2')
+    >>> dca.configure()
+    >>> adc_data = dca.read()
+
+It can also be run as a script: python replay_server.py capture.rec --speed 2 --loss 0.01
+
+Included classes:
+    - ReplayServer
+
+"""
+
+import argparse
+import codecs
+import random
+import socket
+import threading
+import time
+
+import numpy as np
+
+from compressed_recording import open_recording
+from dca1000 import BYTES_IN_PACKET, CMD, CONFIG_FOOTER, CONFIG_HEADER, MAX_PACKET_SIZE
+from ti_capture import TICapture
+
+# Packets sent between two pacing checks
+PACING_CHUNK = 32
+
+
+def open_source(path):
+    """Opens a recording or a TI raw capture as a sequence of int16 frames
+
+    Args:
+        path (str): .rec or .crec recording, or .bin capture
+
+    Returns:
+        Sequence of frames with a config attribute
+
+    """
+    if path.endswith('.bin'):
+        return TICapture(path)
+    return open_recording(path)
+
+
+class ReplayServer:
+    """Sends frames as DCA1000 UDP packets and answers configuration commands.
+
+    Attributes:
+        source (str or sequence): Recording or capture path, or a sequence of int16 frames
+            (Recording, CompressedRecording, TICapture, 2D array...)
+        host_ip (str): Address the DCA1000 class is bound to, i.e. its static_ip
+        adc_ip (str): Address the emulated board listens on, i.e. the adc_ip of the DCA1000 class
+        data_port (int): Port packets are sent to
+        config_port (int): Port configuration commands are received on and answered from
+        fps (float): Frame rate, from the PERIODICITY of the source config by default
+        speed (float): Frame rate multiplier, None to send as fast as possible
+        loss (float): Probability of dropping each packet
+        reorder (float): Probability of swapping each packet with one of the next reorder_distance ones
+        reorder_distance (int): Maximum number of packets a reordered packet is delayed by
+        loop (bool): Restart from the first frame at the end of the source, the stream continues
+        wait_for_start (bool): Send nothing until RECORD_START_CMD_CODE is received
+        packet_size (int): ADC data bytes per packet
+        seed (int): Seed of the loss and reordering random generator
+        commands (list): CMD codes received so far
+        frames_sent (int): Frames whose packets were all handed to the network (or dropped)
+        packets_sent (int): Packets sent
+        packets_dropped (int): Packets dropped on purpose
+        packets_reordered (int): Packets sent out of order on purpose
+
+    """
+
+    def __init__(self, source, host_ip='127.0.0.1', adc_ip='127.0.0.2', data_port=4098,
+                 config_port=4096, fps=None, speed=1., loss=0., reorder=0., reorder_distance=8,
+                 loop=False, wait_for_start=False, packet_size=BYTES_IN_PACKET, seed=None):
+        self.source = open_source(source) if isinstance(source, str) else source
+        self.host_ip = host_ip
+        self.adc_ip = adc_ip
+        self.data_port = data_port
+        self.config_port = config_port
+        config = getattr(self.source, 'config', None)
+        if fps is None and config and config.get('PERIODICITY'):
+            fps = 1000. / config['PERIODICITY']
+        self.fps = fps
+        self.speed = speed
+        self.loss = loss
+        self.reorder = reorder
+        self.reorder_distance = reorder_distance
+        self.loop = loop
+        self.wait_for_start = wait_for_start
+        self.packet_size = packet_size
+        self._random = random.Random(seed)
+
+        self.commands = []
+        self.frames_sent = 0
+        self.packets_sent = 0
+        self.packets_dropped = 0
+        self.packets_reordered = 0
+
+        self.data_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+        self.data_socket.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 8 * 1024 * 1024)
+        self.data_socket.bind((adc_ip, 0))
+        self.config_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+        self.config_socket.bind((adc_ip, config_port))
+
+        self._running = False
+        self._recording = threading.Event()
+        self._done = threading.Event()
+        self._data_thread = None
+        self._config_thread = None
+
+    def start(self):
+        """Starts answering commands and, unless wait_for_start is set, sending frames
+
+        Returns:
+            None
+
+        """
+        if self._running:
+            return
+        self._running = True
+        self._done.clear()
+        if self.wait_for_start:
+            self._recording.clear()
+        else:
+            self._recording.set()
+        self._config_thread = threading.Thread(target=self._config_loop, daemon=True)
+        self._data_thread = threading.Thread(target=self._data_loop, daemon=True)
+        self._config_thread.start()
+        self._data_thread.start()
+
+    def stop(self):
+        """Stops sending frames and answering commands
+
+        Returns:
+            None
+
+        """
+        if not self._running:
+            return
+        self._running = False
+        self._recording.set()
+        self._data_thread.join()
+        self._config_thread.join()
+
+    def wait(self, timeout=None):
+        """Waits until every frame of the source was sent
+
+        Args:
+            timeout (float): Maximum time to wait in seconds, None to wait forever
+
+        Returns:
+            bool: True if the whole source was sent
+
+        """
+        return self._done.wait(timeout)
+
+    def close(self):
+        """Stops the server and closes its sockets"""
+        self.stop()
+        self.data_socket.close()
+        self.config_socket.close()
+
+    def stats(self):
+        """Returns the number of frames and packets sent, dropped and reordered
+
+        Returns:
+            dict: Server counters
+
+        """
+        return {'frames_sent': self.frames_sent,
+                'packets_sent': self.packets_sent,
+                'packets_dropped': self.packets_dropped,
+                'packets_reordered': self.packets_reordered,
+                'commands': [str(cmd) for cmd in self.commands]}
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _config_loop(self):
+        """Helper function run by the config thread, acknowledges every command"""
+        self.config_socket.settimeout(0.1)
+        while self._running:
+            try:
+                msg, addr = self.config_socket.recvfrom(MAX_PACKET_SIZE)
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+
+            # 5a a5 <cmd> <length> <body> aa ee, answered with 5a a5 <cmd> <status> aa ee
+            message = msg.hex()
+            if not (message.startswith(CONFIG_HEADER) and message.endswith(CONFIG_FOOTER)):
+                continue
+            code = message[4:8]
+            try:
+                cmd = CMD(code)
+            except ValueError:
+                continue
+            self.commands.append(cmd)
+
+            status = '0000'
+            if cmd == CMD.READ_FPGA_VERSION_CMD_CODE:
+                status = '0203'
+            elif cmd == CMD.RECORD_START_CMD_CODE:
+                self._recording.set()
+            elif cmd == CMD.RECORD_STOP_CMD_CODE and self.wait_for_start:
+                self._recording.clear()
+            self.config_socket.sendto(
+                codecs.decode(''.join((CONFIG_HEADER, code, status, CONFIG_FOOTER)), 'hex'), addr)
+
+    def _data_loop(self):
+        """Helper function run by the data thread, sends the source as a packet stream"""
+        pending = bytearray()
+        packet_num = 0
+        start = None
+        sent_frames = 0
+
+        index = 0
+        while self._running:
+            if index == len(self.source):
+                if not self.loop or len(self.source) == 0:
+                    break
+                index = 0
+
+            self._recording.wait()
+            if not self._running:
+                break
+            if start is None:
+                start = time.monotonic()
+
+            # Data of a frame completes the last packet of the previous one
+            pending += np.ascontiguousarray(self.source[index], dtype='<i2').tobytes()
+            index += 1
+            count = len(pending) // self.packet_size
+
+            for n, i in enumerate(self._packet_order(count)):
+                if i is not None:
+                    self._send_packet(packet_num + i, pending, i * self.packet_size, self.packet_size)
+                if n % PACING_CHUNK == PACING_CHUNK - 1:
+                    self._pace(start, sent_frames + n / count)
+
+            del pending[:count * self.packet_size]
+            packet_num += count
+            sent_frames += 1
+            self.frames_sent += 1
+            self._pace(start, sent_frames)
+
+        # The stream ends with a shorter packet, as at the end of a capture
+        if pending and self._running:
+            self._send_packet(packet_num, pending, 0, len(pending))
+        self._done.set()
+
+    def _send_packet(self, num, data, offset, size):
+        """Helper function sending data[offset:offset + size] as stream packet num"""
+        header = (num + 1).to_bytes(4, 'little') + (num * self.packet_size).to_bytes(6, 'little')
+        with memoryview(data) as view, view[offset:offset + size] as payload:
+            if hasattr(self.data_socket, 'sendmsg'):
+                self.data_socket.sendmsg([header, payload], [], 0, (self.host_ip, self.data_port))
+            else:
+                self.data_socket.sendto(header + payload, (self.host_ip, self.data_port))
+        self.packets_sent += 1
+
+    def _packet_order(self, count):
+        """Helper function returning the order in which count packets are sent, None for dropped ones"""
+        order = list(range(count))
+        for i in range(count):
+            if self.reorder and self._random.random() < self.reorder:
+                j = min(count - 1, i + self._random.randint(1, self.reorder_distance))
+                if j != i:
+                    order[i], order[j] = order[j], order[i]
+                    self.packets_reordered += 1
+            if self.loss and self._random.random() < self.loss:
+                order[i] = None
+                self.packets_dropped += 1
+        return order
+
+    def _pace(self, start, frames):
+        """Helper function sleeping until the time at which a number of frames should have been sent"""
+        if not self.speed or not self.fps:
+            return
+        delay = start + frames / (self.fps * self.speed) - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Emulate a DCA1000 streaming a saved recording')
+    parser.add_argument('source', help='.rec or .crec recording, or TI .bin capture')
+    parser.add_argument('--host-ip', default='127.0.0.1')
+    parser.add_argument('--adc-ip', default='127.0.0.2')
+    parser.add_argument('--data-port', type=int, default=4098)
+    parser.add_argument('--config-port', type=int, default=4096)
+    parser.add_argument('--fps', type=float, default=None)
+    parser.add_argument('--speed', type=float, default=1., help='0 to send as fast as possible')
+    parser.add_argument('--loss', type=float, default=0.)
+    parser.add_argument('--reorder', type=float, default=0.)
+    parser.add_argument('--loop', action='store_true')
+    parser.add_argument('--wait-for-start', action='store_true')
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+
+    server = ReplayServer(args.source, args.host_ip, args.adc_ip, args.data_port, args.config_port,
+                          fps=args.fps, speed=args.speed, loss=args.loss, reorder=args.reorder,
+                          loop=args.loop, wait_for_start=args.wait_for_start, seed=args.seed)
+    print('Replaying {} frames from {} to {}:{}'.format(len(server.source), args.source,
+                                                       args.host_ip, args.data_port))
+    with server:
+        try:
+            while not server.wait(1):
+                pass
+        except KeyboardInterrupt:
+            pass
+    print(server.stats())
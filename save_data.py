@@ -3,42 +3,43 @@
 RECORD AND SAVE DCA1000 DATA
 ============================
 
-Read FRAMES from DCA1000 and save a .dat file with a dictionary with these keys:
+Read FRAMES from DCA1000 and save them to a .rec recording file (see recording.py)
+whose header holds:
 
-    - DESC: description of the acquired data
-    - id: shortened description
-    - date: time of recording
+    - description: description of the acquired data
+    - device: radar model
+    - created: time of recording
     - config: dictionary with DCA1000 configuration
-    - frames: number of recorded frames
-    - data: recorded data
+
+Each frame is stored with its receive timestamp and number of lost packets by a
+separate writer thread (see recorder.py). Set SECONDS instead of FRAMES for long
+captures, and MAX_FILE_SECONDS to split them into several files. Set CODEC to
+'zlib', 'lz4' or 'zstd' to save a smaller compressed recording instead (see
+compressed_recording.py).
 
 """
 
 from datetime import datetime
-import pickle
 from dca1000 import DCA1000
 from params import PARAMS
+from recorder import StreamRecorder
 
 FRAMES = 40
+SECONDS = None
+MAX_FILE_SECONDS = None
+CODEC = None
 DESC = 'Queen Mary University London -- moving coner reflector'
+DEVICE = 'IWR6843ISK-ODS'
 
 dca = DCA1000()
 
-data = []
-
-for _ in range(FRAMES):
-    dca._clear_buffer()
-    adc_data = dca.read()
-    data.append(adc_data)
-
 date = datetime.now().strftime('%d-%m-%y')
 desc_short = ''.join([c[0].upper() for c in DESC.split()])
 
-obj = {'description': DESC,
-       'id': desc_short,
-       'date': datetime.now().strftime('%d/%m/%y-%H:%M:%S'),
-       'config': PARAMS.CONFIG,
-       'frames': FRAMES,
-       'data': data}
+ext = 'rec' if CODEC is None else 'crec'
+recorder = StreamRecorder(dca, f'./data/openradar_{date}_{desc_short}.{ext}', PARAMS.CONFIG,
+                          device=DEVICE, description=DESC, max_seconds=MAX_FILE_SECONDS, codec=CODEC)
 
-pickle.dump(obj, open(f'./data/openradar_{date}_{desc_short}.dat', 'bw'))
+stats = recorder.record(frames=FRAMES, seconds=SECONDS)
+print(stats)
+print(dca.stats)
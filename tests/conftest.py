@@ -0,0 +1,8 @@
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# PARAMS reads the lua script on import, use the one shipped with the repository
+os.environ.setdefault('MMWAVE_CONFIG', os.path.join(ROOT, 'mmWave Studio Scripts', 'DataCaptureDemo_PythonPrepare.lua'))
@@ -0,0 +1,70 @@
+import numpy as np
+import pytest
+
+from beamforming import Beamformer, angle_grid
+from devices import get_device
+
+TX = (0, 2, 1)
+AZIMUTHS = np.radians(np.arange(-60., 61.))
+
+rng = np.random.default_rng(7)
+
+
+def snapshots(azimuths, range_bin=3, bins=6, count=64, noise=0.05):
+    """Snapshots of shape (count, 12, bins) with uncorrelated sources in one range bin"""
+    steering = get_device('IWR6843ISK-ODS').steering_vectors(np.radians(azimuths), 0., TX)
+    cube = noise * (rng.standard_normal((count, 12, bins)) + 1j * rng.standard_normal((count, 12, bins)))
+    amplitudes = np.exp(2j * np.pi * rng.random((count, len(azimuths))))
+    cube[:, :, range_bin] += amplitudes @ np.atleast_2d(steering)
+    return cube
+
+
+def peaks(spectrum):
+    """Azimuths in degrees of the local maxima of a spectrum"""
+    inner = (spectrum[1:-1] > spectrum[:-2]) & (spectrum[1:-1] > spectrum[2:])
+    return np.degrees(AZIMUTHS[1:-1][inner])
+
+
+def test_covariance_and_bartlett_spectrum():
+    cube = snapshots([20.])
+    beamformer = Beamformer('IWR6843ISK-ODS', method='bartlett', tx=TX, azimuths=AZIMUTHS)
+    covariance = beamformer.covariance(cube)
+
+    for r in range(cube.shape[2]):
+        expected = cube[:, :, r].T @ cube[:, :, r].conj() / len(cube)
+        np.testing.assert_allclose(covariance[r], expected, rtol=1e-4, atol=1e-5)
+
+    spectrum = beamformer.spectrum(cube)
+    assert spectrum.shape == (6, len(AZIMUTHS))
+    assert spectrum.dtype == np.float32
+    assert np.degrees(AZIMUTHS[np.argmax(spectrum[3])]) == pytest.approx(20.)
+    steering = get_device('IWR6843ISK-ODS').steering_vectors(AZIMUTHS, np.zeros_like(AZIMUTHS), TX)
+    expected = np.einsum('av,vw,aw->a', steering.conj(), covariance[3], steering).real / 144
+    np.testing.assert_allclose(spectrum[3], expected, rtol=1e-3)
+
+
+def test_capon_resolves_sources_bartlett_merges():
+    cube = snapshots([-8., 8.])
+    bartlett = Beamformer('IWR6843ISK-ODS', method='bartlett', tx=TX, azimuths=AZIMUTHS).spectrum(cube)
+    capon = Beamformer('IWR6843ISK-ODS', method='capon', tx=TX, azimuths=AZIMUTHS).spectrum(cube)
+    assert len(peaks(bartlett[3])) == 1
+    np.testing.assert_allclose(peaks(capon[3]), [-8., 8.], atol=2)
+
+
+def test_selected_range_bins_and_elevation():
+    cube = snapshots([20.])
+    beamformer = Beamformer('IWR6843ISK-ODS', tx=TX, azimuths=AZIMUTHS)
+    selected = beamformer.spectrum(cube, range_idx=np.array([3, 0]))
+    full = beamformer.spectrum(cube)
+    np.testing.assert_allclose(selected, full[[3, 0]], rtol=1e-4)
+
+    beamformer = Beamformer('IWR6843ISK-ODS', tx=TX, azimuths=angle_grid(16), elevations=angle_grid(8))
+    assert beamformer.shape == (8, 16)
+    assert beamformer.spectrum(cube).shape == (6, 8, 16)
+
+
+def test_invalid_arguments_are_rejected():
+    with pytest.raises(ValueError):
+        Beamformer('IWR6843ISK-ODS', method='music')
+    with pytest.raises(ValueError):
+        Beamformer('IWR6843ISK-ODS', tx=TX).spectrum(np.zeros((4, 8, 6), dtype=complex))
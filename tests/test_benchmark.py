@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+
+from benchmark import benchmark_config, find_baseline, run_benchmark, save_result, synthetic_frames
+from params import PARAMS
+
+
+def test_memory_benchmark_restores_params():
+    config = PARAMS.CONFIG
+    result = run_benchmark(samples=32, loops=4, tx=3, rx=4, frames=3, warmup=1, plot=True)
+
+    assert result['config'] == {'samples': 32, 'loops': 4, 'tx': 3, 'rx': 4}
+    assert result['source'] == 'memory' and result['speed'] is None
+    assert result['fps'] > 0
+    assert set(result['stages']) == {'receive', 'organize', 'separate_tx', 'range_fft', 'angle_fft',
+                                     'doppler_fft', 'plot', 'total'}
+    assert PARAMS.CONFIG == config
+
+    # Two TX antennas are the first two chirps of the lua script, TX0 and TX2
+    result = run_benchmark(samples=32, loops=4, tx=2, rx=4, frames=2, warmup=0)
+    assert {'range_fft', 'angle_fft', 'doppler_fft'} <= set(result['stages'])
+
+    # Stages are not skipped when the device does not match
+    with pytest.raises(ValueError):
+        run_benchmark(samples=32, loops=4, tx=1, rx=2, frames=2, warmup=0)
+    with pytest.raises(ValueError):
+        run_benchmark(samples=32, loops=4, device='IWR0000', frames=2, warmup=0)
+    assert PARAMS.CONFIG == config
+
+
+def test_synthetic_frames_have_the_configured_size():
+    config = benchmark_config(samples=16, loops=2, tx=2, rx=4)
+    assert config['TX0_EN'] == config['TX2_EN'] == 1 and config['TX1_EN'] == 0
+    frames = synthetic_frames(config, count=3)
+    assert frames.shape == (3, 16 * 2 * 2 * 4 * 2) and frames.dtype == np.int16
+    np.testing.assert_array_equal(frames, synthetic_frames(config, count=3))
+
+
+def test_baseline_skips_incomplete_runs(tmp_path):
+    path = str(tmp_path / 'results.jsonl')
+    settings = {'config': {'samples': 256}, 'device': 'IWR6843ISK-ODS', 'source': 'udp', 'speed': 1.,
+                'plot': False, 'fft_backend': 'numpy', 'fft_workers': 1}
+    assert find_baseline(settings, path) is None
+
+    save_result(dict(settings, fps=10., incomplete=False), path)
+    save_result(dict(settings, fps=30., incomplete=True), path)
+    save_result(dict(settings, speed=2., fps=20., incomplete=False), path)
+    baseline = find_baseline(dict(settings, fps=12.), path)
+    assert baseline['fps'] == 10.
+    assert 'commit' in baseline and 'date' in baseline
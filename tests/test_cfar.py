@@ -0,0 +1,84 @@
+import numpy as np
+import pytest
+
+from cfar import CFAR
+
+rng = np.random.default_rng(5)
+POWER = rng.exponential(size=(12, 20))
+
+
+def mirror(r, n):
+    """Range index after symmetric padding"""
+    if r < 0:
+        return -r - 1
+    if r >= n:
+        return 2 * n - r - 1
+    return r
+
+
+def brute_force_noise(power, method, train, guard, rank=None):
+    """Noise of every cell from an explicit list of its training cells"""
+    hd, hr = train[0] + guard[0], train[1] + guard[1]
+    doppler, bins = power.shape
+    noise = np.empty(power.shape)
+    for d in range(doppler):
+        for r in range(bins):
+            # Training cells with their range offset
+            cells = [(j, power[(d + i) % doppler, mirror(r + j, bins)])
+                     for i in range(-hd, hd + 1) for j in range(-hr, hr + 1)
+                     if abs(i) > guard[0] or abs(j) > guard[1]]
+            values = [value for _, value in cells]
+            if method == 'ca':
+                noise[d, r] = np.mean(values)
+            elif method == 'os':
+                noise[d, r] = np.sort(values)[rank]
+            else:
+                # Cells at the range of the cell belong to neither side
+                before = np.mean([value for j, value in cells if j < 0])
+                after = np.mean([value for j, value in cells if j > 0])
+                noise[d, r] = max(before, after) if method == 'go' else min(before, after)
+    return noise
+
+
+@pytest.mark.parametrize('method', ['ca', 'go', 'so', 'os'])
+def test_noise_matches_brute_force(method):
+    cfar = CFAR(method, train=(2, 3), guard=(1, 1))
+    expected = brute_force_noise(POWER, method, (2, 3), (1, 1), cfar.rank)
+    np.testing.assert_allclose(cfar.noise(POWER), expected, rtol=1e-5)
+
+
+def test_detections_are_the_cells_above_the_threshold():
+    power = POWER.copy()
+    power[3, 7] = power[9, 15] = 200
+    cfar = CFAR('ca', train=(2, 3), guard=(1, 1), pfa=1e-3)
+    detections = cfar.detect(power)
+
+    noise = brute_force_noise(power, 'ca', (2, 3), (1, 1))
+    expected = np.argwhere(power > noise * cfar.scale)
+    np.testing.assert_array_equal(np.column_stack([detections['doppler_idx'], detections['range_idx']]), expected)
+    assert {(3, 7), (9, 15)} <= set(map(tuple, expected))
+    np.testing.assert_allclose(detections['snr'], 10 * np.log10(power[tuple(expected.T)] / noise[tuple(expected.T)]),
+                               rtol=1e-4)
+
+    # Complex maps are turned into power
+    amplitude = np.sqrt(power) * np.exp(2j * np.pi * rng.random(power.shape))
+    np.testing.assert_array_equal(cfar.detect(amplitude)[['doppler_idx', 'range_idx']],
+                                  detections[['doppler_idx', 'range_idx']])
+
+
+@pytest.mark.parametrize('method', ['ca', 'os'])
+def test_false_alarm_rate_in_exponential_noise(method):
+    noise = np.random.default_rng(6).exponential(size=(256, 256))
+    detections = CFAR(method, train=(4, 8), guard=(2, 2), pfa=1e-2).detect(noise)
+    assert 0.5e-2 < len(detections) / noise.size < 1.5e-2
+
+
+def test_invalid_windows_are_rejected():
+    with pytest.raises(ValueError):
+        CFAR('median')
+    with pytest.raises(ValueError):
+        CFAR('ca', train=(0, 0))
+    with pytest.raises(ValueError):
+        CFAR('os', train=(1, 1), guard=(0, 0), rank=8)
+    with pytest.raises(ValueError):
+        CFAR('go', train=(2, 0), guard=(1, 0)).noise(POWER)
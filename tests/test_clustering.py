@@ -0,0 +1,112 @@
+import numpy as np
+import pytest
+
+from clustering import DBSCAN, cluster_centroids
+from pointcloud import POINT_DTYPE
+
+rng = np.random.default_rng(8)
+
+
+def cloud(n=150):
+    """Three blobs, one of them split by Doppler, and scattered noise"""
+    points = np.zeros(n, dtype=POINT_DTYPE)
+    centres = np.array([[0., 2., 0.], [1.5, 3., 0.2], [-2., 4., -0.3], [-2., 4., -0.3]])
+    speeds = np.array([0., 1., -2., 2.])
+    blob = rng.integers(0, 4, n)
+    xyz = centres[blob] + 0.15 * rng.standard_normal((n, 3))
+    doppler = speeds[blob] + 0.1 * rng.standard_normal(n)
+    noise = rng.random(n) < 0.15
+    xyz[noise] = rng.uniform(-4, 4, (noise.sum(), 3)) + [0, 5, 0]
+    for d, name in enumerate('xyz'):
+        points[name] = xyz[:, d]
+    points['doppler'] = doppler
+    points['snr'] = rng.uniform(5, 20, n)
+    return points
+
+
+def brute_force(points, eps, min_samples, doppler_weight, use_elevation=True):
+    """Neighbours from the full distance matrix and clusters grown point by point"""
+    columns = ['x', 'y', 'z'][:3 if use_elevation else 2]
+    features = np.column_stack([points[name] for name in columns] + [points['doppler'] * doppler_weight])
+    features = features.astype(np.float32)
+    distance = np.sqrt(((features[:, None] - features[None]) ** 2).sum(-1))
+    neighbours = distance <= eps
+    core = neighbours.sum(1) >= min_samples
+
+    labels = np.full(len(points), -1)
+    cluster = 0
+    for seed in np.flatnonzero(core):
+        if labels[seed] >= 0:
+            continue
+        stack = [seed]
+        labels[seed] = cluster
+        while stack:
+            p = stack.pop()
+            for q in np.flatnonzero(neighbours[p] & core & (labels < 0)):
+                labels[q] = cluster
+                stack.append(q)
+        cluster += 1
+    return labels, core, neighbours
+
+
+def assert_same_clusters(labels, points, eps, min_samples, doppler_weight, use_elevation=True):
+    expected, core, neighbours = brute_force(points, eps, min_samples, doppler_weight, use_elevation)
+    # Same partition of the core points, up to the cluster numbers
+    pairs = set(zip(labels[core], expected[core]))
+    assert len(pairs) == len({a for a, _ in pairs}) == len({b for _, b in pairs})
+    # Border points take the cluster of one of their core neighbours, others are noise
+    mapping = dict((b, a) for a, b in pairs)
+    for p in np.flatnonzero(~core):
+        options = {mapping[expected[q]] for q in np.flatnonzero(neighbours[p] & core)}
+        assert labels[p] in (options or {-1})
+    assert set(labels) == set(range(len(pairs))) | ({-1} if (labels < 0).any() else set())
+
+
+@pytest.mark.parametrize('index', ['grid', 'kdtree'])
+@pytest.mark.parametrize('eps,min_samples,doppler_weight', [(0.4, 4, 0.5), (0.25, 3, 0.), (1., 8, 1.)])
+def test_clusters_match_brute_force(index, eps, min_samples, doppler_weight):
+    points = cloud()
+    labels = DBSCAN(eps, min_samples, doppler_weight, index=index).fit(points)
+    assert labels.dtype == np.int32
+    assert_same_clusters(labels, points, eps, min_samples, doppler_weight)
+
+
+def test_clusters_in_the_plane():
+    points = cloud()
+    labels = DBSCAN(0.4, 4, 0.5, use_elevation=False).fit(points)
+    assert_same_clusters(labels, points, 0.4, 4, 0.5, use_elevation=False)
+
+
+def test_doppler_keeps_crossing_targets_apart():
+    points = cloud()
+    with_doppler = DBSCAN(0.4, 4, doppler_weight=0.5).fit(points)
+    without = DBSCAN(0.4, 4, doppler_weight=0.).fit(points)
+    assert with_doppler.max() == without.max() + 1
+
+
+def test_window_clusters_the_last_frames_together():
+    frames = [cloud(60) for _ in range(3)]
+    dbscan = DBSCAN(0.4, 4, 0.5, frames=2)
+    for points in frames:
+        labels = dbscan.update(points)
+    window = np.concatenate(frames[1:])
+    together = DBSCAN(0.4, 4, 0.5).fit(window)
+    np.testing.assert_array_equal(labels, together[60:])
+
+    dbscan.reset()
+    np.testing.assert_array_equal(dbscan.update(frames[2]), DBSCAN(0.4, 4, 0.5).fit(frames[2]))
+    assert len(dbscan.update(np.zeros(0, dtype=POINT_DTYPE))) == 0
+
+
+def test_cluster_centroids():
+    points = np.zeros(5, dtype=POINT_DTYPE)
+    points['x'] = [0, 2, 5, 7, 9]
+    points['doppler'] = [1, 1, -1, -3, 0]
+    points['snr'] = [10, 10, 0, 10, 3]
+    clusters = cluster_centroids(points, np.array([0, 0, 1, 1, -1]))
+
+    np.testing.assert_array_equal(clusters['size'], [2, 2])
+    np.testing.assert_allclose(clusters['x'], [1, (5 + 7 * 10) / 11], rtol=1e-6)
+    np.testing.assert_allclose(clusters['doppler'], [1, (-1 - 3 * 10) / 11], rtol=1e-6)
+    np.testing.assert_allclose(clusters['snr'], [10 * np.log10(20), 10 * np.log10(11)], rtol=1e-6)
+    assert len(cluster_centroids(points, np.full(5, -1))) == 0
@@ -0,0 +1,85 @@
+import numpy as np
+import pytest
+
+from clutter import ClutterFilter
+from fourier import dopplerFFT
+
+LOOPS, SAMPLES = 4, 16
+
+rng = np.random.default_rng(4)
+FRAMES = (rng.standard_normal((6, LOOPS, 3, SAMPLES)) + 1j * rng.standard_normal((6, LOOPS, 3, SAMPLES)))
+
+
+def reference_backgrounds(method, alpha=0.5, window=3):
+    """Background after each frame, from the whole list of profiles"""
+    profiles = FRAMES.mean(axis=1)
+    backgrounds = []
+    for f in range(len(profiles)):
+        if method == 'ema':
+            previous = backgrounds[-1] if backgrounds else profiles[0]
+            backgrounds.append((1 - alpha) * previous + alpha * profiles[f])
+        else:
+            last = profiles[max(0, f + 1 - window):f + 1]
+            if method == 'mean':
+                backgrounds.append(last.mean(axis=0))
+            else:
+                backgrounds.append(np.median(last.real, axis=0) + 1j * np.median(last.imag, axis=0))
+    return backgrounds
+
+
+@pytest.mark.parametrize('method', ['ema', 'mean', 'median'])
+def test_background_estimates(method):
+    clutter = ClutterFilter(method, alpha=0.5, window=3, dtype=np.complex128)
+    for frame, background in zip(FRAMES, reference_backgrounds(method)):
+        result = clutter.apply(frame)
+        np.testing.assert_allclose(clutter.background, background, rtol=1e-9, atol=1e-12)
+        np.testing.assert_allclose(result, frame - background, rtol=1e-9, atol=1e-12)
+    assert clutter.frames == len(FRAMES)
+    assert clutter.shape == (3, SAMPLES)
+
+    clutter.reset()
+    clutter.apply(FRAMES[3])
+    np.testing.assert_allclose(clutter.background, FRAMES[3].mean(axis=0), rtol=1e-9)
+
+
+def test_static_reflectors_vanish_and_moving_targets_remain():
+    # A static tone on every chirp and frame, plus a target whose phase turns from frame to frame
+    static = np.exp(2j * np.pi * 3 * np.arange(SAMPLES) / SAMPLES)
+    moving = np.exp(2j * np.pi * 6 * np.arange(SAMPLES) / SAMPLES)
+    clutter = ClutterFilter('mean', window=4)
+    for f in range(8):
+        frame = np.broadcast_to(static + moving * np.exp(1j * np.pi * f / 2), (LOOPS, 3, SAMPLES))
+        spectrum = np.abs(np.fft.fft(clutter.apply(frame), axis=-1))
+    assert spectrum[0, 0, 3] < 1e-3
+    assert spectrum[0, 0, 6] == pytest.approx(SAMPLES, rel=1e-3)
+
+
+def test_filter_is_linear_for_ema():
+    # Filtering ADC data or its range FFT gives the same spectra
+    on_samples, on_spectra = ClutterFilter('ema', alpha=0.2), ClutterFilter('ema', alpha=0.2)
+    for frame in FRAMES:
+        samples = np.fft.fft(on_samples.apply(frame), axis=-1)
+        spectra = on_spectra.apply(np.fft.fft(frame, axis=-1))
+        np.testing.assert_allclose(samples, spectra, rtol=1e-4, atol=1e-4)
+
+
+def test_doppler_fft_filters_the_profiles_of_its_antenna():
+    # dopplerFFT sees the range profiles of virtual antenna 1 only
+    clutter = ClutterFilter('mean', window=2, dtype=np.complex128)
+    reference = ClutterFilter('mean', window=2, dtype=np.complex128)
+    for frame in FRAMES:
+        dFFT, _, _ = dopplerFFT(frame, near_field=0, clutter=clutter)
+        rFFT = reference.apply(np.fft.fft(frame[:, 1:2, :], axis=-1))[:, 0, :]
+        expected = np.fft.fftshift(np.fft.fft(rFFT, axis=0), axes=0)
+        np.testing.assert_allclose(dFFT, expected, rtol=1e-9, atol=1e-9)
+    assert clutter.shape == (1, SAMPLES)
+
+
+def test_invalid_settings_are_rejected():
+    with pytest.raises(ValueError):
+        ClutterFilter('mode')
+    with pytest.raises(ValueError):
+        ClutterFilter(alpha=0)
+    clutter = ClutterFilter(shape=(3, SAMPLES))
+    with pytest.raises(ValueError):
+        clutter.apply(FRAMES[0, :, :2])
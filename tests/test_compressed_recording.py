@@ -0,0 +1,66 @@
+import os
+
+import numpy as np
+import pytest
+
+from compressed_recording import CODECS, CompressedRecording, CompressedWriter, compress_recording, open_recording
+from recording import Recording, RecordingWriter
+
+CONFIG = {'ADC_SAMPLES': 16.0}
+FRAME_SIZE = 1000
+
+
+def frames(n):
+    # Small ADC-like values, with a different pattern per frame
+    ramp = np.arange(n * FRAME_SIZE).reshape(n, FRAME_SIZE)
+    return ((ramp * 7) % 4001 - 2000).astype(np.int16)
+
+
+@pytest.mark.parametrize('codec', sorted(CODECS))
+@pytest.mark.parametrize('shuffle', [True, False])
+def test_round_trip(tmp_path, codec, shuffle):
+    path = str(tmp_path / 'capture.crec')
+    with CompressedWriter(path, CONFIG, FRAME_SIZE, 'IWR1843ISK', 'test', codec=codec, shuffle=shuffle) as writer:
+        for i, frame in enumerate(frames(4)):
+            writer.write(frame, lost_packets=i, timestamp=100. + i)
+
+    rec = open_recording(path, workers=2)
+    assert isinstance(rec, CompressedRecording)
+    assert (len(rec), rec.config, rec.device, rec.codec) == (4, CONFIG, 'IWR1843ISK', codec)
+    np.testing.assert_array_equal(rec.frames, frames(4))
+    np.testing.assert_array_equal(rec[-1], frames(4)[3])
+    np.testing.assert_array_equal(rec[1:3], frames(4)[1:3])
+    np.testing.assert_array_equal(list(rec), list(frames(4)))
+    np.testing.assert_array_equal(rec.lost_packets, [0, 1, 2, 3])
+    np.testing.assert_array_equal(rec.timestamps, [100., 101., 102., 103.])
+
+
+def test_unclosed_file_is_scanned_and_partial_block_ignored(tmp_path):
+    path = str(tmp_path / 'capture.crec')
+    writer = CompressedWriter(path, CONFIG, FRAME_SIZE, codec='zlib')
+    for frame in frames(3):
+        writer.write(frame)
+    writer.flush()
+
+    # No index was written, as after a crash
+    np.testing.assert_array_equal(CompressedRecording(path).frames, frames(3))
+    os.truncate(path, os.path.getsize(path) - 5)
+    rec = CompressedRecording(path)
+    assert len(rec) == 2
+    np.testing.assert_array_equal(rec.frames, frames(2))
+    writer._file.close()
+
+
+def test_compress_raw_recording(tmp_path):
+    raw = str(tmp_path / 'capture.rec')
+    with RecordingWriter(raw, CONFIG, FRAME_SIZE, 'IWR6843ISK-ODS') as writer:
+        for i, frame in enumerate(frames(3)):
+            writer.write(frame, timestamp=float(i))
+    assert isinstance(open_recording(raw), Recording)
+
+    compressed = str(tmp_path / 'capture.crec')
+    assert compress_recording(raw, compressed, codec='zlib') > 1
+    rec = open_recording(compressed)
+    np.testing.assert_array_equal(rec.frames, frames(3))
+    np.testing.assert_array_equal(rec.timestamps, [0., 1., 2.])
+    assert rec.device == 'IWR6843ISK-ODS'
@@ -0,0 +1,153 @@
+import socket
+
+import numpy as np
+import pytest
+
+from dca1000 import BYTES_IN_FRAME, BYTES_IN_PACKET, HEADER_SIZE, UINT16_IN_FRAME, DCA1000, GapPolicy
+from replay_server import ReplayServer
+
+# int16 ramp streamed by the fake FPGA, long enough for 4 frames
+STREAM = (np.arange(2 * BYTES_IN_FRAME + BYTES_IN_PACKET, dtype=np.uint32) % 65536).astype(np.uint16)
+STREAM_BYTES = STREAM.view(np.uint8)
+PACKETS = 4 * BYTES_IN_FRAME // BYTES_IN_PACKET
+
+
+def frame(f):
+    """Expected data of frame f of the stream"""
+    return STREAM_BYTES[f * BYTES_IN_FRAME:(f + 1) * BYTES_IN_FRAME].view(np.int16)
+
+
+def make_dca(packets, **kwargs):
+    """DCA1000 on loopback whose socket is replaced by the given packets of the stream"""
+    dca = DCA1000(static_ip='127.0.0.1', adc_ip='127.0.0.1', data_port=0, config_port=0, **kwargs)
+    packets = iter(packets)
+
+    def read_data_packet():
+        try:
+            i = next(packets)
+        except StopIteration:
+            raise socket.timeout
+        payload = STREAM_BYTES[i * BYTES_IN_PACKET:(i + 1) * BYTES_IN_PACKET]
+        dca._packet[HEADER_SIZE:HEADER_SIZE + len(payload)] = payload.tobytes()
+        dca._packet_view = memoryview(dca._packet)
+        return i + 1, i * BYTES_IN_PACKET, HEADER_SIZE + len(payload)
+
+    dca._read_data_packet = read_data_packet
+    return dca
+
+
+def read_all(dca):
+    frames = []
+    while True:
+        try:
+            frames.append((dca.read().copy(), dca.lost_packets))
+        except socket.timeout:
+            return frames
+
+
+def test_frames_start_at_the_first_frame_boundary():
+    dca = make_dca(range(3, PACKETS))
+    frames = read_all(dca)
+    # Frame 0 is incomplete and skipped, frame 3 is still waiting for packets
+    assert len(frames) == 2
+    for f, (data, lost) in enumerate(frames, 1):
+        np.testing.assert_array_equal(data, frame(f))
+        assert lost == 0
+    assert dca.stats.frames_completed == 2
+    dca.close()
+
+
+def test_reordered_packets_land_in_place_and_lost_ones_are_zero_filled():
+    order = list(range(PACKETS))
+    for j in range(100, PACKETS - 1, 97):
+        order[j], order[j + 1] = order[j + 1], order[j]
+    dropped = 1085
+    dca = make_dca([i for i in order if i != dropped], gap_policy=GapPolicy.ZERO_FILL)
+    frames = read_all(dca)
+
+    # The dropped packet lies inside frame 1
+    assert dropped * BYTES_IN_PACKET // BYTES_IN_FRAME == 1
+    expected = frame(1).copy()
+    lo = dropped * BYTES_IN_PACKET - BYTES_IN_FRAME
+    expected.view(np.uint8)[lo:lo + BYTES_IN_PACKET] = 0
+    np.testing.assert_array_equal(frames[0][0], frame(0))
+    np.testing.assert_array_equal(frames[1][0], expected)
+    assert [lost for _, lost in frames[:3]] == [0, 1, 0]
+    assert dca.stats.reordered_packets > 0
+    assert dca.stats.packets_lost == 1
+    dca.close()
+
+
+def test_gap_policies():
+    dropped = 1085
+    packets = [i for i in range(PACKETS) if i != dropped]
+
+    dca = make_dca(packets, gap_policy=GapPolicy.REPEAT_LAST)
+    frames = read_all(dca)
+    lo = dropped * BYTES_IN_PACKET - BYTES_IN_FRAME
+    repeated = frames[1][0].view(np.uint8)[lo:lo + BYTES_IN_PACKET]
+    np.testing.assert_array_equal(repeated, frame(0).view(np.uint8)[lo:lo + BYTES_IN_PACKET])
+    dca.close()
+
+    dca = make_dca(packets, gap_policy=GapPolicy.DROP_FRAME)
+    frames = read_all(dca)
+    np.testing.assert_array_equal(frames[1][0], frame(2))
+    assert dca.stats.discarded_frames == 1
+    dca.close()
+
+
+@pytest.mark.parametrize('dtype', [np.complex64, np.complex128])
+def test_organize_matches_interleaved_layout(dtype):
+    chirps, rx, samples = 6, 4, 8
+    raw = np.random.default_rng(0).integers(-2000, 2000, chirps * rx * samples * 2).astype(np.int16)
+    expected = np.empty(raw.size // 2, dtype=complex)
+    expected[0::2] = raw[0::4] + 1j * raw[2::4]
+    expected[1::2] = raw[1::4] + 1j * raw[3::4]
+    expected = expected.reshape(chirps, rx, samples)
+
+    np.testing.assert_array_equal(DCA1000.organize(raw, chirps, rx, samples, dtype=dtype), expected)
+    out = np.empty((2, raw.size // 2), dtype=dtype)
+    batch = DCA1000.organize_into(np.stack([raw, raw]), out, chirps, rx, samples)
+    assert batch.shape == (2, chirps, rx, samples)
+    np.testing.assert_array_equal(batch[1], expected)
+    with pytest.raises(ValueError):
+        DCA1000.organize_into(raw, np.empty(10, dtype=dtype), chirps, rx, samples)
+
+
+def test_streaming_hands_every_frame_over_in_order():
+    dca = make_dca(range(PACKETS))
+    dca.start_streaming(timeout=0.01)
+    received = []
+    for data in dca.iter_frames(timeout=5):
+        received.append(data.copy())
+        if len(received) == 3:
+            break
+    assert dca.streaming
+    dca.stop_streaming()
+    assert not dca.streaming
+    assert list(dca.iter_frames(timeout=0.1)) == []
+
+    for f, data in enumerate(received):
+        np.testing.assert_array_equal(data, frame(f))
+    assert dca.dropped_frames == 0
+    dca.close()
+
+
+def free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def test_frames_are_reassembled_from_the_socket():
+    # Frames of distinct ramps, replayed at 20 frames/s in packet chunks the socket keeps up with
+    frames = (np.arange(3)[:, None] * 7 + np.arange(UINT16_IN_FRAME)[None, :]).astype(np.int16)
+    data_port, config_port = free_port(), free_port()
+    dca = DCA1000(static_ip='127.0.0.1', adc_ip='127.0.0.2', data_port=data_port, config_port=config_port,
+                  rcvbuf_size=4 * 1024 * 1024)
+    with ReplayServer(frames, data_port=data_port, config_port=config_port, fps=20):
+        received = [dca.read().copy() for _ in range(len(frames))]
+    assert dca.stats.packets_lost == 0
+    dca.close()
+    for data, expected in zip(received, frames):
+        np.testing.assert_array_equal(data, expected)
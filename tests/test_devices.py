@@ -0,0 +1,81 @@
+import numpy as np
+import pytest
+
+from devices import enabled_tx, get_device
+from fourier import rangeFFT
+
+# Virtual array maps hard-coded in fourier.py before the device registry
+ODS_MAP = np.array([[0, 3, 4, 7],
+                    [1, 2, 5, 6],
+                    [-1, -1, 8, 11],
+                    [-1, -1, 9, 10]])
+IWR1843_MAP = np.array([[-1, -1, 4, 5, 6, 7, -1, -1],
+                        [0, 1, 2, 3, 8, 9, 10, 11]])
+
+
+def config(tx0, tx1, tx2):
+    return {'TX0_EN': tx0, 'TX1_EN': tx1, 'TX2_EN': tx2, 'NUM_TX': tx0 + tx1 + tx2}
+
+
+def test_enabled_tx_follows_chirp_order():
+    assert enabled_tx(config(1, 1, 1)) == (0, 2, 1)
+    assert enabled_tx(config(1, 0, 1)) == (0, 2)
+    # NUM_TX chirps are captured, those of disabled antennas are silent
+    assert enabled_tx(config(0, 1, 1)) == (None, 2)
+    assert enabled_tx(config(1, 1, 0)) == (0, None)
+    assert enabled_tx(config(0, 0, 1)) == (None,)
+    assert enabled_tx({}) is None
+
+
+def test_array_maps_match_previous_layouts():
+    tx = enabled_tx(config(1, 1, 1))
+    np.testing.assert_array_equal(get_device('IWR6843ISK-ODS').array_map(tx), ODS_MAP)
+    np.testing.assert_array_equal(get_device('IWR1843ISK').array_map(tx), IWR1843_MAP)
+    np.testing.assert_array_equal(get_device('IWR6843ISK-ODS').array_map(), ODS_MAP)
+
+
+def test_partial_flags_use_physical_positions():
+    # Without TX1 the second chirp is the raised TX2
+    geometry = get_device('IWR1843ISK')
+    tx = enabled_tx(config(1, 0, 1))
+    np.testing.assert_array_equal(geometry.virtual_positions(tx)[4], geometry.tx_positions[2])
+    np.testing.assert_array_equal(geometry.array_map(tx), [[-1, -1, 4, 5, 6, 7],
+                                                          [0, 1, 2, 3, -1, -1]])
+
+
+def test_steering_vectors_are_not_cached():
+    geometry = get_device('IWR6843ISK-ODS')
+    cached = len(geometry._cache)
+    vectors = geometry.steering_vectors(np.radians([-30., 0., 30.]))
+    assert vectors.shape == (3, 12)
+    np.testing.assert_allclose(vectors[1], 1)
+    assert len(geometry._cache) <= cached + 1
+
+
+def test_silent_chirps_keep_their_slot():
+    geometry = get_device('IWR1843ISK')
+
+    # TX0 disabled: chirp 0 is silent, chirp 1 is TX2 at virtual antennas 4 to 7
+    tx = enabled_tx(config(0, 1, 1))
+    assert geometry.num_virtual(tx) == 8
+    np.testing.assert_array_equal(geometry.active_virtual(tx), [False] * 4 + [True] * 4)
+    np.testing.assert_array_equal(geometry.array_map(tx), [[4, 5, 6, 7]])
+    vectors = geometry.steering_vectors(np.radians([20.]), np.radians([10.]), tx)
+    assert vectors.shape == (1, 8)
+    np.testing.assert_array_equal(vectors[0, :4], 0)
+    np.testing.assert_allclose(np.abs(vectors[0, 4:]), 1)
+
+    # TX2 disabled: the 8 virtual antennas of the data, the last 4 silent
+    tx = enabled_tx(config(1, 1, 0))
+    assert geometry.num_virtual(tx) == 8
+    np.testing.assert_array_equal(geometry.array_map(tx), [[0, 1, 2, 3]])
+    signal = np.ones((8, 16), dtype=complex)
+    signal[4:] = 100
+    radarCube, _, _ = rangeFFT(signal, 'IWR1843ISK', tx=tx, near_field=0)
+    np.testing.assert_allclose(radarCube[..., 0], [[16, 16, 16, 16]])
+
+    # Only silent chirps
+    tx = enabled_tx(config(0, 0, 1))
+    assert geometry.num_virtual(tx) == 4
+    with pytest.raises(ValueError):
+        geometry.array_map(tx)
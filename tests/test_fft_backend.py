@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+
+import fft_backend
+
+rng = np.random.default_rng(2)
+SIGNAL = (rng.standard_normal((4, 6, 16)) + 1j * rng.standard_normal((4, 6, 16))).astype(np.complex64)
+REAL = rng.standard_normal((4, 16)).astype(np.float32)
+
+
+@pytest.fixture(params=fft_backend.available_backends())
+def backend(request):
+    previous = fft_backend.get_backend()
+    yield fft_backend.set_backend(request.param, workers=2)
+    fft_backend.set_backend(previous.name, workers=previous.workers)
+
+
+def test_transforms_match_numpy(backend):
+    assert backend.name in fft_backend.available_backends()
+    tolerance = dict(rtol=1e-4, atol=1e-4)
+    np.testing.assert_allclose(fft_backend.fft(SIGNAL, axis=0), np.fft.fft(SIGNAL, axis=0), **tolerance)
+    np.testing.assert_allclose(fft_backend.fft(SIGNAL, n=32), np.fft.fft(SIGNAL, n=32), **tolerance)
+    np.testing.assert_allclose(fft_backend.ifft(SIGNAL, axis=1), np.fft.ifft(SIGNAL, axis=1), **tolerance)
+    np.testing.assert_allclose(fft_backend.fft2(SIGNAL, (8, 8), axes=(0, 1)),
+                               np.fft.fft2(SIGNAL, (8, 8), axes=(0, 1)), **tolerance)
+    spectrum = fft_backend.rfft(REAL)
+    np.testing.assert_allclose(spectrum, np.fft.rfft(REAL), **tolerance)
+    np.testing.assert_allclose(fft_backend.irfft(spectrum, n=16), REAL, **tolerance)
+
+
+def test_single_precision_is_kept(backend):
+    assert fft_backend.fft(SIGNAL).dtype == np.complex64
+    assert fft_backend.rfft(REAL).dtype == np.complex64
+
+
+def test_results_are_written_into_out(backend):
+    expected = np.fft.fft(SIGNAL, axis=-1)
+    out = np.empty_like(SIGNAL)
+    assert fft_backend.fft(SIGNAL, axis=-1, out=out) is out
+    np.testing.assert_allclose(out, expected, rtol=1e-4, atol=1e-4)
+
+    # In place, also on a non contiguous view
+    data = SIGNAL.copy()
+    assert fft_backend.fft(data, axis=-1, out=data) is data
+    np.testing.assert_allclose(data, expected, rtol=1e-4, atol=1e-4)
+    data = SIGNAL.copy()
+    view = data[:, 1, :]
+    fft_backend.fft(view, axis=0, out=view)
+    np.testing.assert_allclose(data[:, 1, :], np.fft.fft(SIGNAL[:, 1, :], axis=0), rtol=1e-4, atol=1e-4)
+    np.testing.assert_array_equal(data[:, 0, :], SIGNAL[:, 0, :])
+
+
+def test_unknown_backends_are_rejected():
+    with pytest.raises(ValueError):
+        fft_backend.set_backend('mkl')
+    assert fft_backend.available_backends()[-1] == 'numpy'
@@ -0,0 +1,73 @@
+import numpy as np
+import pytest
+
+from fourier import angleFFT, dopplerFFT, rangeFFT
+from params import PARAMS
+
+rng = np.random.default_rng(0)
+SIGNAL = (rng.standard_normal((12, 32)) + 1j * rng.standard_normal((12, 32))).astype(np.complex64)
+
+
+def previous_cube(rFFT, device):
+    """Radar cube built bin by bin, as rangeFFT did before the gather"""
+    nBins = rFFT.shape[1]
+    if device == 'IWR6843ISK-ODS':
+        radarCube = np.zeros((4, 4, nBins), dtype=complex)
+        for n in range(nBins):
+            radarCube[:, :, n] = [[rFFT[0, n], rFFT[3, n], rFFT[4, n], rFFT[7, n]],
+                                  [rFFT[1, n], rFFT[2, n], rFFT[5, n], rFFT[6, n]],
+                                  [0, 0, rFFT[8, n], rFFT[11, n]],
+                                  [0, 0, rFFT[9, n], rFFT[10, n]]]
+    else:
+        radarCube = np.zeros((2, 8, nBins), dtype=complex)
+        for n in range(nBins):
+            radarCube[:, :, n] = [[0, 0, rFFT[4, n], rFFT[5, n], rFFT[6, n], rFFT[7, n], 0, 0],
+                                  [rFFT[0, n], rFFT[1, n], rFFT[2, n], rFFT[3, n],
+                                   rFFT[8, n], rFFT[9, n], rFFT[10, n], rFFT[11, n]]]
+    return radarCube
+
+
+@pytest.mark.parametrize('device', ['IWR6843ISK-ODS', 'IWR1843ISK'])
+def test_range_cube_matches_previous_layout(device):
+    radarCube, rFFT, rBins = rangeFFT(SIGNAL.copy(), device)
+
+    expected = np.fft.fft(SIGNAL, axis=1)
+    expected[:, :8] = 0
+    np.testing.assert_allclose(rFFT, expected, rtol=1e-4, atol=1e-4)
+    np.testing.assert_allclose(radarCube, previous_cube(expected, device), rtol=1e-4, atol=1e-4)
+    assert len(rBins) == PARAMS.NUM_RANGE_BINS
+
+
+def test_range_fft_is_batched_over_chirps():
+    chirps = np.stack([SIGNAL, 2 * SIGNAL, SIGNAL.conj()])
+    radarCube, rFFT, _ = rangeFFT(chirps.copy(), 'IWR6843ISK-ODS', near_field=0)
+    assert radarCube.shape == (3, 4, 4, 32)
+    for c in range(3):
+        single, _, _ = rangeFFT(chirps[c].copy(), 'IWR6843ISK-ODS', near_field=0)
+        np.testing.assert_allclose(radarCube[c], single, rtol=1e-5, atol=1e-5)
+    # Without near field removal the first bins are kept
+    assert np.all(rFFT[..., 0] != 0)
+
+
+def test_doppler_fft_of_a_moving_target():
+    # Range bin 20 rotating by one Doppler bin per loop on every antenna
+    loops, samples = 16, 32
+    signal = np.exp(2j * np.pi * (np.arange(samples)[None, None, :] * 20 / samples
+                                  + np.arange(loops)[:, None, None] * 3 / loops))
+    signal = np.broadcast_to(signal, (loops, 12, samples)).astype(np.complex64)
+
+    dFFT, dBins, rBins = dopplerFFT(signal)
+    assert dFFT.shape == (loops, samples)
+    assert np.unravel_index(np.argmax(np.abs(dFFT)), dFFT.shape) == (loops // 2 + 3, 20)
+    assert np.all(dFFT[:, :12] == 0)
+    assert len(dBins) == PARAMS.NUM_DOPPLER_BINS
+
+
+def test_angle_fft_peaks_at_the_target_azimuth():
+    # Plane wave on the 4 antennas of a row, half a wavelength apart
+    azimuth = np.arcsin(0.5)
+    row = np.exp(1j * np.pi * np.sin(azimuth) * np.arange(4))
+    aFFT, eFFT, aBins, eBins = angleFFT(np.tile(row[None, :, None], (4, 1, 8)))
+    assert aFFT.shape == (PARAMS.NUM_AZIM_BINS, 8)
+    assert eFFT.shape == (PARAMS.NUM_ELEV_BINS, 8)
+    assert abs(abs(aBins[np.argmax(aFFT[:, 0])]) - 30) < 180 / PARAMS.NUM_AZIM_BINS
@@ -0,0 +1,81 @@
+import json
+
+import numpy as np
+import pytest
+
+from dca1000 import DCA1000
+from instrumentation import BUCKETS, METRICS, Metrics
+
+
+@pytest.fixture
+def metrics():
+    METRICS.reset()
+    METRICS.enable()
+    yield METRICS
+    METRICS.disable()
+    METRICS.reset()
+
+
+def test_nothing_is_recorded_while_disabled():
+    registry = Metrics()
+    registry.count('frames')
+    registry.set_gauge('ring', 3)
+    registry.observe('stage', 0.1)
+    snapshot = registry.snapshot()
+    assert snapshot['counters'] == snapshot['gauges'] == snapshot['histograms'] == {}
+
+
+def test_counters_gauges_and_histograms():
+    registry = Metrics()
+    registry.enable()
+    registry.count('dca1000.frames')
+    registry.count('dca1000.frames', 2)
+    registry.set_gauge('dca1000.ring', 5)
+    registry.set_gauge('dca1000.ring', 2)
+    for seconds in (0.001, 0.001, 0.003, 0.3):
+        registry.observe('stage', seconds)
+
+    snapshot = registry.snapshot()
+    assert snapshot['counters'] == {'dca1000.frames': 3}
+    assert snapshot['gauges'] == {'dca1000.ring': 2}
+    histogram = snapshot['histograms']['stage']
+    assert histogram['count'] == 4
+    assert histogram['sum'] == pytest.approx(0.305)
+    assert (histogram['min'], histogram['max']) == (0.001, 0.3)
+    # The median lies in the (0.5 ms, 1 ms] bucket, p99 in the (0.2 s, 0.5 s] one
+    assert 0.0005 <= histogram['p50'] <= 0.001
+    assert 0.2 <= histogram['p99'] <= 0.3
+    buckets = dict(histogram['buckets'])
+    assert buckets[0.001] == 2
+    assert buckets[0.005] == 3
+    assert buckets[float('inf')] == 4
+    assert len(histogram['buckets']) == len(BUCKETS) + 1
+
+
+def test_exports(tmp_path):
+    registry = Metrics()
+    registry.enable()
+    registry.count('dca1000.packets_lost', 7)
+    registry.observe('fourier.rangeFFT', 0.002)
+
+    text = registry.to_prometheus()
+    assert '# TYPE mmwave_dca1000_packets_lost_total counter\nmmwave_dca1000_packets_lost_total 7' in text
+    assert 'mmwave_stage_duration_seconds_bucket{stage="fourier.rangeFFT",le="+Inf"} 1' in text
+    assert 'mmwave_stage_duration_seconds_count{stage="fourier.rangeFFT"} 1' in text
+
+    registry.write(str(tmp_path / 'metrics.json'))
+    with open(tmp_path / 'metrics.json') as f:
+        assert json.load(f)['counters'] == {'dca1000.packets_lost': 7}
+    registry.write(str(tmp_path / 'metrics.prom'))
+    assert (tmp_path / 'metrics.prom').read_text() == registry.to_prometheus()
+
+
+def test_timed_functions_record_their_duration(metrics):
+    data = np.zeros(2 * 4 * 8 * 2, dtype=np.int16)
+    DCA1000.organize(data, num_chirps=2, num_rx=4, num_samples=8)
+    DCA1000.organize(data, num_chirps=2, num_rx=4, num_samples=8)
+    assert metrics.snapshot()['histograms']['dca1000.organize']['count'] == 2
+
+    metrics.disable()
+    DCA1000.organize(data, num_chirps=2, num_rx=4, num_samples=8)
+    assert metrics.snapshot()['histograms']['dca1000.organize']['count'] == 2
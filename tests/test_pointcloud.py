@@ -0,0 +1,74 @@
+import numpy as np
+import pytest
+
+from cfar import DETECTION_DTYPE
+from devices import get_device
+from pointcloud import PointCloud
+
+TX = (0, 2, 1)
+LOOPS, BINS = 16, 32
+RANGE_AXIS = np.arange(BINS) * 0.1
+DOPPLER_AXIS = np.linspace(-2, 2, LOOPS)
+
+
+def detections(*cells):
+    result = np.zeros(len(cells), dtype=DETECTION_DTYPE)
+    for n, (doppler_idx, range_idx, snr) in enumerate(cells):
+        result[n] = (doppler_idx, range_idx, 1, 1, snr)
+    return result
+
+
+def target_cube(device, azimuth, elevation, doppler_idx, range_idx, motion=True):
+    """Doppler cube of one target, with the phase its motion adds between TX slots"""
+    steering = get_device(device).steering_vectors(azimuth, elevation, TX)
+    if motion:
+        slot = np.repeat(np.arange(len(TX)), 4)
+        steering = steering * np.exp(2j * np.pi * (doppler_idx - LOOPS // 2) * slot / (LOOPS * len(TX)))
+    cube = np.zeros((LOOPS, 12, BINS), dtype=np.complex64)
+    cube[doppler_idx, :, range_idx] = steering
+    return cube
+
+
+@pytest.mark.parametrize('device', ['IWR6843ISK-ODS', 'IWR1843ISK'])
+def test_points_are_placed_at_the_target_direction(device):
+    azimuth, elevation = np.radians(20.), np.radians(10.)
+    cube = target_cube(device, azimuth, elevation, 12, 10)
+    cloud = PointCloud(device, tx=TX)
+    points = cloud.generate(detections((12, 10, 15.)), cube, RANGE_AXIS, DOPPLER_AXIS)
+
+    assert len(points) == 1
+    point = points[0]
+    assert point['doppler'] == pytest.approx(DOPPLER_AXIS[12])
+    assert point['snr'] == 15.
+    expected = RANGE_AXIS[10] * np.array([np.cos(elevation) * np.sin(azimuth),
+                                          np.cos(elevation) * np.cos(azimuth),
+                                          np.sin(elevation)])
+    np.testing.assert_allclose([point['x'], point['y'], point['z']], expected, atol=1e-5)
+
+
+def test_motion_between_tx_slots_is_compensated():
+    # A fast target seen without compensation is shifted in angle
+    cube = target_cube('IWR6843ISK-ODS', np.radians(-30.), 0., 15, 10)
+    uncompensated = PointCloud('IWR6843ISK-ODS', tx=TX, doppler_compensation=False)
+    points = uncompensated.generate(detections((15, 10, 1.)), cube, RANGE_AXIS, DOPPLER_AXIS)
+    assert np.degrees(np.arctan2(points['x'][0], points['y'][0])) != pytest.approx(-30., abs=1)
+
+    compensated = PointCloud('IWR6843ISK-ODS', tx=TX)
+    points = compensated.generate(detections((15, 10, 1.)), cube, RANGE_AXIS, DOPPLER_AXIS)
+    assert np.degrees(np.arctan2(points['x'][0], points['y'][0])) == pytest.approx(-30., abs=1e-3)
+
+
+def test_strongest_detections_are_kept():
+    cube = target_cube('IWR6843ISK-ODS', 0., 0., 8, 5, motion=False)
+    cloud = PointCloud('IWR6843ISK-ODS', tx=TX, max_points=2)
+    points = cloud.generate(detections((8, 5, 3.), (8, 6, 9.), (8, 7, 6.)), cube, RANGE_AXIS, DOPPLER_AXIS)
+    np.testing.assert_array_equal(points['snr'], [9., 6.])
+    distance = np.sqrt(points['x'] ** 2 + points['y'] ** 2 + points['z'] ** 2)
+    np.testing.assert_allclose(distance, RANGE_AXIS[[6, 7]], rtol=1e-5)
+
+
+def test_flat_arrays_have_no_elevation():
+    cloud = PointCloud('IWR1843ISK', tx=(0, 1))
+    np.testing.assert_array_equal(cloud.elevations, [0.])
+    with pytest.raises(ValueError):
+        cloud.generate(detections((0, 0, 1.)), np.zeros((LOOPS, 12, BINS), dtype=np.complex64))
@@ -0,0 +1,101 @@
+import numpy as np
+import pytest
+
+from devices import get_device
+from params import PARAMS
+from preprocessing import Preprocessor, estimate_calibration, get_window, near_field_bins
+
+TX = (0, 2, 1)
+LOOPS, SAMPLES = 8, 32
+
+rng = np.random.default_rng(3)
+FRAME = (rng.standard_normal((LOOPS, 12, SAMPLES)) + 1j * rng.standard_normal((LOOPS, 12, SAMPLES)))
+
+
+def test_windows_and_dc_removal():
+    pre = Preprocessor(range_window='hann', doppler_window='hamming', remove_dc=True, dtype=np.complex128)
+    frame = FRAME + 5
+    result = pre.apply(frame)
+
+    expected = (frame - frame.mean(axis=-1, keepdims=True))
+    expected = expected * np.hamming(LOOPS)[:, None, None] * np.hanning(SAMPLES)
+    np.testing.assert_allclose(result, expected, rtol=1e-12)
+    # The input is untouched unless given as out
+    np.testing.assert_array_equal(frame, FRAME + 5)
+    assert pre.apply(frame, out=frame) is frame
+    np.testing.assert_allclose(frame, expected, rtol=1e-12)
+
+
+def test_coefficients_are_computed_once_per_shape():
+    pre = Preprocessor(range_window='blackman', tx=TX)
+    coefficients = pre.coefficients(LOOPS, 12, SAMPLES)
+    assert pre.coefficients(LOOPS, 12, SAMPLES) is coefficients
+    assert not coefficients.flags.writeable
+    assert pre.coefficients(LOOPS, 12, 2 * SAMPLES).shape == (LOOPS, 12, 2 * SAMPLES)
+
+
+def test_angle_window_follows_the_virtual_array():
+    pre = Preprocessor('IWR6843ISK-ODS', angle_window='bartlett', tx=TX, dtype=np.complex128)
+    weights = pre.coefficients(1, 12, 1)[0, :, 0].real
+
+    # The ODS virtual array is 4 x 4, the window is the same along rows and columns
+    positions = np.rint(get_device('IWR6843ISK-ODS').virtual_positions(TX)).astype(int)
+    positions -= positions.min(axis=0)
+    window = np.bartlett(4)
+    np.testing.assert_allclose(weights, window[positions[:, 0]] * window[positions[:, 1]])
+
+    with pytest.raises(ValueError):
+        Preprocessor(angle_window='hann')
+    with pytest.raises(ValueError):
+        pre.coefficients(1, 8, 1)
+
+
+def test_calibration_equalises_the_channels():
+    # One reflector at boresight in range bin 5, seen with a different gain and phase per channel
+    gains = 1 + rng.random(12) * np.exp(2j * np.pi * rng.random(12))
+    tone = np.exp(2j * np.pi * 5 * np.arange(SAMPLES) / SAMPLES)
+    frame = np.broadcast_to(gains[None, :, None] * tone, (LOOPS, 12, SAMPLES))
+
+    calibration = estimate_calibration(frame)
+    corrected = Preprocessor(calibration=calibration, dtype=np.complex128).apply(frame)
+    np.testing.assert_allclose(corrected, np.broadcast_to(corrected[:, :1], corrected.shape), rtol=1e-9)
+
+    # Off boresight, the corrected channels keep the phases of the steering vector
+    steering = get_device('IWR6843ISK-ODS').steering_vectors(0.3, 0.1, TX)
+    calibration = estimate_calibration(frame * steering[None, :, None], range_bin=5,
+                                       device='IWR6843ISK-ODS', azimuth=0.3, elevation=0.1, tx=TX)
+    np.testing.assert_allclose(calibration, gains[0] / gains, rtol=1e-9)
+
+
+def test_near_field_bins_are_zeroed():
+    assert near_field_bins(0) == 0
+    assert near_field_bins(PARAMS.R_BIN * 2.5) == 3
+    pre = Preprocessor(near_field=PARAMS.R_BIN * 3)
+    spectrum = pre.mask_near_field(np.ones((4, SAMPLES)))
+    assert np.all(spectrum[:, :3] == 0) and np.all(spectrum[:, 3:] == 1)
+    spectrum = pre.mask_near_field(np.ones((SAMPLES, 4)), axis=0)
+    assert np.all(spectrum[:3] == 0) and np.all(spectrum[3:] == 1)
+
+
+def test_invalid_windows_are_rejected():
+    np.testing.assert_array_equal(get_window(None, 3), np.ones(3))
+    with pytest.raises(ValueError):
+        get_window('kaiser', 8)
+    with pytest.raises(ValueError):
+        get_window(np.ones(4), 8)
+
+
+def test_silent_chirps_are_weighted_zero():
+    # TX0 disabled on the IWR1843: the first 4 virtual antennas are silent
+    tx = (None, 2)
+    pre = Preprocessor('IWR1843ISK', angle_window='hann', tx=tx, dtype=np.complex128)
+    weights = pre.coefficients(1, 8, 1)[0, :, 0].real
+    np.testing.assert_array_equal(weights[:4], 0)
+    np.testing.assert_allclose(weights[4:], np.hanning(4))
+
+    gains = 1 + rng.random(8) * np.exp(2j * np.pi * rng.random(8))
+    tone = np.exp(2j * np.pi * 5 * np.arange(SAMPLES) / SAMPLES)
+    frame = np.broadcast_to(gains[None, :, None] * tone, (LOOPS, 8, SAMPLES))
+    calibration = estimate_calibration(frame, device='IWR1843ISK', tx=tx)
+    np.testing.assert_array_equal(calibration[:4], 0)
+    np.testing.assert_allclose(calibration[4:], gains[4] / gains[4:], rtol=1e-9)
@@ -0,0 +1,88 @@
+import numpy as np
+import pytest
+
+from clutter import ClutterFilter
+from devices import get_device
+from preprocessing import Preprocessor
+from radar_cube import RadarCubeEngine
+
+TX = (0, 2, 1)
+LOOPS, SAMPLES = 8, 32
+
+rng = np.random.default_rng(1)
+FRAME = (rng.standard_normal((LOOPS, 12, SAMPLES)) + 1j * rng.standard_normal((LOOPS, 12, SAMPLES)))
+
+
+def reference_array(device, frame, range_bins):
+    """Doppler spectra of every virtual antenna placed on the array, (loops, rows, cols, range)"""
+    spectra = np.fft.fft(frame, axis=-1)[..., range_bins]
+    spectra = np.fft.fftshift(np.fft.fft(spectra, axis=0), axes=0)
+    array_map = get_device(device).array_map(TX)
+    array = spectra[:, np.maximum(array_map, 0), :]
+    array[:, array_map < 0, :] = 0
+    return array
+
+
+@pytest.mark.parametrize('device', ['IWR6843ISK-ODS', 'IWR1843ISK'])
+def test_range_doppler_azimuth_cube(device):
+    engine = RadarCubeEngine(device, loops=LOOPS, samples=SAMPLES, tx=TX, azimuth_bins=16,
+                             range_bins=slice(4, 20), dtype=np.complex128)
+    cube = engine.process(FRAME)
+
+    array = reference_array(device, FRAME, slice(4, 20))
+    expected = np.fft.fftshift(np.fft.fft(array.sum(axis=1), n=16, axis=1), axes=1)
+    assert cube.shape == engine.shape == (16, LOOPS, 16)
+    np.testing.assert_allclose(cube, expected.transpose(2, 0, 1), rtol=1e-9, atol=1e-9)
+    np.testing.assert_allclose(engine.range_doppler_map(),
+                               np.sum(np.abs(engine.doppler_cube) ** 2, axis=1), rtol=1e-9)
+
+
+def test_range_doppler_elevation_azimuth_cube():
+    engine = RadarCubeEngine('IWR6843ISK-ODS', loops=LOOPS, samples=SAMPLES, tx=TX, azimuth_bins=8,
+                             elevation_bins=8, dtype=np.complex128)
+    cube = engine.process(FRAME)
+
+    array = reference_array('IWR6843ISK-ODS', FRAME, slice(None))
+    expected = np.fft.fftshift(np.fft.fft2(array, s=(8, 8), axes=(1, 2)), axes=(1, 2))
+    assert cube.shape == (SAMPLES, LOOPS, 8, 8)
+    np.testing.assert_allclose(cube, expected.transpose(3, 0, 1, 2), rtol=1e-9, atol=1e-9)
+
+
+def test_buffers_are_reused_and_magnitude_is_returned():
+    engine = RadarCubeEngine('IWR6843ISK-ODS', loops=LOOPS, samples=SAMPLES, tx=TX, azimuth_bins=16)
+    complex_cube = engine.process(FRAME).copy()
+    assert complex_cube.dtype == np.complex64
+    # The next frame overwrites the returned cube
+    first = engine.process(FRAME)
+    second = engine.process(2 * FRAME)
+    assert first is second
+    np.testing.assert_allclose(second, 2 * complex_cube, rtol=1e-4, atol=1e-3)
+
+    engine = RadarCubeEngine('IWR6843ISK-ODS', loops=LOOPS, samples=SAMPLES, tx=TX, azimuth_bins=16,
+                             magnitude=True)
+    magnitude = engine.process(FRAME)
+    assert magnitude.dtype == np.float32
+    np.testing.assert_allclose(magnitude, np.abs(complex_cube), rtol=1e-4, atol=1e-3)
+
+
+def test_doppler_window_follows_clutter_removal():
+    pre = Preprocessor(range_window='hann', doppler_window='hann', tx=TX, dtype=np.complex128)
+    engine = RadarCubeEngine('IWR6843ISK-ODS', loops=LOOPS, samples=SAMPLES, tx=TX, azimuth_bins=16,
+                             dtype=np.complex128, preprocessor=pre)
+    cube = engine.process(FRAME)
+    array = reference_array('IWR6843ISK-ODS', pre.apply(FRAME), slice(None))
+    expected = np.fft.fftshift(np.fft.fft(array.sum(axis=1), n=16, axis=1), axes=1)
+    np.testing.assert_allclose(cube, expected.transpose(2, 0, 1), rtol=1e-9, atol=1e-9)
+
+    # A static reflector is the same in every chirp and fully removed
+    static = np.repeat(FRAME[:1], LOOPS, axis=0)
+    engine = RadarCubeEngine('IWR6843ISK-ODS', loops=LOOPS, samples=SAMPLES, tx=TX, azimuth_bins=16,
+                             dtype=np.complex128, preprocessor=pre,
+                             clutter=ClutterFilter('ema', alpha=1., dtype=np.complex128))
+    peak = np.abs(expected).max()
+    assert np.abs(engine.process(static)).max() < 1e-12 * peak
+
+
+def test_arrays_wider_than_the_angle_fft_are_rejected():
+    with pytest.raises(ValueError):
+        RadarCubeEngine('IWR1843ISK', loops=LOOPS, samples=SAMPLES, tx=TX, azimuth_bins=4)
@@ -0,0 +1,48 @@
+import numpy as np
+
+from dca1000 import DCA1000
+from raw_signal import RadarData, RadarRecording
+
+TX, RX, LOOPS, SAMPLES = 3, 4, 8, 16
+
+
+def random_frames(n):
+    rng = np.random.default_rng(0)
+    return rng.integers(-2000, 2000, (n, TX * RX * LOOPS * SAMPLES * 2)).astype(np.int16)
+
+
+def reference(raw):
+    """Separated data computed step by step, with the ODS RX2 and RX3 phase inversion"""
+    organized = DCA1000.organize(raw, LOOPS * TX, RX, SAMPLES)
+    organized[:, 1:3, :] *= -1
+    separated = np.stack([np.stack([organized[t::TX][:, r] for r in range(RX)]) for t in range(TX)])
+    return separated, DCA1000.separate_tx(organized, num_tx=TX)
+
+
+def test_radar_data_separates_antennas():
+    raw = random_frames(1)[0]
+    rdata = RadarData('IWR6843ISK-ODS', TX, RX, LOOPS, SAMPLES)
+    rdata.raw_data = raw
+    separated, vx = reference(raw)
+    np.testing.assert_array_equal(rdata.separated_data, separated)
+    np.testing.assert_array_equal(rdata.separated_vx_data, vx)
+    assert vx.shape == (LOOPS, TX * RX, SAMPLES)
+
+    # Organized once per assignment, recomputed for new data
+    assert rdata.separated_vx_data.base is rdata.separated_data.base
+    rdata.raw_data = raw[::-1].copy()
+    np.testing.assert_array_equal(rdata.separated_vx_data, reference(raw[::-1].copy())[1])
+
+
+def test_radar_recording_matches_frame_by_frame(tmp_path):
+    frames = random_frames(3)
+    rec = RadarRecording('IWR6843ISK-ODS', TX, RX, LOOPS, SAMPLES)
+    rec.raw_data = list(frames)
+    rec.organize(path=str(tmp_path / 'organized.npy'))
+    assert rec.separated_vx_data.shape == (3, LOOPS, TX * RX, SAMPLES)
+    for i, raw in enumerate(frames):
+        separated, vx = reference(raw)
+        np.testing.assert_allclose(rec.separated_data[i], separated)
+        np.testing.assert_allclose(rec.separated_vx_data[i], vx)
+    np.testing.assert_allclose(np.load(tmp_path / 'organized.npy', mmap_mode='r').reshape(3, -1),
+                               rec.separated_vx_data.reshape(3, -1))
@@ -0,0 +1,103 @@
+import errno
+import os
+import time
+
+import numpy as np
+import pytest
+
+from compressed_recording import open_recording
+from recorder import StreamRecorder
+
+FRAME_SIZE = 64
+
+
+class EndingStream:
+    """Stands for a DCA1000 whose streaming thread ends after a few frames, as on a socket error"""
+
+    def __init__(self, frames):
+        self.frames = list(frames)
+        self.streaming = False
+        self.dropped_frames = 0
+
+    def start_streaming(self):
+        self.streaming = True
+
+    def stop_streaming(self):
+        self.streaming = False
+
+    def iter_frames(self, timeout=None, with_info=False):
+        while self.frames:
+            yield self.frames.pop(0), 1, 50.
+        self.streaming = False
+
+
+@pytest.mark.parametrize('codec', [None, 'zlib'])
+def test_frames_are_written_until_streaming_stops(tmp_path, codec):
+    frames = np.arange(5 * FRAME_SIZE, dtype=np.int16).reshape(5, FRAME_SIZE)
+    ext = 'rec' if codec is None else 'crec'
+    recorder = StreamRecorder(EndingStream(frames), str(tmp_path / ('capture.' + ext)), {'a': 1},
+                              frame_size=FRAME_SIZE, pool_size=8, codec=codec, workers=1)
+
+    start = time.monotonic()
+    with pytest.raises(RuntimeError):
+        recorder.record(seconds=30)
+    assert time.monotonic() - start < 5
+    assert recorder.stats()['error'] is not None
+
+    rec = open_recording(recorder.files[0])
+    np.testing.assert_array_equal(rec.frames, frames)
+    np.testing.assert_array_equal(rec.lost_packets, 1)
+    assert recorder.frames_written == 5
+
+
+def test_files_are_rotated_by_size(tmp_path):
+    frames = np.arange(5 * FRAME_SIZE, dtype=np.int16).reshape(5, FRAME_SIZE)
+    # One header and two aligned records per file
+    recorder = StreamRecorder(EndingStream(frames), str(tmp_path / 'capture.rec'), {'a': 1},
+                              frame_size=FRAME_SIZE, max_bytes=3 * 4096)
+    with pytest.raises(RuntimeError):
+        recorder.record()
+
+    assert [f.rsplit('_', 1)[1] for f in recorder.files] == ['0000.rec', '0001.rec', '0002.rec']
+    written = np.concatenate([open_recording(f).frames for f in recorder.files])
+    np.testing.assert_array_equal(written, frames)
+
+
+class EndlessStream(EndingStream):
+    """Stands for a DCA1000 streaming the same frame until it is stopped"""
+
+    def iter_frames(self, timeout=None, with_info=False):
+        while self.streaming:
+            yield self.frames[0], 0, 50.
+            time.sleep(0.001)
+
+
+@pytest.mark.parametrize('codec', [None, 'zlib'])
+def test_write_errors_end_the_recording(tmp_path, monkeypatch, codec):
+    def full_disk(fd):
+        raise OSError(errno.ENOSPC, os.strerror(errno.ENOSPC))
+
+    frames = np.zeros((1, FRAME_SIZE), dtype=np.int16)
+    recorder = StreamRecorder(EndlessStream(frames), str(tmp_path / 'capture.rec'), {'a': 1},
+                              frame_size=FRAME_SIZE, pool_size=4, fsync_interval=0, codec=codec, workers=1)
+    monkeypatch.setattr(os, 'fsync', full_disk)
+    with pytest.raises(OSError) as info:
+        recorder.record(frames=60, seconds=30)
+    assert info.value.errno == errno.ENOSPC
+    assert 'No space' in recorder.stats()['error']
+    assert recorder._fd is None
+
+
+def test_recorders_refuse_to_restart(tmp_path):
+    frames = np.arange(3 * FRAME_SIZE, dtype=np.int16).reshape(3, FRAME_SIZE)
+    stream = EndingStream(frames)
+    recorder = StreamRecorder(stream, str(tmp_path / 'capture.rec'), {'a': 1}, frame_size=FRAME_SIZE, pool_size=4)
+    with pytest.raises(RuntimeError):
+        recorder.record()
+    assert recorder._free.qsize() == 4
+
+    stream.frames = list(frames)
+    with pytest.raises(RuntimeError, match='already recorded'):
+        recorder.record()
+    assert recorder.files == [str(tmp_path / 'capture.rec')]
+    np.testing.assert_array_equal(open_recording(recorder.files[0]).frames, frames)
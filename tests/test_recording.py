@@ -0,0 +1,63 @@
+import os
+import pickle
+
+import numpy as np
+
+from recording import Recording, RecordingWriter, convert_legacy
+
+CONFIG = {'ADC_SAMPLES': 16.0, 'CHIRP_LOOPS': 2.0}
+FRAME_SIZE = 100
+
+
+def frames(n):
+    return np.arange(n * FRAME_SIZE, dtype=np.int16).reshape(n, FRAME_SIZE) - 50
+
+
+def test_round_trip(tmp_path):
+    path = str(tmp_path / 'capture.rec')
+    with RecordingWriter(path, CONFIG, FRAME_SIZE, device='IWR6843ISK-ODS', description='test') as writer:
+        for i, frame in enumerate(frames(3)):
+            writer.write(frame, lost_packets=i, timestamp=10. + i)
+
+    rec = Recording(path)
+    assert (len(rec), rec.config, rec.device, rec.description) == (3, CONFIG, 'IWR6843ISK-ODS', 'test')
+    np.testing.assert_array_equal(rec.frames, frames(3))
+    np.testing.assert_array_equal(rec[1], frames(3)[1])
+    np.testing.assert_array_equal(rec.lost_packets, [0, 1, 2])
+    np.testing.assert_array_equal(rec.timestamps, [10., 11., 12.])
+
+
+def test_truncated_record_is_ignored_and_appended_frames_are_seen(tmp_path):
+    path = str(tmp_path / 'capture.rec')
+    writer = RecordingWriter(path, CONFIG, FRAME_SIZE)
+    for frame in frames(2):
+        writer.write(frame)
+    writer.flush()
+    rec = Recording(path)
+    assert len(rec) == 2
+
+    writer.write(frames(3)[2])
+    writer.flush()
+    assert rec.refresh() == 3
+    writer.close()
+
+    # A crash in the middle of the last record leaves the previous frames readable
+    os.truncate(path, os.path.getsize(path) - 10)
+    rec = Recording(path)
+    assert len(rec) == 2
+    np.testing.assert_array_equal(rec.frames, frames(2))
+
+
+def test_convert_legacy(tmp_path):
+    legacy = {'description': 'corner reflector', 'id': 'CR', 'date': '25/01/23-10:30:00',
+              'config': CONFIG, 'frames': 2, 'data': list(frames(2).view(np.uint16))}
+    path = str(tmp_path / 'capture.dat')
+    with open(path, 'wb') as f:
+        pickle.dump(legacy, f)
+
+    out = convert_legacy(path, device='IWR6843ISK-ODS')
+    assert out == str(tmp_path / 'capture.rec')
+    rec = Recording(out)
+    assert (rec.config, rec.device, rec.description) == (CONFIG, 'IWR6843ISK-ODS', 'corner reflector')
+    np.testing.assert_array_equal(rec.frames, frames(2))
+    assert len(set(rec.timestamps)) == 1
@@ -0,0 +1,81 @@
+import codecs
+import socket
+
+import numpy as np
+
+from dca1000 import CMD, CONFIG_FOOTER, CONFIG_HEADER
+from replay_server import ReplayServer
+
+# Three frames of 100 int16 values, sent in packets of 64 bytes
+FRAMES = np.arange(300, dtype=np.int16).reshape(3, 100)
+PACKET_SIZE = 64
+
+
+def receive(server):
+    """Runs the server through its frames and returns the (seq, byte count, payload) of every packet"""
+    receiver = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    receiver.bind(('127.0.0.1', 0))
+    receiver.settimeout(0.2)
+    server.data_port = receiver.getsockname()[1]
+    with server:
+        assert server.wait(2)
+    packets = []
+    while True:
+        try:
+            msg = receiver.recv(2048)
+        except socket.timeout:
+            break
+        packets.append((int.from_bytes(msg[:4], 'little'), int.from_bytes(msg[4:10], 'little'), msg[10:]))
+    receiver.close()
+    return packets
+
+
+def make_server(**kwargs):
+    return ReplayServer(FRAMES, adc_ip='127.0.0.2', config_port=0, packet_size=PACKET_SIZE, speed=None, **kwargs)
+
+
+def test_stream_is_cut_into_numbered_packets():
+    server = make_server()
+    # 600 bytes: 9 full packets and a last shorter one
+    packets = receive(server)
+
+    assert [seq for seq, _, _ in packets] == list(range(1, 11))
+    assert [count for _, count, _ in packets] == [i * PACKET_SIZE for i in range(10)]
+    assert [len(payload) for _, _, payload in packets] == [PACKET_SIZE] * 9 + [600 - 9 * PACKET_SIZE]
+    np.testing.assert_array_equal(np.frombuffer(b''.join(p for _, _, p in packets), '<i2'), FRAMES.ravel())
+    assert server.stats()['frames_sent'] == 3
+    assert server.stats()['packets_sent'] == 10
+
+
+def test_dropped_and_reordered_packets_are_counted():
+    server = make_server(loss=0.2, reorder=0.3, reorder_distance=3, seed=1)
+    packets = receive(server)
+    stats = server.stats()
+    # Full packets are dropped or sent, the last shorter one is always sent
+    assert len(packets) == stats['packets_sent']
+    assert stats['packets_sent'] + stats['packets_dropped'] == 10
+    assert stats['packets_dropped'] > 0
+    assert stats['packets_reordered'] > 0
+
+    sequence = [seq for seq, _, _ in packets[:-1]]
+    assert sequence != sorted(sequence)
+    for seq, count, payload in packets:
+        assert count == (seq - 1) * PACKET_SIZE
+        expected = FRAMES.ravel().view(np.uint8)[count:count + PACKET_SIZE]
+        assert payload == expected.tobytes()
+
+
+def test_commands_are_acknowledged_and_start_recording():
+    server = make_server(wait_for_start=True)
+    client = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    client.settimeout(2)
+    destination = server.config_socket.getsockname()
+    with server:
+        assert not server.wait(0.2)
+        for cmd in (CMD.READ_FPGA_VERSION_CMD_CODE, CMD.RECORD_START_CMD_CODE):
+            client.sendto(codecs.decode(CONFIG_HEADER + cmd.value + '0000' + CONFIG_FOOTER, 'hex'), destination)
+            status = '0203' if cmd == CMD.READ_FPGA_VERSION_CMD_CODE else '0000'
+            assert client.recv(64).hex() == CONFIG_HEADER + cmd.value + status + CONFIG_FOOTER
+        assert server.wait(2)
+    client.close()
+    assert server.commands == [CMD.READ_FPGA_VERSION_CMD_CODE, CMD.RECORD_START_CMD_CODE]
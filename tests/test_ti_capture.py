@@ -0,0 +1,33 @@
+import numpy as np
+
+from ti_capture import TICapture, split_files
+
+CONFIG = {'NUM_TX': 1.0, 'NUM_RX': 2.0, 'CHIRP_LOOPS': 2.0, 'ADC_SAMPLES': 5.0}
+FRAME_SIZE = 40
+
+
+def test_frames_span_split_files(tmp_path):
+    stream = np.arange(3 * FRAME_SIZE + 7, dtype='<i2')
+    # Parts of uneven sizes, the second frame starts in the first file and ends in the third
+    bounds = [0, 50, 75, len(stream)]
+    for n in range(3):
+        stream[bounds[n]:bounds[n + 1]].tofile(str(tmp_path / 'adc_data_Raw_{}.bin'.format(n)))
+
+    path = str(tmp_path / 'adc_data_Raw_0.bin')
+    assert len(split_files(path)) == 3
+    capture = TICapture(path, config=CONFIG)
+    assert capture.frame_size == FRAME_SIZE
+    # The trailing partial frame is ignored
+    assert len(capture) == 3
+    for i, frame in enumerate(capture):
+        np.testing.assert_array_equal(frame, stream[i * FRAME_SIZE:(i + 1) * FRAME_SIZE])
+    np.testing.assert_array_equal(capture[-1], stream[2 * FRAME_SIZE:3 * FRAME_SIZE])
+    np.testing.assert_array_equal(capture.frames(1), stream[FRAME_SIZE:3 * FRAME_SIZE].reshape(2, -1))
+
+
+def test_single_file_frames_are_views(tmp_path):
+    path = str(tmp_path / 'adc_data.bin')
+    np.arange(2 * FRAME_SIZE, dtype='<i2').tofile(path)
+    capture = TICapture(path, config=CONFIG)
+    assert capture.files == [path]
+    assert isinstance(capture[1], np.memmap)
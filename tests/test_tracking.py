@@ -0,0 +1,81 @@
+import numpy as np
+import pytest
+
+import tracking
+from clustering import CLUSTER_DTYPE
+from tracking import Tracker
+
+DT = 0.1
+START = np.array([[-1., 3., 0.], [2., 5., 0.5]])
+VELOCITY = np.array([[1., 0.5, 0.], [-0.5, -1., 0.]])
+
+
+def clusters(frame, noise=0.05):
+    """Clusters of the two targets at a frame, with noisy positions and their exact Doppler"""
+    position = START + VELOCITY * DT * frame
+    measured = position + noise * np.random.default_rng(frame).standard_normal(position.shape)
+    result = np.zeros(len(position), dtype=CLUSTER_DTYPE)
+    for d, name in enumerate('xyz'):
+        result[name] = measured[:, d]
+    result['doppler'] = np.sum(position * VELOCITY, axis=1) / np.linalg.norm(position, axis=1)
+    return result
+
+
+@pytest.mark.parametrize('use_doppler', [True, False])
+def test_one_track_per_target(use_doppler):
+    tracker = Tracker(dt=DT, use_doppler=use_doppler)
+    for frame in range(2):
+        assert len(tracker.update(clusters(frame))) == 0
+    tracks = tracker.update(clusters(2))
+    assert len(tracks) == 2
+    ids = tracks['id'].copy()
+
+    for frame in range(3, 30):
+        tracks = tracker.update(clusters(frame))
+        np.testing.assert_array_equal(tracks['id'], ids)
+    position = START + VELOCITY * DT * 29
+    np.testing.assert_allclose(np.column_stack([tracks['x'], tracks['y'], tracks['z']]), position, atol=0.1)
+    np.testing.assert_allclose(np.column_stack([tracks['vx'], tracks['vy'], tracks['vz']]), VELOCITY, atol=0.3)
+    # Tracks age from the frame after the one that started them
+    assert np.all(tracks['hits'] == 30) and np.all(tracks['age'] == 29)
+
+
+def test_tracks_survive_missed_frames():
+    tracker = Tracker(dt=DT, max_misses=3)
+    for frame in range(5):
+        tracker.update(clusters(frame))
+    # The second target disappears, its track coasts for max_misses frames
+    for frame in range(5, 8):
+        tracks = tracker.update(clusters(frame)[:1])
+        assert len(tracks) == 2
+    assert tracks['misses'][1] == 3
+    assert len(tracker.update(clusters(8)[:1])) == 1
+
+    # The first frames of a target are tentative and dropped at the first miss
+    tracker.update(clusters(9))
+    assert len(tracker) == 2 and len(tracker.tracks()) == 1
+    tracker.update(clusters(10)[:1])
+    assert len(tracker) == 1
+
+
+def test_far_clusters_start_new_tracks():
+    tracker = Tracker(dt=DT)
+    for frame in range(3):
+        tracker.update(clusters(frame))
+    jump = clusters(3)
+    jump['x'][0] += 3
+    tracker.update(jump)
+    assert len(tracker.tracks(confirmed_only=False)) == 3
+    assert len(tracker.tracks()) == 2
+
+    tracker.reset()
+    assert len(tracker) == 0
+
+
+def test_greedy_association_without_scipy(monkeypatch):
+    monkeypatch.setattr(tracking, 'linear_sum_assignment', None)
+    tracker = Tracker(dt=DT)
+    for frame in range(10):
+        tracks = tracker.update(clusters(frame)[::-1])
+    assert len(tracks) == 2
+    np.testing.assert_allclose(tracks['x'], (START + VELOCITY * DT * 9)[::-1, 0], atol=0.1)
@@ -0,0 +1,31 @@
+import socket
+
+import pytest
+
+from udp_batch import BatchReceiver, recvmmsg_available
+
+MODES = [False] + ([True] if recvmmsg_available() else [])
+
+
+@pytest.mark.parametrize('use_recvmmsg', MODES)
+def test_batches_keep_datagram_boundaries(use_recvmmsg):
+    receiver_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    receiver_socket.bind(('127.0.0.1', 0))
+    sender = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    receiver = BatchReceiver(receiver_socket, 4, 64, use_recvmmsg=use_recvmmsg)
+
+    datagrams = [bytes([i]) * (10 + i) for i in range(6)]
+    for datagram in datagrams:
+        sender.sendto(datagram, receiver_socket.getsockname())
+
+    received = []
+    while len(received) < len(datagrams):
+        n = receiver.receive(timeout=1)
+        assert 1 <= n <= 4
+        received += [bytes(receiver.views[i][:receiver.lengths[i]]) for i in range(n)]
+    assert received == datagrams
+
+    with pytest.raises(socket.timeout):
+        receiver.receive(timeout=0.05)
+    sender.close()
+    receiver_socket.close()
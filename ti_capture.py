@@ -0,0 +1,129 @@
+"""
+
+TI RAW CAPTURES
+===============
+
+Read raw ADC captures written by mmWave Studio or the DCA1000 CLI in raw mode,
+i.e. adc_data.bin or the split adc_data_Raw_0.bin, adc_data_Raw_1.bin... files.
+
+These files hold the same int16 stream the DCA1000 sends over ethernet, without
+packet headers, so frames are consecutive blocks of tx*rx*loops*samples*2 values.
+Files are memory-mapped and frames are returned lazily in the layout returned by
+DCA1000.read, ready for RadarData or RadarRecording.
+
+Included classes:
+    - TICapture
+
+"""
+
+import os
+import re
+
+import numpy as np
+
+from params import PARAMS
+
+SPLIT_FILE_PATTERN = re.compile(r'^(.*_Raw_)(\d+)(\.bin)$')
+
+
+def split_files(path):
+    """Returns every part of a capture split in _Raw_<n>.bin files, in order
+
+    Args:
+        path (str): Any part of the capture, or a single .bin file
+
+    Returns:
+        list: Paths of the parts, only path itself if it is not a split capture
+
+    """
+    match = SPLIT_FILE_PATTERN.match(path)
+    if match is None:
+        return [path]
+
+    prefix, _, ext = match.groups()
+    files = []
+    while os.path.exists('{}{}{}'.format(prefix, len(files), ext)):
+        files.append('{}{}{}'.format(prefix, len(files), ext))
+    return files
+
+
+def frame_size(config):
+    """Returns the number of int16 values in a frame for a PARAMS.CONFIG dictionary"""
+    return int(config['NUM_TX'] * config['NUM_RX'] * config['CHIRP_LOOPS'] * config['ADC_SAMPLES'] * 2)
+
+
+class TICapture:
+    """Lazy, memory-mapped access to the frames of a TI raw capture.
+
+    Attributes:
+        path (str): adc_data.bin file, or any part of a capture split in _Raw_<n>.bin files
+        lua_file (str): lua script used for the capture, to parse its configuration
+        config (dict): Radar configuration, used instead of lua_file. PARAMS.CONFIG if neither
+            is given. Pass it to PARAMS.set_playback_mode
+        files (list): Capture files, in stream order
+        frame_size (int): Number of int16 values in a frame
+
+    Examples:
+        >>> capture = TICapture('adc_data_Raw_0.bin', lua_file='DataCaptureDemo_PythonPrepare.lua')
+        >>> PARAMS.set_playback_mode(capture.config)
+        >>> for adc_data in capture:
+        ...     rdata.raw_data = adc_data
+
+    """
+
+    def __init__(self, path, lua_file=None, config=None):
+        if config is None:
+            config = PARAMS.parse_config_file(lua_file) if lua_file else PARAMS.CONFIG
+        self.config = config
+        self.frame_size = frame_size(config)
+
+        self.files = split_files(path)
+        self._maps = [np.memmap(f, dtype='<i2', mode='r') for f in self.files
+                      if os.path.getsize(f) >= 2]
+        # Stream position of the first value of each file
+        self._starts = np.cumsum([0] + [len(m) for m in self._maps])
+
+    def __len__(self):
+        """Number of complete frames, a trailing partial frame is ignored"""
+        return int(self._starts[-1]) // self.frame_size
+
+    def __getitem__(self, index):
+        """int16 frame at index. A view on the file unless the frame spans two files"""
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('frame index out of range')
+        return self._read(index * self.frame_size, (index + 1) * self.frame_size)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def frames(self, start=0, stop=None):
+        """Returns frames [start, stop) as a single (n, frame_size) array
+
+        Args:
+            start (int): First frame
+            stop (int): Frame after the last one, the end of the capture by default
+
+        Returns:
+            ndarray: A view on the file unless the frames span several files
+
+        """
+        stop = len(self) if stop is None else min(stop, len(self))
+        data = self._read(start * self.frame_size, stop * self.frame_size)
+        return data.reshape(-1, self.frame_size)
+
+    def _read(self, begin, end):
+        """Helper function returning stream values [begin, end), copying only across files"""
+        i = int(np.searchsorted(self._starts, begin, side='right')) - 1
+        if end <= self._starts[i + 1]:
+            return self._maps[i][begin - self._starts[i]:end - self._starts[i]]
+
+        parts = []
+        while begin < end:
+            stop = min(end, self._starts[i + 1])
+            parts.append(self._maps[i][begin - self._starts[i]:stop - self._starts[i]])
+            begin = stop
+            i += 1
+        return np.concatenate(parts)
@@ -0,0 +1,265 @@
+"""
+
+MULTI-TARGET TRACKING
+=====================
+
+Tracks of objects built from the clusters of successive frames.
+
+Each track is a constant velocity Kalman filter over the state (x, y, z, vx,
+vy, vz). Clusters of clustering.cluster_centroids are measurements of the
+position and, through an extended Kalman filter, of the radial velocity given
+by their Doppler. Every frame, for all tracks at once:
+
+    - predict: batched matrix products over the stacked states and covariances
+    - gate: Mahalanobis distance of every cluster to every track, in one einsum,
+      compared with a chi-square threshold
+    - associate: global nearest neighbour, with scipy's linear_sum_assignment
+      when installed, else greedily from the closest pair
+    - update: batched gains and corrections of the tracks with a cluster
+
+Clusters left without a track start tentative tracks, confirmed after
+confirm_hits updates. Tentative tracks are dropped at their first miss and
+confirmed ones after max_misses frames in a row without a cluster.
+
+    >>> tracker = Tracker()
+    >>> for points in clouds:
+    ...     clusters = cluster_centroids(points, dbscan.update(points))
+    ...     tracks = tracker.update(clusters)
+
+Included classes:
+    - Tracker
+    - TRACK_DTYPE
+
+"""
+
+import numpy as np
+
+from params import PARAMS
+
+try:
+    from scipy.optimize import linear_sum_assignment
+except ImportError:
+    linear_sum_assignment = None
+
+TRACK_DTYPE = np.dtype([('id', '<i8'),
+                        ('x', '<f4'),
+                        ('y', '<f4'),
+                        ('z', '<f4'),
+                        ('vx', '<f4'),
+                        ('vy', '<f4'),
+                        ('vz', '<f4'),
+                        ('age', '<i4'),
+                        ('hits', '<i4'),
+                        ('misses', '<i4'),
+                        ('confirmed', '?')])
+
+# Chi-square value with 3 and 4 degrees of freedom at 99.9%
+GATES = {3: 16.27, 4: 18.47}
+
+
+class Tracker:
+    """Constant velocity EKF tracker with gating and global nearest neighbour association.
+
+    Attributes:
+        dt (float): Time between frames in s, PARAMS.Tperiodicity by default
+        process_noise (float): Standard deviation of the acceleration of targets in m/s^2
+        position_noise (float): Standard deviation of cluster positions in m
+        doppler_noise (float): Standard deviation of cluster Doppler in m/s
+        use_doppler (bool): Use the Doppler of clusters as a measurement of the radial velocity
+        doppler_sign (int): 1 if positive Doppler moves away from the radar, -1 if towards it
+        gate (float): Maximum squared Mahalanobis distance between a track and its cluster
+        confirm_hits (int): Updates confirming a track
+        max_misses (int): Frames in a row without a cluster after which a confirmed track is dropped
+        initial_velocity (float): Standard deviation of the velocity of new tracks in m/s
+
+    """
+
+    def __init__(self, dt=None, process_noise=1., position_noise=0.15, doppler_noise=0.1, use_doppler=True,
+                 doppler_sign=1, gate=None, confirm_hits=3, max_misses=5, initial_velocity=2.):
+        self.dt = PARAMS.Tperiodicity / 1000 if dt is None else dt
+        self.process_noise = process_noise
+        self.position_noise = position_noise
+        self.doppler_noise = doppler_noise
+        self.use_doppler = use_doppler
+        self.doppler_sign = doppler_sign
+        self.num_measurements = 4 if use_doppler else 3
+        self.gate = GATES[self.num_measurements] if gate is None else gate
+        self.confirm_hits = confirm_hits
+        self.max_misses = max_misses
+        self.initial_velocity = initial_velocity
+
+        noise = [position_noise ** 2] * 3 + ([doppler_noise ** 2] if use_doppler else [])
+        self._R = np.diag(noise)
+        self._next_id = 0
+        self._allocate(0)
+
+    def _allocate(self, n):
+        """Helper function creating empty track arrays"""
+        self._X = np.zeros((n, 6))
+        self._P = np.zeros((n, 6, 6))
+        self._id = np.zeros(n, dtype=np.int64)
+        self._age = np.zeros(n, dtype=np.int32)
+        self._hits = np.zeros(n, dtype=np.int32)
+        self._misses = np.zeros(n, dtype=np.int32)
+
+    def __len__(self):
+        return len(self._X)
+
+    def reset(self):
+        """Drops every track"""
+        self._allocate(0)
+
+    def _transition(self, dt):
+        """Helper function returning the state transition and process noise matrices"""
+        F = np.eye(6)
+        F[:3, 3:] = dt * np.eye(3)
+        block = np.array([[dt ** 4 / 4, dt ** 3 / 2], [dt ** 3 / 2, dt ** 2]]) * self.process_noise ** 2
+        Q = np.kron(block, np.eye(3))
+        return F, Q
+
+    def predict(self, dt=None):
+        """Moves every track forward by dt
+
+        Args:
+            dt (float): Time since the last frame in s, self.dt by default
+
+        Returns:
+            None
+
+        """
+        F, Q = self._transition(self.dt if dt is None else dt)
+        self._X = self._X @ F.T
+        self._P = F @ self._P @ F.T + Q
+        self._age += 1
+
+    def _measure(self):
+        """Helper function returning the predicted measurements and their Jacobians for every track"""
+        n = len(self._X)
+        position, velocity = self._X[:, :3], self._X[:, 3:]
+        H = np.zeros((n, self.num_measurements, 6))
+        H[:, :3, :3] = np.eye(3)
+        if not self.use_doppler:
+            return position.copy(), H
+
+        distance = np.maximum(np.linalg.norm(position, axis=1), 1e-6)[:, None]
+        radial = np.sum(position * velocity, axis=1, keepdims=True) / distance
+        H[:, 3, :3] = self.doppler_sign * (velocity - radial * position / distance) / distance
+        H[:, 3, 3:] = self.doppler_sign * position / distance
+        return np.hstack([position, self.doppler_sign * radial]), H
+
+    def _associate(self, cost):
+        """Helper function pairing tracks and clusters by minimum total cost, inf for gated out pairs"""
+        if linear_sum_assignment is not None:
+            finite = np.where(np.isfinite(cost), cost, 1e12)
+            rows, cols = linear_sum_assignment(finite)
+            keep = np.isfinite(cost[rows, cols])
+            return rows[keep], cols[keep]
+
+        rows, cols = np.nonzero(np.isfinite(cost))
+        order = np.argsort(cost[rows, cols], kind='stable')
+        used_rows, used_cols, pairs = set(), set(), []
+        for r, c in zip(rows[order], cols[order]):
+            if r not in used_rows and c not in used_cols:
+                used_rows.add(r)
+                used_cols.add(c)
+                pairs.append((r, c))
+        pairs = np.array(pairs, dtype=np.intp).reshape(-1, 2)
+        return pairs[:, 0], pairs[:, 1]
+
+    def update(self, clusters, dt=None):
+        """Predicts every track, associates the clusters of a frame and updates the tracks
+
+        Args:
+            clusters (ndarray): Clusters of dtype clustering.CLUSTER_DTYPE, or any array with
+                x, y, z and doppler fields
+            dt (float): Time since the last frame in s, self.dt by default, e.g. more after lost frames
+
+        Returns:
+            ndarray: Confirmed tracks of dtype TRACK_DTYPE
+
+        """
+        self.predict(dt)
+        z = np.column_stack([clusters[name] for name in ('x', 'y', 'z', 'doppler')[:self.num_measurements]])
+        z = z.astype(float).reshape(-1, self.num_measurements)
+
+        rows = cols = np.zeros(0, dtype=np.intp)
+        if len(self._X) and len(z):
+            predicted, H = self._measure()
+            S = H @ self._P @ H.transpose(0, 2, 1) + self._R
+            S_inv = np.linalg.inv(S)
+
+            # Squared Mahalanobis distance of every cluster to every track
+            innovation = z[None, :, :] - predicted[:, None, :]
+            distance = np.einsum('tci,tij,tcj->tc', innovation, S_inv, innovation)
+            cost = np.where(distance <= self.gate, distance + np.linalg.slogdet(S)[1][:, None], np.inf)
+            rows, cols = self._associate(cost)
+
+            # Batched Kalman update of the associated tracks
+            if len(rows):
+                P, H_r = self._P[rows], H[rows]
+                K = P @ H_r.transpose(0, 2, 1) @ S_inv[rows]
+                self._X[rows] += np.einsum('tij,tj->ti', K, innovation[rows, cols])
+                self._P[rows] = (np.eye(6) - K @ H_r) @ P
+                self._hits[rows] += 1
+                self._misses[rows] = 0
+
+        missed = np.ones(len(self._X), dtype=bool)
+        missed[rows] = False
+        self._misses[missed] += 1
+        confirmed = self._hits >= self.confirm_hits
+        keep = ~missed | (confirmed & (self._misses <= self.max_misses))
+        self._keep(keep)
+
+        new = np.ones(len(z), dtype=bool)
+        new[cols] = False
+        self._start(z[new])
+        return self.tracks()
+
+    def _keep(self, keep):
+        """Helper function dropping the tracks not in keep"""
+        self._X, self._P = self._X[keep], self._P[keep]
+        self._id, self._age = self._id[keep], self._age[keep]
+        self._hits, self._misses = self._hits[keep], self._misses[keep]
+
+    def _start(self, z):
+        """Helper function starting tentative tracks at measurements"""
+        n = len(z)
+        X = np.zeros((n, 6))
+        X[:, :3] = z[:, :3]
+        if self.use_doppler:
+            # The radial velocity is the only velocity known
+            direction = z[:, :3] / np.maximum(np.linalg.norm(z[:, :3], axis=1), 1e-6)[:, None]
+            X[:, 3:] = self.doppler_sign * z[:, 3:4] * direction
+        P = np.zeros((n, 6, 6))
+        P[:, :3, :3] = np.eye(3) * self.position_noise ** 2
+        P[:, 3:, 3:] = np.eye(3) * self.initial_velocity ** 2
+
+        self._X = np.concatenate([self._X, X])
+        self._P = np.concatenate([self._P, P])
+        self._id = np.concatenate([self._id, np.arange(self._next_id, self._next_id + n)])
+        self._age = np.concatenate([self._age, np.zeros(n, dtype=np.int32)])
+        self._hits = np.concatenate([self._hits, np.ones(n, dtype=np.int32)])
+        self._misses = np.concatenate([self._misses, np.zeros(n, dtype=np.int32)])
+        self._next_id += n
+
+    def tracks(self, confirmed_only=True):
+        """Returns the current tracks
+
+        Args:
+            confirmed_only (bool): Leave out tentative tracks
+
+        Returns:
+            ndarray: Tracks of dtype TRACK_DTYPE
+
+        """
+        confirmed = self._hits >= self.confirm_hits
+        select = confirmed if confirmed_only else np.ones(len(self._X), dtype=bool)
+        tracks = np.zeros(int(select.sum()), dtype=TRACK_DTYPE)
+        for k, name in enumerate(('x', 'y', 'z', 'vx', 'vy', 'vz')):
+            tracks[name] = self._X[select, k]
+        tracks['id'] = self._id[select]
+        tracks['age'] = self._age[select]
+        tracks['hits'] = self._hits[select]
+        tracks['misses'] = self._misses[select]
+        tracks['confirmed'] = confirmed[select]
+        return tracks
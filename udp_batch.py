@@ -0,0 +1,167 @@
+"""
+
+BATCHED UDP RECEPTION
+=====================
+
+Receive many UDP datagrams per system call into a preallocated buffer.
+
+On Linux, recvmmsg is called through ctypes so that a whole batch of
+DCA1000 packets costs a single system call. Elsewhere, or if recvmmsg
+cannot be loaded, a pure Python fallback drains the socket with
+non-blocking recv_into calls after waiting for the first datagram.
+
+"""
+
+import ctypes
+import ctypes.util
+import errno
+import select
+import socket
+import sys
+
+
+class _IOVec(ctypes.Structure):
+    _fields_ = [('iov_base', ctypes.c_void_p),
+                ('iov_len', ctypes.c_size_t)]
+
+
+class _MsgHdr(ctypes.Structure):
+    _fields_ = [('msg_name', ctypes.c_void_p),
+                ('msg_namelen', ctypes.c_uint32),
+                ('msg_iov', ctypes.POINTER(_IOVec)),
+                ('msg_iovlen', ctypes.c_size_t),
+                ('msg_control', ctypes.c_void_p),
+                ('msg_controllen', ctypes.c_size_t),
+                ('msg_flags', ctypes.c_int)]
+
+
+class _MMsgHdr(ctypes.Structure):
+    _fields_ = [('msg_hdr', _MsgHdr),
+                ('msg_len', ctypes.c_uint)]
+
+
+def _load_recvmmsg():
+    """Returns the libc recvmmsg function, or None if it is not available"""
+    if not sys.platform.startswith('linux'):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        func = libc.recvmmsg
+    except (OSError, AttributeError):
+        return None
+    func.argtypes = [ctypes.c_int, ctypes.POINTER(_MMsgHdr),
+                     ctypes.c_uint, ctypes.c_int, ctypes.c_void_p]
+    func.restype = ctypes.c_int
+    return func
+
+
+_recvmmsg = _load_recvmmsg()
+
+
+def recvmmsg_available():
+    """Returns True if datagrams can be received in batches with recvmmsg"""
+    return _recvmmsg is not None
+
+
+class BatchReceiver:
+    """Receives batches of UDP datagrams into a preallocated buffer.
+
+    Attributes:
+        sock (socket.socket): UDP socket to receive from
+        batch_size (int): Maximum number of datagrams received per call
+        packet_size (int): Maximum size of each datagram
+        views (list): Memoryviews on the buffer slot of each datagram
+        lengths (list): Size of each datagram received by the last call
+        use_recvmmsg (bool): Whether recvmmsg is used instead of the fallback
+
+    Examples:
+        >>> receiver = BatchReceiver(sock, 64, 4096)
+        >>> n = receiver.receive(timeout=1)
+        >>> packets = [receiver.views[i][:receiver.lengths[i]] for i in range(n)]
+
+    """
+
+    def __init__(self, sock, batch_size, packet_size, use_recvmmsg=None):
+        self.sock = sock
+        self.batch_size = batch_size
+        self.packet_size = packet_size
+
+        if use_recvmmsg is None:
+            use_recvmmsg = recvmmsg_available()
+        elif use_recvmmsg and not recvmmsg_available():
+            raise OSError('recvmmsg is not available on this platform')
+        self.use_recvmmsg = use_recvmmsg
+
+        self._buffer = bytearray(batch_size * packet_size)
+        view = memoryview(self._buffer)
+        self.views = [view[i * packet_size:(i + 1) * packet_size]
+                      for i in range(batch_size)]
+        self.lengths = [0] * batch_size
+
+        if self.use_recvmmsg:
+            # Point one message header at each slot of the buffer
+            base = ctypes.addressof(
+                (ctypes.c_char * len(self._buffer)).from_buffer(self._buffer))
+            self._iovecs = (_IOVec * batch_size)()
+            self._msgs = (_MMsgHdr * batch_size)()
+            for i in range(batch_size):
+                self._iovecs[i].iov_base = base + i * packet_size
+                self._iovecs[i].iov_len = packet_size
+                self._msgs[i].msg_hdr.msg_iov = ctypes.pointer(self._iovecs[i])
+                self._msgs[i].msg_hdr.msg_iovlen = 1
+            self._poller = select.poll()
+            self._poller.register(sock.fileno(), select.POLLIN)
+
+    def receive(self, timeout=None):
+        """Receives up to batch_size datagrams, waiting only for the first one
+
+        Args:
+            timeout (float): Time to wait for the first datagram, None to wait forever
+
+        Returns:
+            int: Number of datagrams received. Their sizes are in ``lengths``
+
+        Raises:
+            socket.timeout: If no datagram arrived within timeout
+
+        """
+        if self.use_recvmmsg:
+            return self._receive_recvmmsg(timeout)
+        return self._receive_fallback(timeout)
+
+    def _receive_recvmmsg(self, timeout):
+        """Helper function to receive a batch with a single recvmmsg call"""
+        poll_timeout = None if timeout is None else int(timeout * 1000)
+        while True:
+            if not self._poller.poll(poll_timeout):
+                raise socket.timeout('timed out')
+
+            n = _recvmmsg(self.sock.fileno(), self._msgs,
+                          self.batch_size, socket.MSG_DONTWAIT, None)
+            if n >= 0:
+                break
+            err = ctypes.get_errno()
+            if err not in (errno.EAGAIN, errno.EWOULDBLOCK, errno.EINTR):
+                raise OSError(err, errno.errorcode.get(err, ''))
+
+        for i in range(n):
+            self.lengths[i] = self._msgs[i].msg_len
+        return n
+
+    def _receive_fallback(self, timeout):
+        """Helper function to receive a batch with one recv_into call per datagram"""
+        self.sock.settimeout(timeout)
+        self.lengths[0] = self.sock.recv_into(self.views[0], self.packet_size)
+
+        # Drain whatever is already queued without waiting
+        n = 1
+        self.sock.settimeout(0.0)
+        try:
+            while n < self.batch_size:
+                self.lengths[n] = self.sock.recv_into(self.views[n], self.packet_size)
+                n += 1
+        except BlockingIOError:
+            pass
+        finally:
+            self.sock.settimeout(timeout)
+        return n
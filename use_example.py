@@ -3,10 +3,11 @@
 READ SAVED DATA AND PROCESS
 ===========================
 
-Read saved .dat file and perform signal processing.
+Read saved .rec or compressed .crec file and perform signal processing.
+Legacy pickled .dat captures are converted to .rec on first use.
 
 Usage:
-   1. Read saved file and set_playback_mode in PARAMS using read config
+   1. Open saved recording and set_playback_mode in PARAMS using its config
    2. Create RadarData object with params
    3. Fill RadarData raw_data with raw frame
    4. Access RadarData's separated_data and separated_vx_data properties
@@ -14,29 +15,35 @@ Usage:
 
 """
 
-import pickle
+import os
 import numpy as np
 import heatmaps
 # from animated_plots import animateFFTRange, animateRangeHeatmap, animateDopplerRangeHeatmap, animateAzimuthRangeHeatmap
 from fourier import rangeFFT, angleFFT, dopplerFFT
 from params import PARAMS
 from raw_signal import RadarData
+from compressed_recording import open_recording
+from recording import convert_legacy
 import matplotlib.pyplot as plt
 
-# Load data from file
-data = pickle.load(open('data\openradar_25-01-23_QMUL-MCR.dat', 'rb'))
+path = os.path.join('data', 'openradar_25-01-23_QMUL-MCR.rec')
+# Captures saved as pickled .dat files by earlier versions are converted once
+if not os.path.exists(path):
+    convert_legacy(os.path.splitext(path)[0] + '.dat', path, device='IWR6843ISK-ODS')
+# Open recording, frames are read on access
+rec = open_recording(path)
 # Configure playback mode
-config = data['config']
+config = rec.config
 PARAMS.set_playback_mode(config)
 # Read main parameters
-rdata = RadarData(device='IWR6843ISK-ODS',
+rdata = RadarData(device=rec.device,
                   tx=PARAMS.TX_ANTENNAS,
                   rx=PARAMS.RX_ANTENNAS,
                   loops=PARAMS.CHIRP_LOOPS,
                   samples=PARAMS.ADC_SAMPLES)
 
-# Get data frame
-frames = data['data']
+# Get data frames
+frames = rec.frames
 # Choose frame
 adc_data = frames[5]
 # Set RadarData raw_data